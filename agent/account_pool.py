@@ -0,0 +1,266 @@
+"""
+Account Pool - Serves many Gmail accounts from one process.
+
+Each account gets its own GmailFetcher: its own OAuth credentials, HTTP
+transports, sync checkpoint and quota scheduler, since Gmail's quota is
+per user. The pool adds what one fetcher cannot do alone:
+
+- a concurrency cap shared by every account, with free slots handed out
+  round-robin across accounts, so one large mailbox cannot starve the rest
+- a background thread that refreshes access tokens before they expire,
+  so fetches never stall on a refresh
+- fan-out helpers that run every account's fetch at once
+
+    with AccountPool(max_concurrency=32, batch_size=50) as pool:
+        pool.add_account('alice')
+        pool.add_account('bob')
+        for name, emails in pool.fetch_recent_emails(max_results=100).items():
+            print(name, len(emails))
+"""
+
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from typing import Callable, Deque, Dict, Iterator, List, Optional
+
+from agent.gmail_fetcher import Email, GmailFetcher
+from agent.quota_scheduler import QuotaScheduler
+
+
+class FairSlots:
+    """
+    Counting semaphore that grants free slots round-robin across accounts.
+
+    Waiters queue per account; when a slot frees up it goes to the next
+    account in rotation rather than to whoever asked first.
+    """
+
+    def __init__(self, limit: int):
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        self.limit = limit
+        self.in_use = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+        self._waiters: Dict[str, Deque[threading.Event]] = {}
+        self._turns: Deque[str] = deque()
+
+    def acquire(self, account: str):
+        """Block until account is granted a slot"""
+        with self._lock:
+            if self.in_use < self.limit and not self._turns:
+                self._take()
+                return
+            event = threading.Event()
+            queue = self._waiters.get(account)
+            if queue is None:
+                queue = self._waiters[account] = deque()
+                self._turns.append(account)
+            queue.append(event)
+        event.wait()
+
+    def release(self):
+        """Free a slot, handing it to the next waiting account in rotation"""
+        with self._lock:
+            self.in_use -= 1
+            if not self._turns:
+                return
+            account = self._turns.popleft()
+            queue = self._waiters[account]
+            event = queue.popleft()
+            if queue:
+                self._turns.append(account)
+            else:
+                del self._waiters[account]
+            self._take()
+        event.set()
+
+    @contextmanager
+    def slot(self, account: str) -> Iterator[None]:
+        """Hold a slot for the duration of the block"""
+        self.acquire(account)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def _take(self):
+        self.in_use += 1
+        self.peak = max(self.peak, self.in_use)
+
+
+class AccountPool:
+    """Holds a GmailFetcher per account under one shared concurrency cap"""
+
+    def __init__(self, max_concurrency: int = 16,
+                 credentials_path: str = 'data/credentials.json',
+                 accounts_dir: str = 'data/accounts',
+                 refresh_margin: float = 300.0,
+                 refresh_interval: float = 60.0,
+                 scheduler_factory: Callable[[], QuotaScheduler] = QuotaScheduler,
+                 **fetcher_options):
+        """
+        Args:
+            max_concurrency: API calls in flight across all accounts
+            credentials_path: OAuth client credentials shared by all accounts
+            accounts_dir: Per-account tokens and sync state are kept in
+                accounts_dir/<name>/ unless add_account is given paths
+            refresh_margin: Refresh access tokens expiring within this many seconds
+            refresh_interval: Seconds between background refresh passes
+            scheduler_factory: Builds each account's own QuotaScheduler, which
+                the pool gates with the shared concurrency cap
+            fetcher_options: Default GmailFetcher options for every account
+                (batch_size, max_workers, lazy_bodies, ...)
+
+        Raises:
+            ValueError: If fetcher_options holds a scheduler, which every
+                account would share along with its per-user token bucket
+        """
+        if 'scheduler' in fetcher_options:
+            raise ValueError("A scheduler cannot be shared by every account; "
+                             "pass scheduler_factory instead")
+        self.slots = FairSlots(max_concurrency)
+        self.credentials_path = credentials_path
+        self.accounts_dir = accounts_dir
+        self.refresh_margin = refresh_margin
+        self.refresh_interval = refresh_interval
+        self.scheduler_factory = scheduler_factory
+        self.fetcher_options = fetcher_options
+        self.accounts: Dict[str, GmailFetcher] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._refresher: Optional[threading.Thread] = None
+
+    def add_account(self, name: str, token_path: Optional[str] = None,
+                    **options) -> GmailFetcher:
+        """
+        Register an account and return its fetcher.
+
+        The account authenticates on first use, like a standalone fetcher.
+
+        Args:
+            name: Unique account name, also its directory under accounts_dir
+            token_path: Where the account's OAuth token is stored
+            options: GmailFetcher options overriding the pool defaults. A
+                scheduler passed here is used as is, outside the pool's
+                concurrency cap unless its gate already applies one.
+        """
+        options = {**self.fetcher_options, **options}
+        options.setdefault('credentials_path', self.credentials_path)
+        if 'scheduler' not in options:
+            scheduler = options['scheduler'] = self.scheduler_factory()
+            scheduler.gate = partial(self.slots.slot, name)
+        token_path = token_path or os.path.join(self.accounts_dir, name, 'token.json')
+
+        with self._lock:
+            if name in self.accounts:
+                raise ValueError(f"Account {name!r} is already in the pool")
+            fetcher = self.accounts[name] = GmailFetcher(token_path=token_path, **options)
+        return fetcher
+
+    def remove_account(self, name: str):
+        """Drop an account from the pool"""
+        with self._lock:
+            del self.accounts[name]
+
+    def __getitem__(self, name: str) -> GmailFetcher:
+        return self.accounts[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.accounts
+
+    def __len__(self) -> int:
+        return len(self.accounts)
+
+    def authenticate_all(self):
+        """Authenticate every account now, concurrently"""
+        self._map(lambda fetcher: fetcher.authenticate())
+
+    def fetch_recent_emails(self, max_results: int = 10,
+                            query: Optional[str] = None) -> Dict[str, List[Email]]:
+        """
+        Fetch recent emails from every account at once.
+
+        Returns:
+            Emails per account name; an account that fails gets an empty list
+        """
+        return self._map(lambda fetcher: fetcher.fetch_recent_emails(max_results, query))
+
+    def sync_emails(self, query: Optional[str] = None,
+                    label_id: Optional[str] = None,
+                    max_results: Optional[int] = None) -> Dict[str, List[Email]]:
+        """
+        Incrementally sync every account at once (see GmailFetcher.sync_emails).
+
+        Returns:
+            Newly seen emails per account name
+        """
+        return self._map(lambda fetcher: fetcher.sync_emails(query, label_id, max_results))
+
+    def _map(self, work) -> Dict[str, list]:
+        """Run work on every account's fetcher concurrently"""
+        with self._lock:
+            accounts = dict(self.accounts)
+        if not accounts:
+            return {}
+
+        def run(name: str):
+            try:
+                return work(accounts[name])
+            except Exception as error:
+                print(f'Error fetching account {name}: {error}')
+                return []
+
+        # One thread per account; the shared slots bound the API calls
+        with ThreadPoolExecutor(max_workers=len(accounts)) as executor:
+            return dict(zip(accounts, executor.map(run, accounts)))
+
+    def refresh_tokens(self) -> List[str]:
+        """
+        Refresh every authenticated account whose token expires within
+        refresh_margin seconds.
+
+        Returns:
+            Names of the accounts that were refreshed
+        """
+        with self._lock:
+            accounts = dict(self.accounts)
+
+        refreshed = []
+        for name, fetcher in accounts.items():
+            try:
+                if fetcher.refresh_credentials(within=self.refresh_margin):
+                    refreshed.append(name)
+            except Exception as error:
+                print(f'Error refreshing token for account {name}: {error}')
+        return refreshed
+
+    def start(self):
+        """Start refreshing tokens in the background"""
+        if self._refresher is not None:
+            return
+        self._stop.clear()
+        self._refresher = threading.Thread(target=self._refresh_loop,
+                                           name='account-pool-refresher', daemon=True)
+        self._refresher.start()
+
+    def close(self):
+        """Stop the background refresher"""
+        self._stop.set()
+        if self._refresher is not None:
+            self._refresher.join()
+            self._refresher = None
+
+    def __enter__(self) -> 'AccountPool':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _refresh_loop(self):
+        while not self._stop.wait(self.refresh_interval):
+            self.refresh_tokens()
@@ -0,0 +1,177 @@
+"""
+Boilerplate - Per-sender templates that strip repeated newsletter paragraphs.
+
+Every issue of a newsletter carries the same header and footer: "view in
+browser", unsubscribe and preference links, the postal address, the share
+buttons. Rather than matching fixed phrases, the templates learn each
+sender's boilerplate from its own mail: a paragraph that shows up in most
+of a sender's issues is boilerplate, anything else is content:
+
+    templates = BoilerplateTemplates()
+    for email in templates.filter(fetcher.iter_emails(max_results=500)):
+        ...  # email.body holds only the issue's own paragraphs
+
+Paragraphs are compared with digits masked, so a footer's changing year or
+issue number still matches. Bodies are split into paragraphs at blank
+lines, which is how html_to_text separates them, so html-only newsletters
+and plain-text ones are handled alike.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from dataclasses import dataclass
+from email.utils import parseaddr
+from typing import Iterable, Iterator, List
+
+from agent.gmail_fetcher import Email
+
+
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+DIGITS = re.compile(r'\d+')
+
+
+def split_paragraphs(text: str) -> List[str]:
+    """Non-empty paragraphs of text, split at blank lines"""
+    return [paragraph for paragraph in map(str.strip, PARAGRAPH_BREAK.split(text)) if paragraph]
+
+
+@dataclass
+class BoilerplateReport:
+    """Emails cleaned since the templates were opened, and what was removed"""
+    messages: int
+    stripped_messages: int
+    stripped_paragraphs: int
+
+
+class BoilerplateTemplates:
+    """Persistent per-sender paragraph counts used to recognise boilerplate"""
+
+    def __init__(self, path: str = 'data/boilerplate.db', min_issues: int = 3,
+                 min_share: float = 0.6):
+        """
+        Open (or create) the templates.
+
+        Args:
+            path: SQLite database file
+            min_issues: Messages needed from a sender before any of its
+                paragraphs are stripped
+            min_share: Share of a sender's messages a paragraph must appear
+                in to count as boilerplate
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.min_issues = min_issues
+        self.min_share = min_share
+        self.messages = 0
+        self.stripped_messages = 0
+        self.stripped_paragraphs = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS issues ('
+            ' sender TEXT NOT NULL,'
+            ' message_id TEXT NOT NULL,'
+            ' PRIMARY KEY (sender, message_id))'
+        )
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS paragraphs ('
+            ' sender TEXT NOT NULL,'
+            ' fingerprint TEXT NOT NULL,'
+            ' issues INTEGER NOT NULL,'
+            ' PRIMARY KEY (sender, fingerprint))'
+        )
+
+    @staticmethod
+    def sender_key(sender: str) -> str:
+        """Lowercase address of a From header, so display name changes don't matter"""
+        return (parseaddr(sender)[1] or sender).lower()
+
+    @staticmethod
+    def fingerprint(paragraph: str) -> str:
+        normalized = DIGITS.sub('0', ' '.join(paragraph.lower().split()))
+        return hashlib.blake2b(normalized.encode('utf-8'), digest_size=8).hexdigest()
+
+    def learn(self, sender: str, message_id: str, paragraphs: List[str]):
+        """Count a message's paragraphs towards its sender's template; once per message"""
+        key = self.sender_key(sender)
+        fingerprints = {self.fingerprint(paragraph) for paragraph in paragraphs}
+        with self._lock:
+            self._db.execute('BEGIN')
+            if self._db.execute('INSERT OR IGNORE INTO issues VALUES (?, ?)',
+                                (key, message_id)).rowcount:
+                self._db.executemany(
+                    'INSERT INTO paragraphs VALUES (?, ?, 1) '
+                    'ON CONFLICT (sender, fingerprint) DO UPDATE SET issues = issues + 1',
+                    ((key, fingerprint) for fingerprint in fingerprints))
+            self._db.execute('COMMIT')
+
+    def strip(self, sender: str, paragraphs: List[str]) -> List[str]:
+        """
+        The paragraphs that are not the sender's boilerplate.
+
+        Returns all of them when the sender has sent fewer than min_issues
+        messages, or when every paragraph is boilerplate.
+        """
+        key = self.sender_key(sender)
+        fingerprints = [self.fingerprint(paragraph) for paragraph in paragraphs]
+        with self._lock:
+            issues = self._db.execute('SELECT COUNT(*) FROM issues WHERE sender = ?',
+                                      (key,)).fetchone()[0]
+            if issues < self.min_issues or not paragraphs:
+                return paragraphs
+            placeholders = ','.join('?' * len(set(fingerprints)))
+            counts = dict(self._db.execute(
+                f'SELECT fingerprint, issues FROM paragraphs '
+                f'WHERE sender = ? AND fingerprint IN ({placeholders})',
+                (key, *set(fingerprints))))
+
+        minimum = issues * self.min_share
+        kept = [paragraph for paragraph, fingerprint in zip(paragraphs, fingerprints)
+                if counts.get(fingerprint, 0) < minimum]
+        return kept or paragraphs
+
+    def clean(self, email: Email) -> Email:
+        """Learn from an email, then return it without its sender's boilerplate"""
+        paragraphs = split_paragraphs(email.body)
+        self.learn(email.sender, email.message_id, paragraphs)
+        kept = self.strip(email.sender, paragraphs)
+
+        self.messages += 1
+        if len(kept) == len(paragraphs):
+            return email
+        self.stripped_messages += 1
+        self.stripped_paragraphs += len(paragraphs) - len(kept)
+        return Email(email.message_id, email.subject, email.sender, email.date,
+                     '\n\n'.join(kept), headers=email.headers)
+
+    def filter(self, emails: Iterable[Email]) -> Iterator[Email]:
+        """Yield every email, cleaned of its sender's boilerplate"""
+        for email in emails:
+            yield self.clean(email)
+
+    def report(self) -> BoilerplateReport:
+        """What was stripped from the emails cleaned since the templates were opened"""
+        return BoilerplateReport(self.messages, self.stripped_messages, self.stripped_paragraphs)
+
+    def __len__(self) -> int:
+        """Number of senders with a template"""
+        with self._lock:
+            return self._db.execute('SELECT COUNT(DISTINCT sender) FROM issues').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self) -> 'BoilerplateTemplates':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
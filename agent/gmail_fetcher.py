@@ -1,57 +1,427 @@
 """
 Gmail Fetcher - Connects to Gmail API and retrieves emails.
 Implements the interface defined by our test suite.
+
+The google auth and discovery stack is imported on first API use rather
+than at import time, keeping startup cheap for short-lived jobs and tests.
 """
 
 import os
-import base64
-from dataclasses import dataclass
-from typing import List, Optional
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+import sys
+import json
+import multiprocessing
+import threading
+import zlib
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import (TYPE_CHECKING, Callable, Dict, Iterator, List, NamedTuple, Optional, Set,
+                    Tuple, Union)
 from googleapiclient.errors import HttpError
 
+from agent.instrumentation import Instrumentation
+from agent.mime_parser import PARSER_VERSION, decode_part_data, extract_body, parse_raw_message
+from agent.quota_scheduler import QUOTA_UNITS, QuotaScheduler, is_retryable
+
+if TYPE_CHECKING:
+    from agent.message_cache import MessageCache
+
 
 SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
 
+# Gmail rejects batch requests containing more than 100 calls
+BATCH_LIMIT = 100
+
+# Gmail caps messages.list page sizes at 500 IDs
+LIST_PAGE_LIMIT = 500
+
+# Email bodies larger than this many utf-8 bytes are held zlib-compressed
+COMPRESS_THRESHOLD = 512
+
+# Headers requested by metadata-first fetches
+METADATA_HEADERS = ['Subject', 'From', 'Date', 'List-Id', 'List-Unsubscribe']
+
+# Default per-message cap on body bytes; larger bodies are truncated and
+# larger attachment-backed parts are not downloaded
+MAX_MESSAGE_BYTES = 8 * 1024 * 1024
+
+# Bodies above this many characters are spooled to disk instead of memory
+SPOOL_THRESHOLD = 1024 * 1024
+
+# Instrumentation stage reported for each API call type
+CALL_STAGES = {
+    'messages.list': 'list',
+    'messages.get': 'get',
+    'messages.attachments.get': 'attachment',
+    'history.list': 'history',
+    'getProfile': 'profile',
+}
+
+
+@lru_cache(maxsize=None)
+def _gmail_discovery_document() -> str:
+    """
+    Gmail's discovery document, read once per process from the copy bundled
+    with googleapiclient, so building a service never fetches discovery.
+    """
+    from googleapiclient import discovery_cache
+    
+    document = discovery_cache.get_static_doc('gmail', 'v1')
+    if document is None:
+        raise RuntimeError("googleapiclient does not bundle the gmail v1 discovery document")
+    return document
+
 
-@dataclass
 class Email:
-    """Email data structure"""
+    """
+    Email data structure.
+    
+    Kept compact for holding large mailboxes in memory: instances use
+    __slots__, sender strings are interned so repeated senders share one
+    object, and the body is held as utf-8 bytes (zlib-compressed above
+    COMPRESS_THRESHOLD bytes) and decoded on access.
+    
+    headers holds the message's metadata headers (such as List-Id) when the
+    fetch that built it requested them, else None. They are not compared.
+    """
+    
+    __slots__ = ('message_id', 'subject', 'sender', 'date', 'headers', '_body', '_compressed')
+    
+    def __init__(self, message_id: str, subject: str, sender: str, date: str, body: str,
+                 headers: Optional[Dict[str, str]] = None):
+        self.message_id = message_id
+        self.subject = subject
+        self.sender = sys.intern(sender)
+        self.date = date
+        self.headers = headers
+        self.body = body
+    
+    @property
+    def body(self) -> str:
+        if self._compressed:
+            return zlib.decompress(self._body).decode('utf-8')
+        return self._body.decode('utf-8')
+    
+    @body.setter
+    def body(self, value: str):
+        raw = value.encode('utf-8')
+        self._compressed = len(raw) > COMPRESS_THRESHOLD
+        self._body = zlib.compress(raw, 1) if self._compressed else raw
+    
+    @property
+    def body_size(self) -> int:
+        """Bytes used to hold the body"""
+        return len(self._body)
+    
+    @property
+    def stored_body(self) -> Tuple[bytes, bool]:
+        """The body as held: (utf-8 bytes, whether they are zlib-compressed)"""
+        return self._body, self._compressed
+    
+    @classmethod
+    def from_stored(cls, message_id: str, subject: str, sender: str, date: str,
+                    body: bytes, compressed: bool,
+                    headers: Optional[Dict[str, str]] = None) -> 'Email':
+        """Rebuild an Email from a stored_body without re-encoding it"""
+        email = cls.__new__(cls)
+        email.message_id = message_id
+        email.subject = subject
+        email.sender = sys.intern(sender)
+        email.date = date
+        email.headers = headers
+        email._body = body
+        email._compressed = compressed
+        return email
+    
+    def _fields(self) -> tuple:
+        return (self.message_id, self.subject, self.sender, self.date, self.body)
+    
+    def __eq__(self, other) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._fields() == other._fields()
+    
+    __hash__ = None
+    
+    def __repr__(self) -> str:
+        return (f'{self.__class__.__name__}(message_id={self.message_id!r}, '
+                f'subject={self.subject!r}, sender={self.sender!r}, '
+                f'date={self.date!r}, body={self.body!r})')
+
+
+class SpooledEmail(Email):
+    """
+    Email whose body is held zlib-compressed in a spool file on disk, so
+    holding very large newsletters costs no memory. The body is read back
+    on access.
+    """
+    
+    __slots__ = ('path',)
+    
+    def __init__(self, message_id: str, subject: str, sender: str, date: str, path: str):
+        self.message_id = message_id
+        self.subject = subject
+        self.sender = sys.intern(sender)
+        self.date = date
+        self.headers = None
+        self.path = path
+        self._body = None
+        self._compressed = True
+    
+    @classmethod
+    def spool(cls, directory: str, message_id: str, subject: str, sender: str,
+              date: str, body: str) -> 'SpooledEmail':
+        """Write body to directory/<message_id>.body and return an Email reading it"""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{message_id}.body')
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'wb') as spool:
+            spool.write(zlib.compress(body.encode('utf-8'), 1))
+        os.replace(temp_path, path)
+        return cls(message_id, subject, sender, date, path)
+    
+    @property
+    def body(self) -> str:
+        with open(self.path, 'rb') as spool:
+            return zlib.decompress(spool.read()).decode('utf-8')
+    
+    @property
+    def body_size(self) -> int:
+        """Bytes used to hold the body in memory"""
+        return 0
+    
+    @property
+    def stored_body(self) -> Tuple[bytes, bool]:
+        with open(self.path, 'rb') as spool:
+            return spool.read(), True
+
+
+class LazyEmail(Email):
+    """
+    Email built from a `format='metadata'` response.
+    The body is fetched and decoded on first access.
+    """
+    
+    __slots__ = ('_load_body',)
+    
+    def __init__(self, message_id: str, subject: str, sender: str, date: str,
+                 headers: Dict[str, str], load_body: Callable[[], Optional[str]]):
+        self.message_id = message_id
+        self.subject = subject
+        self.sender = sys.intern(sender)
+        self.date = date
+        self.headers = headers
+        self._load_body = load_body
+        self._body = None
+        self._compressed = False
+    
+    @property
+    def body(self) -> str:
+        if self._body is None:
+            body = self._load_body()
+            if body is None:
+                return '(No Content)'
+            self.body = body
+        return Email.body.fget(self)
+    
+    @body.setter
+    def body(self, value: str):
+        Email.body.fset(self, value)
+    
+    @property
+    def stored_body(self) -> Tuple[bytes, bool]:
+        """The body as held, loading it first"""
+        body = self.body
+        if self._body is None:
+            return body.encode('utf-8'), False
+        return self._body, self._compressed
+    
+    @property
+    def body_loaded(self) -> bool:
+        """Whether the body has been fetched yet"""
+        return self._body is not None
+    
+    def __repr__(self) -> str:
+        if self.body_loaded:
+            return super().__repr__()
+        return (f'LazyEmail(message_id={self.message_id!r}, subject={self.subject!r}, '
+                f'sender={self.sender!r}, date={self.date!r}, body=<not loaded>)')
+
+
+class BodyLimits(NamedTuple):
+    """How large bodies are capped and where they are spooled"""
+    max_bytes: Optional[int]
+    spool_dir: Optional[str]
+    spool_threshold: Optional[int]
+
+
+def _make_email(message_id: str, subject: Optional[str], sender: Optional[str],
+                date: Optional[str], body: Optional[str], limits: BodyLimits) -> Email:
+    """Build an Email with placeholder fields, capping and spooling the body"""
+    body = body or '(No Content)'
+    
+    # utf-8 needs at most 4 bytes per character, so short bodies skip encoding
+    if limits.max_bytes is not None and len(body) * 4 > limits.max_bytes:
+        encoded = body.encode('utf-8')
+        if len(encoded) > limits.max_bytes:
+            body = encoded[:limits.max_bytes].decode('utf-8', errors='ignore')
+    
+    fields = dict(
+        message_id=message_id,
+        subject=subject or '(No Subject)',
+        sender=sender or '(Unknown Sender)',
+        date=date or '(Unknown Date)'
+    )
+    if limits.spool_dir and limits.spool_threshold is not None \
+            and len(body) > limits.spool_threshold:
+        return SpooledEmail.spool(limits.spool_dir, body=body, **fields)
+    return Email(body=body, **fields)
+
+
+def _parse_raw_email(message_id: str, raw: str, limits: BodyLimits) -> Email:
+    """Build an Email from a `format='raw'` message; runs in parse worker processes"""
+    return _make_email(message_id, *parse_raw_message(raw), limits)
+
+
+class _PendingEmail(NamedTuple):
+    """An Email still being parsed in a worker process"""
     message_id: str
-    subject: str
-    sender: str
-    date: str
-    body: str
+    future: Future
 
 
 class GmailFetcher:
     """Fetches emails from Gmail using the Gmail API"""
     
     def __init__(self, credentials_path: str = 'data/credentials.json', 
-                 token_path: str = 'data/token.json'):
+                 token_path: str = 'data/token.json',
+                 batch_size: Optional[int] = None,
+                 max_workers: Optional[int] = None,
+                 sync_state_path: Optional[str] = None,
+                 cache: Optional['MessageCache'] = None,
+                 lazy_bodies: bool = False,
+                 metadata_headers: Optional[List[str]] = None,
+                 scheduler: Optional[QuotaScheduler] = None,
+                 raw_mime: bool = False,
+                 parse_workers: Optional[int] = None,
+                 max_message_bytes: Optional[int] = MAX_MESSAGE_BYTES,
+                 spool_dir: Optional[str] = None,
+                 spool_threshold: Optional[int] = SPOOL_THRESHOLD,
+                 instrumentation: Optional[Instrumentation] = None,
+                 service=None):
         """
         Initialize Gmail fetcher with authentication.
         
         Args:
             credentials_path: Path to OAuth credentials JSON file
             token_path: Path to store/load access token
+            batch_size: Group message fetches into Gmail batch requests of
+                this many calls (1-100). None fetches one message per request.
+            max_workers: Fetch messages (or batches) concurrently on this many
+                worker threads. None fetches serially.
+            sync_state_path: Where sync_emails checkpoints the mailbox
+                historyId. Defaults to sync_state.json next to token_path.
+            cache: MessageCache consulted before fetching any message
+            lazy_bodies: Fetch only `format='metadata'` up front and return
+                LazyEmail objects that download their body on first access
+            metadata_headers: Headers requested in lazy mode
+                (defaults to METADATA_HEADERS)
+            scheduler: QuotaScheduler that rate-limits and retries every API
+                call (defaults to one sized for Gmail's per-user quota)
+            raw_mime: Request `format='raw'` messages and parse them with the
+                stdlib email package in worker processes, overlapping
+                parsing with network I/O
+            parse_workers: Processes parsing raw messages (defaults to the
+                CPU count); 0 parses on the fetching thread
+            max_message_bytes: Cap on a message's body in utf-8 bytes; longer
+                bodies are truncated, and attachment-backed parts declared
+                larger are not downloaded. None for no cap.
+            spool_dir: Where bodies longer than spool_threshold characters
+                are kept instead of memory (see SpooledEmail). Defaults to
+                spool/ next to token_path.
+            spool_threshold: Body length that triggers spooling (None keeps
+                every body in memory)
+            instrumentation: Receives per-stage timings and byte, quota,
+                retry and cache counters (e.g. a MetricsRecorder); the
+                default discards them
+            service: Pre-built Gmail API service; skips authentication.
+                Otherwise authentication happens on first API use.
         """
+        if batch_size is not None and not 1 <= batch_size <= BATCH_LIMIT:
+            raise ValueError(f"batch_size must be between 1 and {BATCH_LIMIT}")
+        if max_workers is not None and max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        if parse_workers is not None and parse_workers < 0:
+            raise ValueError("parse_workers cannot be negative")
+        
         self.credentials_path = credentials_path
         self.token_path = token_path
-        self.service = self._authenticate()
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.cache = cache
+        self.lazy_bodies = lazy_bodies
+        self.metadata_headers = metadata_headers or METADATA_HEADERS
+        self.scheduler = scheduler or QuotaScheduler()
+        self.raw_mime = raw_mime
+        self.instrumentation = instrumentation or Instrumentation()
+        self.parse_workers = os.cpu_count() if parse_workers is None else parse_workers
+        self.sync_state_path = sync_state_path or os.path.join(
+            os.path.dirname(token_path), 'sync_state.json')
+        self.limits = BodyLimits(
+            max_bytes=max_message_bytes,
+            spool_dir=spool_dir or os.path.join(os.path.dirname(token_path), 'spool'),
+            spool_threshold=spool_threshold
+        )
+        # Settings that change parsed emails; cache entries are kept apart by them
+        self._cache_variant = (f'v{PARSER_VERSION}/{"raw" if raw_mime else "full"}/'
+                               f'{max_message_bytes}')
+        self._service_lock = threading.Lock()
+        self._auth_lock = threading.Lock()
+        self._local = threading.local()
+        self._service = service
+        self._parse_pool: Optional[ProcessPoolExecutor] = None
+        # IDs of messages a running sync failed to fetch, retried by the next sync
+        self._failed_ids: Optional[Set[str]] = None
+    
+    @property
+    def service(self):
+        """Gmail API service, authenticated and built on first use"""
+        if self._service is None:
+            with self._auth_lock:
+                if self._service is None:
+                    self._service = self._authenticate()
+        return self._service
+    
+    @service.setter
+    def service(self, service):
+        self._service = service
+    
+    def authenticate(self):
+        """Authenticate now instead of on the first API call"""
+        return self.service
+    
+    def close(self):
+        """Shut down the raw-mode parse processes, if any were started"""
+        with self._auth_lock:
+            pool, self._parse_pool = self._parse_pool, None
+        if pool is not None:
+            pool.shutdown()
     
     def _authenticate(self):
         """Authenticate with Gmail API using OAuth 2.0"""
+        from google.oauth2.credentials import Credentials
+        from googleapiclient.discovery import build_from_document
+        
         creds = None
+        saved_token = None
         
         if os.path.exists(self.token_path):
-            creds = Credentials.from_authorized_user_file(self.token_path, SCOPES)
+            with open(self.token_path) as token:
+                saved_token = token.read()
+            creds = Credentials.from_authorized_user_info(json.loads(saved_token), SCOPES)
         
         if not creds or not creds.valid:
             if creds and creds.expired and creds.refresh_token:
+                from google.auth.transport.requests import Request
                 creds.refresh(Request())
             else:
                 if not os.path.exists(self.credentials_path):
@@ -60,6 +430,7 @@ class GmailFetcher:
                         "Please download OAuth credentials from Google Cloud Console."
                     )
                 
+                from google_auth_oauthlib.flow import InstalledAppFlow
                 flow = InstalledAppFlow.from_client_secrets_file(
                     self.credentials_path, SCOPES)
                 
@@ -77,12 +448,53 @@ class GmailFetcher:
                     
                     flow.fetch_token(code=code)
                     creds = flow.credentials
-            
-            os.makedirs(os.path.dirname(self.token_path), exist_ok=True)
-            with open(self.token_path, 'w') as token:
-                token.write(creds.to_json())
         
-        return build('gmail', 'v1', credentials=creds)
+        # Only rewrite the token file when a refresh or new grant changed it
+        if creds.to_json() != saved_token:
+            self._save_token(creds)
+        
+        return build_from_document(_gmail_discovery_document(), credentials=creds)
+    
+    def _save_token(self, creds):
+        """Atomically replace the token file with creds"""
+        token_dir = os.path.dirname(self.token_path)
+        if token_dir:
+            os.makedirs(token_dir, exist_ok=True)
+        temp_path = f'{self.token_path}.tmp'
+        with open(temp_path, 'w') as token:
+            token.write(creds.to_json())
+        os.replace(temp_path, self.token_path)
+    
+    def _credentials(self):
+        """OAuth credentials of the built service, if any"""
+        return getattr(getattr(self._service, '_http', None), 'credentials', None)
+    
+    def refresh_credentials(self, within: float = 0) -> bool:
+        """
+        Refresh the access token if it expires within the next `within` seconds.
+        
+        Credentials are refreshed in place, so the service and every worker
+        transport pick up the new token, and the token file is rewritten.
+        Does nothing before the service has been built.
+        
+        Returns:
+            Whether the token was refreshed
+        """
+        with self._auth_lock:
+            creds = self._credentials()
+            expiry = getattr(creds, 'expiry', None)
+            if expiry is None or not getattr(creds, 'refresh_token', None):
+                return False
+            
+            # google-auth keeps expiry as a naive UTC datetime
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+            if expiry - now > timedelta(seconds=within):
+                return False
+            
+            from google.auth.transport.requests import Request
+            creds.refresh(Request())
+            self._save_token(creds)
+            return True
     
     def fetch_recent_emails(self, max_results: int = 10, 
                            query: Optional[str] = None) -> List[Email]:
@@ -96,31 +508,351 @@ class GmailFetcher:
         Returns:
             List of Email objects
         """
+        return list(self.iter_emails(
+            query=query,
+            max_results=max_results,
+            page_size=max(1, min(max_results, LIST_PAGE_LIMIT))
+        ))
+    
+    def iter_emails(self, query: Optional[str] = None,
+                    max_results: Optional[int] = None,
+                    page_size: int = 100) -> Iterator[Email]:
+        """
+        Lazily yield emails matching a query, following nextPageToken.
+        
+        While the caller works through one page, the next page of message
+        IDs is listed in the background. At most two pages of IDs and one
+        batch of messages are held in memory at a time.
+        
+        Args:
+            query: Gmail search query (e.g., "label:newsletters")
+            max_results: Stop after this many messages (None walks the whole mailbox)
+            page_size: Message IDs requested per list call (1-500)
+        
+        Yields:
+            Email objects in mailbox order
+        """
         try:
-            params = {
-                'userId': 'me',
-                'maxResults': max_results
-            }
-            
-            if query:
-                params['q'] = query
+            yield from self._iter_emails(query, max_results, page_size)
+        except HttpError as error:
+            print(f'An error occurred: {error}')
+    
+    def _iter_emails(self, query: Optional[str], max_results: Optional[int],
+                     page_size: int) -> Iterator[Email]:
+        """iter_emails without error handling; list failures propagate"""
+        if not 1 <= page_size <= LIST_PAGE_LIMIT:
+            raise ValueError(f"page_size must be between 1 and {LIST_PAGE_LIMIT}")
+        
+        if max_results == 0:
+            return
+        
+        remaining = max_results
+        prefetcher = ThreadPoolExecutor(max_workers=1)
+        workers = self._worker_pool()
+        next_page = None
+        
+        try:
+            page = self._list_page(query, page_size, None, remaining)
             
-            results = self.service.users().messages().list(**params).execute()
-            messages = results.get('messages', [])
+            while page is not None:
+                message_ids = [message['id'] for message in page.get('messages', [])]
+                if remaining is not None:
+                    message_ids = message_ids[:remaining]
+                    remaining -= len(message_ids)
+                
+                page_token = page.get('nextPageToken')
+                if page_token and remaining != 0:
+                    next_page = prefetcher.submit(
+                        self._list_page, query, page_size, page_token, remaining)
+                
+                yield from self._fetch_messages(message_ids, workers)
+                
+                page = next_page.result() if next_page else None
+                next_page = None
+        
+        finally:
+            if next_page:
+                next_page.cancel()
+            prefetcher.shutdown(wait=False)
+            if workers:
+                workers.shutdown(wait=False, cancel_futures=True)
+    
+    def sync_emails(self, query: Optional[str] = None,
+                    label_id: Optional[str] = None,
+                    max_results: Optional[int] = None) -> List[Email]:
+        """
+        Fetch only the emails added since the previous sync.
+        
+        The mailbox historyId reached by each sync is checkpointed to
+        sync_state_path. Later runs replay users.history.list from that
+        point, so their cost scales with new mail rather than mailbox size.
+        The first run, or one whose checkpoint Gmail has already expired,
+        falls back to a full sync of the messages matching query.
+        
+        Messages that could not be fetched (other than those Gmail no longer
+        has) are checkpointed too and retried by the next sync, so a
+        transient failure never loses them.
+        
+        Args:
+            query: Gmail search query used for full syncs (history cannot be searched)
+            label_id: Only pick up messages added with this label ID on incremental syncs
+            max_results: Maximum number of emails fetched by a full sync
+        
+        Returns:
+            Newly seen Email objects, newest first
+        """
+        state = self._load_sync_state()
+        history_id = state.get('history_id')
+        retry_ids = state.get('failed_ids', [])
+        self._failed_ids = set()
+        
+        try:
+            if history_id:
+                try:
+                    message_ids, latest_history_id = self._list_history(history_id, label_id)
+                except HttpError as error:
+                    if error.resp.status != 404:
+                        raise
+                    print('Sync checkpoint has expired, falling back to a full sync')
+                    history_id = None
             
-            emails = []
-            for message in messages:
-                email = self._get_email_details(message['id'])
-                if email:
-                    emails.append(email)
+            if history_id:
+                emails = self._fetch_all(message_ids)
+            else:
+                # Read the checkpoint first so mail arriving mid-sync is
+                # picked up (at worst twice) by the next run
+                profile = self._execute(self.service.users().getProfile(userId='me'), 'getProfile')
+                latest_history_id = profile['historyId']
+                emails = list(self._iter_emails(
+                    query, max_results, min(max_results or LIST_PAGE_LIMIT, LIST_PAGE_LIMIT)))
             
-            return emails
+            seen = {email.message_id for email in emails}
+            emails += self._fetch_all([message_id for message_id in retry_ids
+                                       if message_id not in seen])
         
         except HttpError as error:
             print(f'An error occurred: {error}')
             return []
+        finally:
+            failed_ids, self._failed_ids = self._failed_ids, None
+        
+        self._save_sync_state(latest_history_id, sorted(failed_ids))
+        return emails
+    
+    def _fetch_all(self, message_ids: List[str]) -> List[Email]:
+        """Fetch message details in order on a temporary worker pool"""
+        if not message_ids:
+            return []
+        workers = self._worker_pool()
+        try:
+            return list(self._fetch_messages(message_ids, workers))
+        finally:
+            if workers:
+                workers.shutdown(wait=False, cancel_futures=True)
     
-    def _get_email_details(self, message_id: str) -> Optional[Email]:
+    def _list_history(self, start_history_id: str,
+                      label_id: Optional[str]) -> Tuple[List[str], str]:
+        """
+        Collect the IDs of messages added since start_history_id.
+        
+        Returns:
+            (message IDs newest first, latest mailbox historyId)
+        """
+        added: Dict[str, None] = {}
+        page_token = None
+        
+        while True:
+            params = {
+                'userId': 'me',
+                'startHistoryId': start_history_id,
+                'historyTypes': ['messageAdded']
+            }
+            
+            if label_id:
+                params['labelId'] = label_id
+            if page_token:
+                params['pageToken'] = page_token
+            
+            page = self._execute(self.service.users().history().list(**params), 'history.list')
+            for record in page.get('history', []):
+                for message_added in record.get('messagesAdded', []):
+                    added[message_added['message']['id']] = None
+            
+            page_token = page.get('nextPageToken')
+            if not page_token:
+                return list(reversed(added)), page['historyId']
+    
+    def _load_sync_state(self) -> dict:
+        """The checkpoint left by the previous sync: history_id and failed_ids"""
+        if not os.path.exists(self.sync_state_path):
+            return {}
+        with open(self.sync_state_path) as state:
+            return json.load(state)
+    
+    def _load_history_id(self) -> Optional[str]:
+        """Read the historyId checkpoint left by the previous sync"""
+        return self._load_sync_state().get('history_id')
+    
+    def _save_sync_state(self, history_id: str, failed_ids: List[str]):
+        """Atomically replace the checkpoint"""
+        directory = os.path.dirname(self.sync_state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f'{self.sync_state_path}.tmp'
+        with open(temp_path, 'w') as state:
+            json.dump({'history_id': str(history_id), 'failed_ids': failed_ids}, state)
+        os.replace(temp_path, self.sync_state_path)
+    
+    def _fetch_failed(self, message_id: str, error: Exception):
+        """Report a message that could not be fetched, remembering it for the next sync"""
+        print(f'Error fetching email {message_id}: {error}')
+        failed_ids = self._failed_ids
+        gone = isinstance(error, HttpError) and error.resp.status == 404
+        if failed_ids is not None and not gone:
+            failed_ids.add(message_id)
+    
+    def _worker_pool(self) -> Optional[ThreadPoolExecutor]:
+        """Thread pool for concurrent fetches, or None in serial mode"""
+        if not self.max_workers:
+            return None
+        return ThreadPoolExecutor(max_workers=self.max_workers,
+                                  initializer=self._init_worker)
+    
+    def _fetch_messages(self, message_ids: List[str],
+                        workers: Optional[ThreadPoolExecutor]) -> Iterator[Email]:
+        """
+        Fetch message details in order, skipping messages that failed.
+        
+        With a raw-mode parse pool, each chunk's emails are collected only
+        after the next chunk has been fetched, so parsing one chunk overlaps
+        the network round trips of the next.
+        """
+        chunk_size = self.batch_size or 1
+        chunks = [message_ids[start:start + chunk_size]
+                  for start in range(0, len(message_ids), chunk_size)]
+        fetched = workers.map(self._fetch_chunk, chunks) if workers \
+            else map(self._fetch_chunk, chunks)
+        
+        pending: list = []
+        for details in fetched:
+            if self.raw_mime and self.parse_workers:
+                pending, details = details, pending
+            yield from self._resolve_all(details)
+        yield from self._resolve_all(pending)
+    
+    def _resolve_all(self, details: list) -> Iterator[Email]:
+        """Yield a chunk's emails, waiting for pending ones and skipping failures"""
+        for email in details:
+            email = self._resolve(email)
+            if email:
+                self.instrumentation.add('emails')
+                yield email
+    
+    def _resolve(self, email: Union[Email, _PendingEmail, None]) -> Optional[Email]:
+        """Wait for an email still being parsed, caching it once done"""
+        if not isinstance(email, _PendingEmail):
+            return email
+        
+        try:
+            with self.instrumentation.span('parse_wait'):
+                parsed = email.future.result()
+        except Exception as error:
+            print(f'Error parsing email {email.message_id}: {error}')
+            if self._failed_ids is not None:
+                self._failed_ids.add(email.message_id)
+            return None
+        
+        if self.cache is not None:
+            self.cache.put(parsed, self._cache_variant)
+        return parsed
+    
+    def _parser(self) -> Optional[ProcessPoolExecutor]:
+        """
+        Process pool parsing raw messages, started on first use.
+        Workers are spawned rather than forked, since the fetcher runs threads.
+        """
+        if not self.parse_workers:
+            return None
+        if self._parse_pool is None:
+            with self._auth_lock:
+                if self._parse_pool is None:
+                    self._parse_pool = ProcessPoolExecutor(
+                        max_workers=self.parse_workers,
+                        mp_context=multiprocessing.get_context('spawn'))
+        return self._parse_pool
+    
+    def _fetch_chunk(self, message_ids: List[str]) -> List[Union[Email, _PendingEmail, None]]:
+        """Fetch one unit of work: a single message, or a batch in batch mode"""
+        if self.batch_size:
+            return self._get_email_details_batch(message_ids)
+        return [self._get_email_details(message_ids[0])]
+    
+    def _init_worker(self):
+        """
+        Give a worker thread its own authorized HTTP transport.
+        
+        Requests are still built from the shared service, but executed over
+        the worker's transport, so workers never share an httplib2 connection.
+        Without credentials to copy, workers fall back to the shared,
+        serialized transport.
+        """
+        import httplib2
+        from google_auth_httplib2 import AuthorizedHttp
+        
+        self.authenticate()
+        credentials = self._credentials()
+        if credentials is not None:
+            self._local.http = AuthorizedHttp(credentials, http=httplib2.Http())
+    
+    def _list_page(self, query: Optional[str], page_size: int,
+                   page_token: Optional[str], remaining: Optional[int]) -> dict:
+        """List one page of message IDs, never asking for more than remaining"""
+        params = {
+            'userId': 'me',
+            'maxResults': page_size if remaining is None else min(page_size, remaining)
+        }
+        
+        if query:
+            params['q'] = query
+        if page_token:
+            params['pageToken'] = page_token
+        
+        return self._execute(self.service.users().messages().list(**params), 'messages.list')
+    
+    def _execute(self, request, call_type: str = 'messages.get', count: int = 1):
+        """
+        Execute an API request through the quota scheduler.
+        
+        The scheduler charges count calls of call_type against the quota and
+        retries throttled or transient failures. The underlying httplib2
+        transport is not thread-safe, so calls sharing self.service are
+        serialized. Worker threads with their own transport (see
+        _init_worker) run without the lock.
+        
+        Each attempt is reported to the instrumentation as a span of the
+        call type's stage, along with the quota units it is charged.
+        """
+        instrumentation = self.instrumentation
+        stage = CALL_STAGES.get(call_type, call_type)
+        units = QUOTA_UNITS.get(call_type, 5) * count
+        http = getattr(self._local, 'http', None)
+        attempts = 0
+        
+        def call():
+            nonlocal attempts
+            if attempts:
+                instrumentation.add('retries')
+            attempts += 1
+            instrumentation.add('quota_units', units)
+            with instrumentation.span(stage):
+                if http is not None:
+                    return request.execute(http=http)
+                with self._service_lock:
+                    return request.execute()
+        
+        return self.scheduler.execute(call, call_type, count)
+    
+    def _get_email_details(self, message_id: str) -> Union[Email, _PendingEmail, None]:
         """
         Get detailed information for a specific email.
         
@@ -128,32 +860,223 @@ class GmailFetcher:
             message_id: Gmail message ID
         
         Returns:
-            Email object or None if error
+            Email object (pending while a raw message is parsed) or None if error
         """
+        if self.cache is not None:
+            cached = self._cached(message_id)
+            self.instrumentation.add('cache_misses' if cached is None else 'cache_hits')
+            if cached is not None:
+                return cached
+        
         try:
-            message = self.service.users().messages().get(
-                userId='me', 
-                id=message_id, 
-                format='full'
-            ).execute()
-            
-            headers = message['payload'].get('headers', [])
-            subject = self._get_header(headers, 'Subject')
-            sender = self._get_header(headers, 'From')
-            date = self._get_header(headers, 'Date')
-            body = self._get_email_body(message['payload'])
+            message = self._execute(self._message_request(message_id))
+            return self._build_email(message_id, message)
+        
+        except HttpError as error:
+            self._fetch_failed(message_id, error)
+            return None
+    
+    def _cached(self, message_id: str) -> Optional[Email]:
+        """
+        The cached email for message_id, if any. In lazy mode it is returned
+        as a LazyEmail with its metadata headers, and entries stored without
+        headers count as misses so the headers are fetched.
+        """
+        if self.cache is None:
+            return None
+        entry = self.cache.lookup(message_id, self._cache_variant)
+        if entry is None:
+            return None
+        
+        email, headers = entry
+        if not self.lazy_bodies:
+            email.headers = headers
+            return email
+        if headers is None:
+            return None
+        return LazyEmail(email.message_id, email.subject, email.sender, email.date,
+                         headers, lambda: email.body)
+    
+    def _metadata(self, headers: List[dict]) -> Dict[str, str]:
+        """The metadata_headers among a payload's headers"""
+        names = {name.lower() for name in self.metadata_headers}
+        return {header['name']: header['value'] for header in headers
+                if header['name'].lower() in names}
+    
+    def _get_email_details_batch(self, message_ids: List[str]) -> List[Union[Email, _PendingEmail, None]]:
+        """
+        Get detailed information for many emails using Gmail batch requests.
+        
+        Each batch carries up to `batch_size` message gets in a single HTTP
+        round trip. A failed message is reported on its own and does not
+        affect the rest of its batch; throttled or transiently failed
+        messages are retried together in a follow-up batch after backoff.
+        Cached messages are not requested.
+        
+        Args:
+            message_ids: Gmail message IDs
+        
+        Returns:
+            Email objects (or None for failed messages) in the order of message_ids
+        """
+        results: Dict[int, Union[Email, _PendingEmail]] = {}
+        pending = []
+        for index, message_id in enumerate(message_ids):
+            cached = self._cached(message_id)
+            if cached is not None:
+                results[index] = cached
+            else:
+                pending.append(index)
+        if self.cache is not None:
+            self.instrumentation.add('cache_hits', len(results))
+            self.instrumentation.add('cache_misses', len(pending))
+        
+        responses: Dict[int, dict] = {}
+        answered = set()
+        retry: List[int] = []
+        attempt = 0
+        
+        def on_response(request_id: str, response: dict, exception: Exception):
+            index = int(request_id)
+            if exception is not None:
+                if is_retryable(exception) and attempt < self.scheduler.max_retries:
+                    retry.append(index)
+                    return
+                answered.add(index)
+                self._fetch_failed(message_ids[index], exception)
+                return
+            answered.add(index)
+            responses[index] = response
+        
+        while pending:
+            for start in range(0, len(pending), self.batch_size):
+                chunk = pending[start:start + self.batch_size]
+                batch = self.service.new_batch_http_request(callback=on_response)
+                for index in chunk:
+                    batch.add(self._message_request(message_ids[index]),
+                              request_id=str(index))
+                
+                try:
+                    self._execute(batch, 'messages.get', len(chunk))
+                except HttpError as error:
+                    print(f'Error fetching batch starting at {message_ids[chunk[0]]}: {error}')
+                    if self._failed_ids is not None:
+                        self._failed_ids.update(message_ids[index] for index in chunk
+                                                if index not in answered)
+                
+                # Built once the batch is done, as building may fetch attachments
+                for index, response in responses.items():
+                    results[index] = self._build_email(message_ids[index], response)
+                responses.clear()
             
-            return Email(
-                message_id=message_id,
-                subject=subject or '(No Subject)',
-                sender=sender or '(Unknown Sender)',
-                date=date or '(Unknown Date)',
-                body=body or '(No Content)'
+            if retry:
+                self.instrumentation.add('retries', len(retry))
+                self.scheduler.throttled()
+                self.scheduler.backoff(attempt)
+                attempt += 1
+            pending, retry = sorted(retry), []
+        
+        return [results.get(index) for index in range(len(message_ids))]
+    
+    def _message_request(self, message_id: str):
+        """Build the messages.get request for the current fetch mode"""
+        if self.lazy_bodies:
+            return self.service.users().messages().get(
+                userId='me',
+                id=message_id,
+                format='metadata',
+                metadataHeaders=self.metadata_headers
             )
         
+        return self.service.users().messages().get(
+            userId='me', 
+            id=message_id, 
+            format='raw' if self.raw_mime else 'full'
+        )
+    
+    def _build_email(self, message_id: str, message: dict) -> Union[Email, _PendingEmail]:
+        """
+        Turn a messages.get response into an Email, caching full emails.
+        Raw messages are handed to the parse pool and come back pending.
+        """
+        if self.lazy_bodies:
+            with self.instrumentation.span('parse'):
+                return self._parse_metadata(message_id, message)
+        
+        if self.raw_mime:
+            parser = self._parser()
+            if parser is not None:
+                self.instrumentation.add('bytes', len(message['raw'] or '') * 3 // 4)
+                return _PendingEmail(message_id, parser.submit(
+                    _parse_raw_email, message_id, message['raw'], self.limits))
+        
+        email = self._email_from_message(message_id, message)
+        if self.cache is not None:
+            self.cache.put(email, self._cache_variant, email.headers)
+        return email
+    
+    def _parse_metadata(self, message_id: str, message: dict) -> LazyEmail:
+        """Build a LazyEmail from a `format='metadata'` messages.get response"""
+        headers = message['payload'].get('headers', [])
+        subject = self._get_header(headers, 'Subject')
+        sender = self._get_header(headers, 'From')
+        date = self._get_header(headers, 'Date')
+        
+        metadata = {header['name']: header['value'] for header in headers}
+        return LazyEmail(
+            message_id=message_id,
+            subject=subject or '(No Subject)',
+            sender=sender or '(Unknown Sender)',
+            date=date or '(Unknown Date)',
+            headers=metadata,
+            load_body=lambda: self._load_body(message_id, metadata)
+        )
+    
+    def _load_body(self, message_id: str, headers: Dict[str, str]) -> Optional[str]:
+        """
+        Fetch and decode the full body of a lazily loaded email, caching it
+        with its metadata headers. A body cached without headers is reused.
+        """
+        if self.cache is not None:
+            cached = self.cache.get(message_id, self._cache_variant)
+            if cached is not None:
+                self.cache.put(cached, self._cache_variant, headers)
+                return cached.body
+        
+        try:
+            message = self._execute(self.service.users().messages().get(
+                userId='me',
+                id=message_id,
+                format='raw' if self.raw_mime else 'full'
+            ))
         except HttpError as error:
-            print(f'Error fetching email {message_id}: {error}')
+            print(f'Error fetching body of email {message_id}: {error}')
             return None
+        
+        email = self._email_from_message(message_id, message)
+        if self.cache is not None:
+            self.cache.put(email, self._cache_variant, headers)
+        return email.body
+    
+    def _email_from_message(self, message_id: str, message: dict) -> Email:
+        """Parse a `format='raw'` or `format='full'` response on this thread"""
+        with self.instrumentation.span('parse'):
+            if self.raw_mime:
+                self.instrumentation.add('bytes', len(message['raw'] or '') * 3 // 4)
+                return _parse_raw_email(message_id, message['raw'], self.limits)
+            return self._parse_message(message_id, message)
+    
+    def _parse_message(self, message_id: str, message: dict) -> Email:
+        """Build an Email from a `format='full'` messages.get response"""
+        headers = message['payload'].get('headers', [])
+        subject = self._get_header(headers, 'Subject')
+        sender = self._get_header(headers, 'From')
+        date = self._get_header(headers, 'Date')
+        body = self._get_email_body(message['payload'], message_id)
+        
+        email = _make_email(message_id, subject, sender, date, body, self.limits)
+        email.headers = self._metadata(headers)
+        return email
     
     def _get_header(self, headers: List[dict], name: str) -> Optional[str]:
         """Extract a specific header value from email headers"""
@@ -162,44 +1085,42 @@ class GmailFetcher:
                 return header['value']
         return None
     
-    def _get_email_body(self, payload: dict) -> str:
+    def _get_email_body(self, payload: dict, message_id: Optional[str] = None) -> str:
         """
-        Recursively extract email body from payload.
-        Prefers text/plain, falls back to text/html.
+        Extract email body from payload.
+        Prefers text/plain, falls back to the visible text of text/html.
+        Parts Gmail serves as attachments are downloaded when message_id is
+        given.
         """
-        def extract_parts(part: dict, prefer_plain: bool = True) -> tuple[str, str]:
-            """
-            Recursively extract text/plain and text/html from parts.
-            Returns: (plain_text, html_text)
-            """
-            plain_text = ''
-            html_text = ''
-            
-            mime_type = part.get('mimeType', '')
-            
-            if 'parts' in part:
-                for subpart in part['parts']:
-                    sub_plain, sub_html = extract_parts(subpart, prefer_plain)
-                    plain_text = plain_text or sub_plain
-                    html_text = html_text or sub_html
-            
-            elif mime_type == 'text/plain' and 'data' in part.get('body', {}):
-                try:
-                    plain_text = base64.urlsafe_b64decode(
-                        part['body']['data']
-                    ).decode('utf-8', errors='ignore')
-                except Exception:
-                    pass
-            
-            elif mime_type == 'text/html' and 'data' in part.get('body', {}):
-                try:
-                    html_text = base64.urlsafe_b64decode(
-                        part['body']['data']
-                    ).decode('utf-8', errors='ignore')
-                except Exception:
-                    pass
-            
-            return plain_text, html_text
+        decode = self._decode_part if self.instrumentation.enabled else None
+        if message_id is None:
+            return extract_body(payload, decode=decode)
+        return extract_body(payload, lambda part: self._load_attachment(message_id, part),
+                            decode)
+    
+    def _decode_part(self, data: str, charset: Optional[str]) -> str:
+        """decode_part_data, reported to the instrumentation"""
+        with self.instrumentation.span('decode'):
+            text = decode_part_data(data, charset)
+        self.instrumentation.add('bytes', len(data) * 3 // 4)
+        return text
+    
+    def _load_attachment(self, message_id: str, part: dict) -> Optional[str]:
+        """Download the data of an attachment-backed part, unless it exceeds the size cap"""
+        body = part['body']
+        max_bytes = self.limits.max_bytes
+        if max_bytes is not None and body.get('size', 0) > max_bytes:
+            print(f'Skipping {body["size"]}-byte part of email {message_id}: '
+                  f'larger than {max_bytes} bytes')
+            return None
         
-        plain, html = extract_parts(payload)
-        return plain or html or ''
+        try:
+            attachment = self._execute(self.service.users().messages().attachments().get(
+                userId='me',
+                messageId=message_id,
+                id=body['attachmentId']
+            ), 'messages.attachments.get')
+        except HttpError as error:
+            print(f'Error fetching attachment of email {message_id}: {error}')
+            return None
+        return attachment.get('data')
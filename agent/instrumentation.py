@@ -0,0 +1,177 @@
+"""
+Instrumentation - Hooks reporting where a fetch spends time, bytes and quota.
+
+GmailFetcher reports every stage of a fetch to its instrumentation as
+timing spans:
+
+    list, get, attachment, history, profile
+               one span per API attempt, i.e. network time
+    decode     base64url and charset decoding of a body part (format='full')
+    parse      building an Email from a response; in raw mode this is the
+               whole stdlib parse, decoding included
+    parse_wait blocking on raw-mode parse processes
+
+and as counters: `emails`, `bytes` (body bytes decoded, or raw message
+bytes received), `quota_units` (charged per attempt), `retries`,
+`cache_hits` and `cache_misses`.
+
+Spans nest (parsing a message may decode parts and download attachments),
+and each span records only its own time, excluding the spans inside it, so
+no time is counted under two stages.
+
+The default Instrumentation discards everything and costs next to nothing.
+MetricsRecorder keeps a per-run summary:
+
+    metrics = MetricsRecorder()
+    fetcher = GmailFetcher(batch_size=50, instrumentation=metrics)
+    fetcher.fetch_recent_emails(max_results=100)
+    print(metrics.report())
+
+Forward measurements elsewhere (logs, statsd, Prometheus) by subclassing
+Instrumentation with enabled = True and overriding record() and add().
+"""
+
+import threading
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import ContextManager, Dict, Optional
+
+
+_NO_SPAN = nullcontext()
+
+
+class Instrumentation:
+    """Receives fetch measurements; this base class discards them"""
+
+    # Spans are only timed when enabled
+    enabled = False
+
+    def span(self, stage: str) -> ContextManager:
+        """Context manager timing one occurrence of a stage"""
+        if not self.enabled:
+            return _NO_SPAN
+        return _Span(self, stage)
+
+    def record(self, stage: str, seconds: float):
+        """Called with the self time of every finished span"""
+
+    def add(self, counter: str, value: float = 1):
+        """Increment a counter"""
+
+
+class _Span:
+    """Times a stage and charges its duration, minus nested spans, to it"""
+
+    __slots__ = ('instrumentation', 'stage', 'start', 'nested')
+
+    _active = threading.local()
+
+    def __init__(self, instrumentation: Instrumentation, stage: str):
+        self.instrumentation = instrumentation
+        self.stage = stage
+        self.nested = 0.0
+
+    def __enter__(self) -> '_Span':
+        stack = getattr(self._active, 'stack', None)
+        if stack is None:
+            stack = self._active.stack = []
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        stack = self._active.stack
+        stack.pop()
+        if stack:
+            stack[-1].nested += elapsed
+        self.instrumentation.record(self.stage, elapsed - self.nested)
+
+
+@dataclass
+class StageStats:
+    """Time spent in one stage"""
+    calls: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    @property
+    def mean_ms(self) -> float:
+        return self.seconds / self.calls * 1000 if self.calls else 0.0
+
+
+class MetricsRecorder(Instrumentation):
+    """Thread-safe accumulator of stage timings and counters for one run"""
+
+    enabled = True
+
+    def __init__(self):
+        self.stages: Dict[str, StageStats] = {}
+        self.counters: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = StageStats()
+            stats.calls += 1
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+
+    def add(self, counter: str, value: float = 1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    @property
+    def cache_hit_ratio(self) -> Optional[float]:
+        """Share of cache lookups that hit, or None without a cache"""
+        hits = self.counters.get('cache_hits', 0)
+        lookups = hits + self.counters.get('cache_misses', 0)
+        return hits / lookups if lookups else None
+
+    def reset(self):
+        """Forget everything recorded so far"""
+        with self._lock:
+            self.stages.clear()
+            self.counters.clear()
+
+    def summary(self) -> dict:
+        """Plain-data summary of the run, e.g. for json.dump"""
+        with self._lock:
+            return {
+                'stages': {stage: {'calls': stats.calls,
+                                   'seconds': stats.seconds,
+                                   'max_seconds': stats.max_seconds}
+                           for stage, stats in self.stages.items()},
+                'counters': dict(self.counters),
+                'cache_hit_ratio': self.cache_hit_ratio
+            }
+
+    def report(self) -> str:
+        """Human-readable per-stage table and counters"""
+        with self._lock:
+            stages = sorted(self.stages.items(), key=lambda item: -item[1].seconds)
+            counters = dict(self.counters)
+        total = sum(stats.seconds for _, stats in stages)
+
+        lines = [f"{'stage':<12}{'calls':>8}{'seconds':>10}{'share':>8}"
+                 f"{'mean ms':>10}{'max ms':>10}"]
+        for stage, stats in stages:
+            share = stats.seconds / total if total else 0.0
+            lines.append(f"{stage:<12}{stats.calls:>8}{stats.seconds:>10.3f}{share:>8.0%}"
+                         f"{stats.mean_ms:>10.2f}{stats.max_seconds * 1000:>10.2f}")
+
+        hits = int(counters.get('cache_hits', 0))
+        lookups = hits + int(counters.get('cache_misses', 0))
+        totals = [
+            f"emails {int(counters.get('emails', 0))}",
+            f"bytes {counters.get('bytes', 0) / (1024 * 1024):.2f} MB",
+            f"quota units {int(counters.get('quota_units', 0))}",
+            f"retries {int(counters.get('retries', 0))}",
+        ]
+        if lookups:
+            totals.append(f"cache hits {hits}/{lookups} ({hits / lookups:.0%})")
+        lines.append(', '.join(totals))
+        return '\n'.join(lines)
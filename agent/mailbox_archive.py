@@ -0,0 +1,327 @@
+"""
+Mailbox Archive - A local, append-only snapshot of fetched emails.
+
+Exports fetched emails once, then replays them from disk with no auth and no
+network, so parsing, classification and synthesis experiments can rerun over
+months of newsletters at disk speed against a pinned dataset:
+
+    export_mailbox(GmailFetcher(batch_size=50), 'data/archive/mailbox.nla',
+                   max_results=5000)
+    replay = ArchiveReplay('data/archive/mailbox.nla')
+    emails = replay.fetch_recent_emails(max_results=100)
+
+An archive is two files:
+
+- `<path>`: a magic header followed by records. Each record is a
+  `<II` (payload length, CRC-32 of payload) prefix and a payload of a flags
+  byte, four length-prefixed utf-8 fields (message_id, subject, sender,
+  date), with FLAG_HEADERS a fifth holding the email's other metadata
+  headers (List-Id, List-Unsubscribe) as JSON, and the body in the form
+  Email holds it, zlib-compressed above COMPRESS_THRESHOLD bytes. Replay
+  never recompresses bodies.
+- `<path>.idx`: one little-endian uint64 record offset per record.
+
+Records are only ever appended, data before index, so a crash leaves at
+most an unindexed tail. The next writer indexes the complete records in it,
+found by their length and CRC, and truncates only a torn last record; a
+lost index is rebuilt the same way.
+"""
+
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import zlib
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from agent.gmail_fetcher import Email, GmailFetcher
+
+
+MAGIC = b'NLARCH1\n'
+
+RECORD_PREFIX = struct.Struct('<II')
+FIELD_LENGTH = struct.Struct('<I')
+
+# Flags byte and the four field lengths
+MIN_PAYLOAD = 1 + 4 * FIELD_LENGTH.size
+
+FLAG_COMPRESSED = 1
+FLAG_HEADERS = 2
+
+# Headers already stored in their own fields
+FIELD_HEADERS = frozenset(['subject', 'from', 'date'])
+
+QUERY_TERM = re.compile(r'(?:(from|subject):)?("[^"]*"|\S+)', re.IGNORECASE)
+
+
+def _read_offsets(index_path: str) -> array:
+    offsets = array('Q')
+    if os.path.exists(index_path):
+        with open(index_path, 'rb') as index:
+            data = index.read()
+        offsets.frombytes(data[:len(data) - len(data) % offsets.itemsize])
+    return offsets
+
+
+def _encode_record(email: Email) -> bytes:
+    body, compressed = email.stored_body
+    fields = [email.message_id, email.subject, email.sender, email.date]
+    headers = {name: value for name, value in (email.headers or {}).items()
+               if name.lower() not in FIELD_HEADERS}
+    if headers:
+        fields.append(json.dumps(headers))
+    flags = (FLAG_COMPRESSED if compressed else 0) | (FLAG_HEADERS if headers else 0)
+    parts = [bytes([flags])]
+    for field in fields:
+        encoded = field.encode('utf-8')
+        parts.append(FIELD_LENGTH.pack(len(encoded)))
+        parts.append(encoded)
+    parts.append(body)
+    payload = b''.join(parts)
+    return RECORD_PREFIX.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _decode_record(payload: bytes) -> Email:
+    flags = payload[0]
+    position = 1
+    fields = []
+    for _ in range(5 if flags & FLAG_HEADERS else 4):
+        (length,) = FIELD_LENGTH.unpack_from(payload, position)
+        position += FIELD_LENGTH.size
+        fields.append(payload[position:position + length].decode('utf-8'))
+        position += length
+    message_id, subject, sender, date = fields[:4]
+    headers = json.loads(fields[4]) if len(fields) > 4 else None
+    return Email.from_stored(message_id, subject, sender, date,
+                             payload[position:], bool(flags & FLAG_COMPRESSED), headers)
+
+
+class ArchiveWriter:
+    """Appends emails to an archive, skipping messages it already holds"""
+
+    def __init__(self, path: str):
+        """
+        Open (or create) the archive at path for appending.
+
+        Complete records the index does not cover, left by an interrupted
+        writer or a lost index, are indexed again; only a torn or corrupt
+        tail is truncated.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.index_path = f'{path}.idx'
+        self._lock = threading.Lock()
+
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            with open(path, 'wb') as data:
+                data.write(MAGIC)
+
+        with ArchiveReplay(path) as replay:
+            self.message_ids = set(replay.message_ids())
+            records, end = len(replay), replay.end_offset
+            recovered = array('Q', replay.unindexed_records())
+            self.message_ids.update(replay.message_id_at(offset) for offset in recovered)
+            if recovered:
+                end = replay.record_end(recovered[-1])
+
+        self._data = open(path, 'r+b')
+        self._data.truncate(end)
+        self._data.seek(end)
+        self._index = open(self.index_path, 'ab')
+        self._index.truncate(records * recovered.itemsize)
+        self._index.write(recovered.tobytes())
+        self._index.flush()
+
+    def append(self, email: Email) -> bool:
+        """Append one email; returns False if its message ID is already archived"""
+        with self._lock:
+            if email.message_id in self.message_ids:
+                return False
+            record = _encode_record(email)
+            offset = self._data.tell()
+            self._data.write(record)
+            self._data.flush()
+            self._index.write(struct.pack('<Q', offset))
+            self._index.flush()
+            self.message_ids.add(email.message_id)
+            return True
+
+    def extend(self, emails: Iterable[Email]) -> int:
+        """Append many emails; returns how many were new"""
+        return sum(self.append(email) for email in emails)
+
+    def close(self):
+        with self._lock:
+            self._data.close()
+            self._index.close()
+
+    def __enter__(self) -> 'ArchiveWriter':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def export_mailbox(fetcher: GmailFetcher, path: str, query: Optional[str] = None,
+                   max_results: Optional[int] = None) -> int:
+    """
+    Stream a fetcher's emails into the archive at path.
+
+    Returns:
+        Number of emails newly archived
+    """
+    with ArchiveWriter(path) as writer:
+        return writer.extend(fetcher.iter_emails(query=query, max_results=max_results,
+                                                 page_size=500))
+
+
+class ArchiveReplay:
+    """
+    Read-only, memory-mapped archive exposing GmailFetcher's fetch interface.
+
+    Emails come back in archive order, which for an export of a fetch is
+    Gmail's newest-first order. Records appended after opening are not seen.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._offsets = _read_offsets(f'{path}.idx')
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        if self._map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a mailbox archive")
+
+        # Drop index entries for records that never fully reached the data file
+        while self._offsets and not self._record_fits(len(self._offsets) - 1, size):
+            self._offsets.pop()
+        self._positions: Optional[Dict[str, int]] = None
+
+    def _record_fits(self, position: int, size: int) -> bool:
+        offset = self._offsets[position]
+        if offset + RECORD_PREFIX.size > size:
+            return False
+        return self.record_end(offset) <= size
+
+    def record_end(self, offset: int) -> int:
+        """Offset just past the record at offset"""
+        length, _ = RECORD_PREFIX.unpack_from(self._map, offset)
+        return offset + RECORD_PREFIX.size + length
+
+    @property
+    def end_offset(self) -> int:
+        """Offset just past the last indexed record"""
+        if not self._offsets:
+            return len(MAGIC)
+        return self.record_end(self._offsets[-1])
+
+    def unindexed_records(self) -> Iterator[int]:
+        """
+        Offsets of the complete records after the last indexed one, found by
+        their length and CRC. Stops at the first torn or corrupt record.
+        """
+        offset, size = self.end_offset, len(self._map)
+        while offset + RECORD_PREFIX.size <= size:
+            length, checksum = RECORD_PREFIX.unpack_from(self._map, offset)
+            start = offset + RECORD_PREFIX.size
+            if length < MIN_PAYLOAD or start + length > size \
+                    or zlib.crc32(self._map[start:start + length]) != checksum:
+                return
+            yield offset
+            offset = start + length
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __getitem__(self, position: int) -> Email:
+        """The email at a record position"""
+        offset = self._offsets[position]
+        length, checksum = RECORD_PREFIX.unpack_from(self._map, offset)
+        start = offset + RECORD_PREFIX.size
+        payload = self._map[start:start + length]
+        if zlib.crc32(payload) != checksum:
+            raise ValueError(f"Corrupt record at offset {offset} in {self.path}")
+        return _decode_record(payload)
+
+    def __iter__(self) -> Iterator[Email]:
+        for position in range(len(self._offsets)):
+            yield self[position]
+
+    def message_id_at(self, offset: int) -> str:
+        """Message ID of the record at offset, read without decoding the body"""
+        start = offset + RECORD_PREFIX.size + 1
+        (length,) = FIELD_LENGTH.unpack_from(self._map, start)
+        start += FIELD_LENGTH.size
+        return self._map[start:start + length].decode('utf-8')
+
+    def message_ids(self) -> List[str]:
+        """Message IDs in archive order, read without decoding bodies"""
+        return [self.message_id_at(offset) for offset in self._offsets]
+
+    def get(self, message_id: str) -> Optional[Email]:
+        """Look up an email by message ID"""
+        if self._positions is None:
+            self._positions = {message_id: position
+                               for position, message_id in enumerate(self.message_ids())}
+        position = self._positions.get(message_id)
+        return self[position] if position is not None else None
+
+    def fetch_recent_emails(self, max_results: int = 10,
+                            query: Optional[str] = None) -> List[Email]:
+        """Same interface as GmailFetcher.fetch_recent_emails, served from the archive"""
+        return list(self.iter_emails(query=query, max_results=max_results))
+
+    def iter_emails(self, query: Optional[str] = None,
+                    max_results: Optional[int] = None,
+                    page_size: int = 100) -> Iterator[Email]:
+        """
+        Same interface as GmailFetcher.iter_emails, served from the archive.
+
+        Supports a small subset of Gmail's query syntax: `from:` and
+        `subject:` terms and bare words, all case-insensitive substrings,
+        all of which must match. page_size is accepted for compatibility.
+        """
+        if max_results == 0:
+            return
+        terms = self._parse_query(query) if query else []
+        yielded = 0
+
+        for email in self:
+            if terms and not all(self._matches(email, field, value) for field, value in terms):
+                continue
+            yield email
+            yielded += 1
+            if max_results is not None and yielded >= max_results:
+                return
+
+    @staticmethod
+    def _parse_query(query: str) -> List[tuple]:
+        return [((field or '').lower(), value.strip('"').lower())
+                for field, value in QUERY_TERM.findall(query)]
+
+    @staticmethod
+    def _matches(email: Email, field: str, value: str) -> bool:
+        if field == 'from':
+            return value in email.sender.lower()
+        if field == 'subject':
+            return value in email.subject.lower()
+        return value in email.subject.lower() or value in email.sender.lower() \
+            or value in email.body.lower()
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> 'ArchiveReplay':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
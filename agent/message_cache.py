@@ -0,0 +1,155 @@
+"""
+Message Cache - Persists parsed emails on disk, keyed by Gmail message ID.
+
+Gmail messages are immutable, but a cached email is parser output, which
+also depends on the parser version and fetcher settings such as the body
+size cap. Entries are therefore stored under a variant naming those, and a
+fetcher only reads entries of its own variant.
+
+Entries may also carry the message's metadata headers (List-Id,
+List-Unsubscribe, ...), so a lazy-bodies fetcher can serve cache hits with
+the headers newsletter classification relies on.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Optional, Tuple
+
+from agent.gmail_fetcher import Email
+
+
+class MessageCache:
+    """SQLite-backed LRU cache of parsed Email objects"""
+
+    def __init__(self, path: str = 'data/message_cache.db', max_entries: int = 10000):
+        """
+        Open (or create) the cache.
+
+        Args:
+            path: SQLite database file
+            max_entries: Least recently used emails are evicted beyond this size
+        """
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        # Caches from before variants hold output of unknown provenance
+        columns = [row[1] for row in self._db.execute('PRAGMA table_info(emails)')]
+        if columns and 'variant' not in columns:
+            self._db.execute('DROP TABLE emails')
+        elif columns and 'headers' not in columns:
+            self._db.execute('ALTER TABLE emails ADD COLUMN headers TEXT')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS emails ('
+            ' message_id TEXT NOT NULL,'
+            " variant TEXT NOT NULL DEFAULT '',"
+            ' subject TEXT NOT NULL,'
+            ' sender TEXT NOT NULL,'
+            ' date TEXT NOT NULL,'
+            ' body TEXT NOT NULL,'
+            ' last_used INTEGER NOT NULL,'
+            ' headers TEXT,'
+            ' PRIMARY KEY (message_id, variant))'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS emails_last_used ON emails (last_used)')
+
+        # A logical clock orders accesses without depending on timer resolution
+        self._clock = self._db.execute(
+            'SELECT COALESCE(MAX(last_used), 0) FROM emails').fetchone()[0]
+        self._count = self._db.execute('SELECT COUNT(*) FROM emails').fetchone()[0]
+
+    def get(self, message_id: str, variant: str = '') -> Optional[Email]:
+        """Return the email cached for a variant, or None on a miss"""
+        entry = self.lookup(message_id, variant)
+        return entry[0] if entry is not None else None
+
+    def lookup(self, message_id: str,
+               variant: str = '') -> Optional[Tuple[Email, Optional[Dict[str, str]]]]:
+        """Return (email, headers or None if none were stored) for a variant, or None on a miss"""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT subject, sender, date, body, headers FROM emails '
+                'WHERE message_id = ? AND variant = ?',
+                (message_id, variant)
+            ).fetchone()
+            if row is None:
+                return None
+
+            self._clock += 1
+            self._db.execute('UPDATE emails SET last_used = ? '
+                             'WHERE message_id = ? AND variant = ?',
+                             (self._clock, message_id, variant))
+
+        subject, sender, date, body, headers = row
+        email = Email(message_id=message_id, subject=subject, sender=sender,
+                      date=date, body=body)
+        return email, json.loads(headers) if headers is not None else None
+
+    def put(self, email: Email, variant: str = '',
+            headers: Optional[Dict[str, str]] = None):
+        """
+        Store an email for a variant, evicting the least recently used beyond
+        max_entries. headers, when given, are added to an existing entry too.
+        """
+        encoded = json.dumps(headers) if headers is not None else None
+        with self._lock:
+            self._clock += 1
+            cursor = self._db.execute(
+                'INSERT OR IGNORE INTO emails VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (email.message_id, variant, email.subject, email.sender, email.date,
+                 email.body, self._clock, encoded)
+            )
+            if cursor.rowcount == 0:
+                self._db.execute('UPDATE emails SET last_used = ?, '
+                                 'headers = COALESCE(?, headers) '
+                                 'WHERE message_id = ? AND variant = ?',
+                                 (self._clock, encoded, email.message_id, variant))
+                return
+
+            self._count += 1
+            if self._count > self.max_entries:
+                excess = self._count - self.max_entries
+                self._db.execute(
+                    'DELETE FROM emails WHERE rowid IN ('
+                    ' SELECT rowid FROM emails ORDER BY last_used LIMIT ?)',
+                    (excess,)
+                )
+                self._count -= excess
+
+    def invalidate(self, message_id: str) -> bool:
+        """Drop one email in every variant; returns whether it was cached"""
+        with self._lock:
+            cursor = self._db.execute('DELETE FROM emails WHERE message_id = ?',
+                                      (message_id,))
+            self._count -= cursor.rowcount
+            return cursor.rowcount > 0
+
+    def clear(self):
+        """Drop every cached email"""
+        with self._lock:
+            self._db.execute('DELETE FROM emails')
+            self._count = 0
+
+    def close(self):
+        """Close the underlying database"""
+        with self._lock:
+            self._db.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, message_id: str) -> bool:
+        with self._lock:
+            return self._db.execute('SELECT 1 FROM emails WHERE message_id = ?',
+                                    (message_id,)).fetchone() is not None
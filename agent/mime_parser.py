@@ -0,0 +1,319 @@
+"""
+MIME Parser - Extracts readable bodies from Gmail message payloads.
+
+Handles both `format='full'` JSON payloads and `format='raw'` RFC 2822
+messages. Raw parsing is self-contained and returns plain tuples, so it can
+run in worker processes.
+"""
+
+import base64
+import codecs
+import email
+import re
+from email.header import decode_header, make_header
+from html.parser import HTMLParser
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+
+CHARSET_PATTERN = re.compile(r'charset\s*=\s*"?([^";\s]+)', re.IGNORECASE)
+ATTACHMENT_DISPOSITION = re.compile(r'^\s*attachment\b', re.IGNORECASE)
+
+# Bump whenever a change alters the bodies parsed from the same message;
+# cached emails parsed by another version are not reused
+PARSER_VERSION = 6
+
+
+def extract_body(payload: dict,
+                 load_data: Optional[Callable[[dict], Optional[str]]] = None,
+                 decode: Optional[Callable[[str, Optional[str]], str]] = None) -> str:
+    """
+    Extract the body of a `format='full'` Gmail payload.
+
+    Walks the MIME tree once, depth first, and stops at the first non-empty
+    text/plain part. text/html is only decoded when no plain text exists,
+    and is then converted to text with html_to_text.
+
+    Gmail moves the content of large parts behind `body.attachmentId`. Such
+    parts are only read through load_data, and only once selected, so an
+    attachment-backed html part is never downloaded when plain text exists.
+    File attachments, parts with a filename or an attachment disposition,
+    are never the body, as in parse_raw_message.
+
+    Args:
+        payload: The message's `payload` part
+        load_data: Returns the base64url data of an attachment-backed part,
+            or None if it cannot be loaded. Without it those parts are skipped.
+        decode: Replaces decode_part_data, e.g. to measure decoding
+
+    Returns:
+        Decoded body text, or '' if the message has no readable part
+    """
+    decode = decode or decode_part_data
+    html_part = None
+    stack = [payload]
+
+    while stack:
+        part = stack.pop()
+
+        if 'parts' in part:
+            stack.extend(reversed(part['parts']))
+            continue
+
+        body = part.get('body', {})
+        if not body.get('data') and not (load_data and body.get('attachmentId')):
+            continue
+        if is_attachment(part):
+            continue
+
+        mime_type = part.get('mimeType', '').lower()
+        if mime_type == 'text/plain':
+            data = _part_data(part, load_data)
+            text = decode(data, part_charset(part)) if data else ''
+            if text:
+                return text
+        elif mime_type == 'text/html' and html_part is None:
+            html_part = part
+
+    if html_part is not None:
+        data = _part_data(html_part, load_data)
+        return html_to_text(decode(data, part_charset(html_part))) if data else ''
+    return ''
+
+
+def _part_data(part: dict, load_data: Optional[Callable[[dict], Optional[str]]]) -> Optional[str]:
+    """A part's inline data, or its attachment's data when it has none"""
+    data = part['body'].get('data')
+    if data or load_data is None:
+        return data
+    return load_data(part)
+
+
+def is_attachment(part: dict) -> bool:
+    """Whether a part is a file attachment: it has a filename or an attachment disposition"""
+    if part.get('filename'):
+        return True
+    return any(header['name'].lower() == 'content-disposition'
+               and ATTACHMENT_DISPOSITION.match(header['value'])
+               for header in part.get('headers', []))
+
+
+def part_charset(part: dict) -> Optional[str]:
+    """Read the charset parameter from a part's Content-Type header"""
+    for header in part.get('headers', []):
+        if header['name'].lower() == 'content-type':
+            match = CHARSET_PATTERN.search(header['value'])
+            return match.group(1) if match else None
+    return None
+
+
+def decode_part_data(data: str, charset: Optional[str] = None) -> str:
+    """
+    Decode base64url part data to text.
+
+    Unknown or missing charsets fall back to utf-8; undecodable bytes are
+    dropped rather than failing the whole message.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+    except (ValueError, TypeError):
+        return ''
+    return decode_bytes(raw, charset)
+
+
+def decode_bytes(raw: bytes, charset: Optional[str] = None) -> str:
+    """Decode bytes in charset, falling back to utf-8 and dropping undecodable bytes"""
+    try:
+        codec = codecs.lookup(charset or 'utf-8').name
+    except LookupError:
+        codec = 'utf-8'
+    return raw.decode(codec, errors='ignore')
+
+
+def parse_raw_message(raw: str) -> Tuple[str, str, str, str]:
+    """
+    Parse a `format='raw'` message with the stdlib email package.
+
+    Body selection matches extract_body: the first non-empty text/plain
+    part, else the first text/html part converted to text. Attachments are
+    skipped. Encoded-word headers are decoded.
+
+    Args:
+        raw: The message's base64url `raw` field
+
+    Returns:
+        (subject, sender, date, body); missing values are ''
+    """
+    # The compat32 policy skips structured header parsing, which would
+    # otherwise dominate parse time; only the needed headers are decoded
+    message = email.message_from_bytes(base64.urlsafe_b64decode(raw + '=' * (-len(raw) % 4)))
+    html_part = None
+    body = ''
+
+    for part in message.walk():
+        if part.is_multipart() or part.get_content_disposition() == 'attachment':
+            continue
+
+        content_type = part.get_content_type()
+        if content_type == 'text/plain':
+            text = _part_text(part)
+            if text:
+                body = text
+                break
+        elif content_type == 'text/html' and html_part is None:
+            html_part = part
+    else:
+        if html_part is not None:
+            body = html_to_text(_part_text(html_part))
+
+    return (
+        _header(message, 'Subject'),
+        _header(message, 'From'),
+        _header(message, 'Date'),
+        body
+    )
+
+
+def _part_text(part) -> str:
+    payload = part.get_payload(decode=True)
+    return decode_bytes(payload, part.get_content_charset()) if payload else ''
+
+
+def _header(message, name: str) -> str:
+    """A header's value with encoded words decoded; malformed ones are kept as is"""
+    value = message.get(name)
+    if value is None:
+        return ''
+    try:
+        return str(make_header(decode_header(value)))
+    except (ValueError, LookupError, UnicodeDecodeError):
+        return str(value)
+
+
+# Elements whose content is never shown. head is left out: its end tag is
+# optional, and an unclosed head would hide the whole body. What it holds is
+# skipped here (title, style, script) or void (meta, link)
+SKIPPED_TAGS = frozenset(['script', 'style', 'title', 'noscript', 'template'])
+
+# Elements that end a paragraph
+BLOCK_TAGS = frozenset([
+    'p', 'div', 'tr', 'li', 'ul', 'ol', 'table', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'blockquote', 'pre', 'hr', 'section', 'article', 'header', 'footer', 'center',
+    'body', 'html'
+])
+
+# Table cells, separated by a space so adjacent cells don't run together
+CELL_TAGS = frozenset(['td', 'th'])
+
+# Elements without an end tag
+VOID_TAGS = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta',
+    'param', 'source', 'track', 'wbr'
+])
+
+# Inline styles newsletters use to hide preheaders and spacers. font-size:0
+# and opacity:0 are left out: layout frameworks such as MJML put font-size:0
+# on column wrappers to collapse whitespace and reset it on their children
+HIDDEN_STYLE = re.compile(
+    r'display\s*:\s*none|visibility\s*:\s*hidden|mso-hide\s*:\s*all'
+    r'|max-height\s*:\s*0(?![.\d])',
+    re.IGNORECASE
+)
+
+# Zero-width and soft-hyphen characters used to pad preheaders
+INVISIBLE = dict.fromkeys(map(ord, '\u200b\u200c\u200d\u2060\ufeff\u034f\u00ad'), None)
+
+
+class HtmlCleaner(HTMLParser):
+    """
+    Streaming extractor of the text a reader would see, as paragraphs.
+
+    A single pass drops scripts, styles and elements hidden by inline CSS
+    or the hidden/aria-hidden attributes (such as newsletter preheaders).
+    Images, tracking pixels included, contribute no text. Block elements
+    end a paragraph, <br> ends a line within one and table cells are
+    separated by a space. Feed html in chunks of any size; take_paragraphs()
+    returns the paragraphs completed so far.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.paragraphs: List[str] = []
+        self._lines: List[str] = []
+        self._line: List[str] = []
+        # Open elements as (tag, whether it hides its content)
+        self._open: List[Tuple[str, bool]] = []
+        self._hiding = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in BLOCK_TAGS:
+            self.end_paragraph()
+        elif tag == 'br':
+            self.end_line()
+        elif tag in CELL_TAGS:
+            self._line.append(' ')
+        if tag in VOID_TAGS:
+            return
+
+        hides = tag in SKIPPED_TAGS or any(
+            name == 'hidden'
+            or (name == 'aria-hidden' and value == 'true')
+            or (name == 'style' and value and HIDDEN_STYLE.search(value))
+            for name, value in attrs
+        )
+        self._open.append((tag, hides))
+        self._hiding += hides
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in BLOCK_TAGS:
+            self.end_paragraph()
+        # Close the innermost matching element and anything left open inside it
+        for position in range(len(self._open) - 1, -1, -1):
+            if self._open[position][0] == tag:
+                self._hiding -= sum(hides for _, hides in self._open[position:])
+                del self._open[position:]
+                break
+
+    def handle_data(self, data):
+        if not self._hiding:
+            self._line.append(data)
+
+    def end_line(self):
+        line = ' '.join(''.join(self._line).translate(INVISIBLE).split())
+        if line:
+            self._lines.append(line)
+        self._line = []
+
+    def end_paragraph(self):
+        self.end_line()
+        if self._lines:
+            self.paragraphs.append('\n'.join(self._lines))
+            self._lines = []
+
+    def take_paragraphs(self) -> List[str]:
+        """Paragraphs completed since the last call"""
+        paragraphs, self.paragraphs = self.paragraphs, []
+        return paragraphs
+
+    def close(self):
+        super().close()
+        self.end_paragraph()
+
+
+def iter_html_paragraphs(chunks: Iterable[str]) -> Iterator[str]:
+    """Visible paragraphs of html arriving in chunks, yielded as each completes"""
+    cleaner = HtmlCleaner()
+    for chunk in chunks:
+        cleaner.feed(chunk)
+        yield from cleaner.take_paragraphs()
+    cleaner.close()
+    yield from cleaner.take_paragraphs()
+
+
+def html_to_text(html: str) -> str:
+    """Convert HTML to its visible text: paragraphs separated by blank lines"""
+    return '\n\n'.join(iter_html_paragraphs([html]))
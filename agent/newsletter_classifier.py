@@ -0,0 +1,185 @@
+"""
+Newsletter Classifier - Rule-based newsletter detection from email headers.
+
+Rules only look at headers (sender, subject, List-* headers), so they can run
+on the LazyEmail objects returned by a metadata-first fetcher and skip
+downloading the bodies of everything that is not a newsletter:
+
+    fetcher = GmailFetcher(lazy_bodies=True, batch_size=50)
+    classifier = NewsletterClassifier()
+    for email in classifier.filter(fetcher.iter_emails(max_results=500)):
+        print(email.subject, len(email.body))
+"""
+
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from agent.gmail_fetcher import Email
+
+
+# Sending domains of newsletter platforms; subdomains match too
+NEWSLETTER_DOMAINS = frozenset([
+    'substack.com',
+    'substackcdn.com',
+    'beehiiv.com',
+    'mail.beehiiv.com',
+    'maven.com',
+    'convertkit.com',
+    'ck.page',
+    'mailchimp.com',
+    'mcsv.net',
+    'buttondown.email',
+    'ghost.io',
+    'revue.email',
+    'every.to',
+    'morningbrew.com',
+    'tldrnewsletter.com',
+])
+
+# Local parts used by bulk senders
+SENDER_PATTERN = re.compile(
+    r'^(newsletters?|digest|news|hello|updates?|weekly|editor|team|no-?reply)@',
+    re.IGNORECASE
+)
+
+# Subject lines typical of newsletter issues
+SUBJECT_PATTERN = re.compile(
+    r'\b(issue\s*#?\d+|edition|newsletter|digest|weekly|roundup|this week in)\b',
+    re.IGNORECASE
+)
+
+ADDRESS_PATTERN = re.compile(r'([\w.+-]+)@([\w-]+(?:\.[\w-]+)+)')
+
+# Weight contributed by each rule when it matches
+RULE_WEIGHTS = {
+    'sender_domain': 2.0,
+    'list_unsubscribe': 1.0,
+    'list_id': 1.0,
+    'sender_pattern': 0.5,
+    'subject_pattern': 0.5,
+}
+
+
+@dataclass
+class Classification:
+    """Outcome of classifying one email"""
+    is_newsletter: bool
+    score: float
+    rules: List[str] = field(default_factory=list)
+
+
+@dataclass
+class ClassifierReport:
+    """Accuracy and speed of a classifier over a labelled sample"""
+    messages: int
+    true_positives: int
+    false_positives: int
+    false_negatives: int
+    precision: float
+    recall: float
+    mean_latency_us: float
+    p99_latency_us: float
+
+
+class NewsletterClassifier:
+    """Scores emails against compiled header rules"""
+
+    def __init__(self, domains: Iterable[str] = NEWSLETTER_DOMAINS,
+                 threshold: float = 1.0,
+                 weights: Optional[Dict[str, float]] = None):
+        """
+        Args:
+            domains: Sender domains that identify newsletter platforms
+            threshold: Minimum rule score for an email to count as a newsletter
+            weights: Per-rule weights (defaults to RULE_WEIGHTS)
+        """
+        self.domains = frozenset(domain.lower() for domain in domains)
+        self.threshold = threshold
+        self.weights = {**RULE_WEIGHTS, **(weights or {})}
+
+    def classify(self, email: Email) -> Classification:
+        """Score one email using only its headers"""
+        rules = []
+        address = ADDRESS_PATTERN.search(email.sender)
+
+        if address:
+            local_part, domain = address.group(1), address.group(2).lower()
+            if self._is_newsletter_domain(domain):
+                rules.append('sender_domain')
+            if SENDER_PATTERN.match(f'{local_part}@'):
+                rules.append('sender_pattern')
+
+        headers = getattr(email, 'headers', None)
+        if headers:
+            names = {name.lower() for name in headers}
+            if 'list-unsubscribe' in names:
+                rules.append('list_unsubscribe')
+            if 'list-id' in names:
+                rules.append('list_id')
+
+        if SUBJECT_PATTERN.search(email.subject):
+            rules.append('subject_pattern')
+
+        score = sum(self.weights[rule] for rule in rules)
+        return Classification(is_newsletter=score >= self.threshold, score=score, rules=rules)
+
+    def is_newsletter(self, email: Email) -> bool:
+        """Whether an email scores as a newsletter"""
+        return self.classify(email).is_newsletter
+
+    def filter(self, emails: Iterable[Email]) -> Iterator[Email]:
+        """Yield only the newsletters, without touching any email's body"""
+        for email in emails:
+            if self.classify(email).is_newsletter:
+                yield email
+
+    def evaluate(self, labelled: Iterable[Tuple[Email, bool]]) -> ClassifierReport:
+        """
+        Measure precision, recall and per-message latency.
+
+        Args:
+            labelled: (email, is_newsletter) pairs
+
+        Returns:
+            ClassifierReport for the sample
+        """
+        true_positives = false_positives = false_negatives = 0
+        latencies = []
+
+        for email, expected in labelled:
+            start = time.perf_counter_ns()
+            predicted = self.classify(email).is_newsletter
+            latencies.append(time.perf_counter_ns() - start)
+
+            if predicted and expected:
+                true_positives += 1
+            elif predicted:
+                false_positives += 1
+            elif expected:
+                false_negatives += 1
+
+        latencies.sort()
+        predicted_positives = true_positives + false_positives
+        actual_positives = true_positives + false_negatives
+
+        return ClassifierReport(
+            messages=len(latencies),
+            true_positives=true_positives,
+            false_positives=false_positives,
+            false_negatives=false_negatives,
+            precision=true_positives / predicted_positives if predicted_positives else 1.0,
+            recall=true_positives / actual_positives if actual_positives else 1.0,
+            mean_latency_us=sum(latencies) / len(latencies) / 1000 if latencies else 0.0,
+            p99_latency_us=latencies[int(len(latencies) * 0.99)] / 1000 if latencies else 0.0
+        )
+
+    def _is_newsletter_domain(self, domain: str) -> bool:
+        """Match a domain or any parent domain against the domain set"""
+        while True:
+            if domain in self.domains:
+                return True
+            _, dot, domain = domain.partition('.')
+            if not dot or '.' not in domain:
+                return False
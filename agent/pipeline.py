@@ -0,0 +1,318 @@
+"""
+Pipeline - Incremental, memoized processing of fetched emails.
+
+The digest flow (fetch → filter → extract → embed → ...) is a chain of
+per-message stages. Every stage output is stored under a content address:
+the message ID plus the stage's fingerprint, a hash of its name, version,
+config, code and the fingerprints of the stages it depends on. A rerun
+therefore only computes stages for new messages, or for stages whose code
+or config changed, and everything downstream of them:
+
+    pipeline = Pipeline([
+        Stage('filter', lambda email, outputs: classifier.is_newsletter(email) or DROP),
+        Stage('extract', lambda email, outputs: searchable_body(email.body)),
+        Stage('embed', lambda email, outputs: embedder.embed([outputs['extract']])[0],
+              config={'dimension': 256}),
+    ])
+    for result in pipeline.run(fetcher.iter_emails(max_results=500)):
+        ...  # result.outputs['embed']
+
+With a lazy-bodies fetcher, a message whose outputs are all stored never
+has its body downloaded.
+
+Each stage runs on its own thread, connected to the next by a bounded
+queue, so stages overlap (fetching one message while embedding another)
+and a slow stage holds back the ones before it instead of letting work pile
+up in memory.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import queue
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from agent.gmail_fetcher import Email
+from agent.instrumentation import Instrumentation
+
+
+class _Drop:
+    """Stage output that stops a message from reaching later stages"""
+
+    def __repr__(self) -> str:
+        return 'DROP'
+
+    def __reduce__(self) -> str:
+        return 'DROP'
+
+
+DROP = _Drop()
+
+# End of the email stream on a stage queue
+_DONE = object()
+
+
+def _code_identity(func: Callable) -> str:
+    """Source of func, or its bytecode when the source is unavailable"""
+    try:
+        return inspect.getsource(func)
+    except (OSError, TypeError):
+        code = getattr(func, '__code__', None)
+        if code is not None:
+            return code.co_code.hex() + repr(code.co_consts)
+        return getattr(func, '__qualname__', type(func).__qualname__)
+
+
+@dataclass
+class Stage:
+    """
+    One per-message step of a pipeline.
+
+    Args:
+        name: Unique name; later stages read this stage's output under it
+        func: Called as func(email, outputs) with the outputs of earlier
+            stages; returns the stage output, or DROP to stop the message
+        version: Bump to invalidate stored outputs when a change is not
+            visible in func's source (e.g. a model or library upgrade)
+        config: Parameters func depends on; part of the fingerprint
+        depends_on: Stages whose outputs func reads. None (the default)
+            means every earlier stage.
+    """
+    name: str
+    func: Callable[[Email, Dict[str, Any]], Any]
+    version: str = '1'
+    config: Dict[str, Any] = field(default_factory=dict)
+    depends_on: Optional[Sequence[str]] = None
+
+
+@dataclass
+class PipelineResult:
+    """A message that made it through every stage"""
+    email: Email
+    outputs: Dict[str, Any]
+    computed: List[str]
+
+
+@dataclass
+class StageCounts:
+    """How a stage handled the messages of one run"""
+    computed: int = 0
+    reused: int = 0
+    dropped: int = 0
+    failed: int = 0
+
+
+class OutputStore:
+    """SQLite-backed store of stage outputs keyed by content address"""
+
+    def __init__(self, path: str = 'data/pipeline.db'):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS outputs ('
+            ' address TEXT PRIMARY KEY,'
+            ' stage TEXT NOT NULL,'
+            ' fingerprint TEXT NOT NULL,'
+            ' message_id TEXT NOT NULL,'
+            ' value BLOB NOT NULL)'
+        )
+
+    @staticmethod
+    def address(message_id: str, fingerprint: str) -> str:
+        return hashlib.sha256(f'{fingerprint}\0{message_id}'.encode('utf-8')).hexdigest()
+
+    def get(self, address: str) -> tuple:
+        """(found, value) for a content address"""
+        with self._lock:
+            row = self._db.execute('SELECT value FROM outputs WHERE address = ?',
+                                   (address,)).fetchone()
+        return (True, pickle.loads(row[0])) if row else (False, None)
+
+    def put(self, address: str, stage: str, fingerprint: str, message_id: str, value: Any):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?, ?)',
+                             (address, stage, fingerprint, message_id, blob))
+
+    def prune(self, fingerprints: Dict[str, str]) -> int:
+        """Delete outputs of the given stages that carry another fingerprint"""
+        with self._lock:
+            self._db.execute('BEGIN')
+            removed = sum(self._db.execute(
+                'DELETE FROM outputs WHERE stage = ? AND fingerprint != ?',
+                (stage, fingerprint)).rowcount for stage, fingerprint in fingerprints.items())
+            self._db.execute('COMMIT')
+        return removed
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM outputs').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class Pipeline:
+    """Chain of memoized stages run as a streaming, backpressured generator"""
+
+    def __init__(self, stages: Sequence[Stage], store: Optional[OutputStore] = None,
+                 queue_size: int = 32,
+                 instrumentation: Optional[Instrumentation] = None):
+        """
+        Args:
+            stages: Stages in execution order
+            store: Where outputs persist (defaults to OutputStore())
+            queue_size: Messages buffered between consecutive stages
+            instrumentation: Receives a `stage.<name>` span per computed output
+        """
+        names = [stage.name for stage in stages]
+        if len(set(names)) != len(names):
+            raise ValueError("Stage names must be unique")
+        for position, stage in enumerate(stages):
+            unknown = set(stage.depends_on or ()) - set(names[:position])
+            if unknown:
+                raise ValueError(f"Stage {stage.name!r} depends on {sorted(unknown)}, "
+                                 "which do not run before it")
+        if queue_size < 1:
+            raise ValueError("queue_size must be at least 1")
+
+        self.stages = list(stages)
+        self.store = store if store is not None else OutputStore()
+        self.queue_size = queue_size
+        self.instrumentation = instrumentation or Instrumentation()
+        self.fingerprints = self._fingerprint_stages()
+        self.counts: Dict[str, StageCounts] = {}
+
+    def _fingerprint_stages(self) -> Dict[str, str]:
+        fingerprints: Dict[str, str] = {}
+        for position, stage in enumerate(self.stages):
+            depends_on = self.stages[:position] if stage.depends_on is None \
+                else [other for other in self.stages[:position] if other.name in stage.depends_on]
+            identity = json.dumps({
+                'name': stage.name,
+                'version': stage.version,
+                'config': stage.config,
+                'code': _code_identity(stage.func),
+                'depends_on': [fingerprints[other.name] for other in depends_on],
+            }, sort_keys=True, default=repr)
+            fingerprints[stage.name] = hashlib.sha256(identity.encode('utf-8')).hexdigest()
+        return fingerprints
+
+    def run(self, emails: Iterable[Email]) -> Iterator[PipelineResult]:
+        """
+        Stream emails through every stage, yielding those no stage dropped.
+
+        Results come out in input order. Messages a stage fails on are
+        reported and dropped, and nothing is stored for them. counts is
+        reset and filled in as the run proceeds.
+        """
+        self.counts = {stage.name: StageCounts() for stage in self.stages}
+        stop = threading.Event()
+        queues = [queue.Queue(self.queue_size) for _ in range(len(self.stages) + 1)]
+        errors: List[BaseException] = []
+
+        def feed():
+            try:
+                for email in emails:
+                    if not self._put(queues[0], PipelineResult(email, {}, []), stop):
+                        return
+            except BaseException as error:
+                errors.append(error)
+            self._put(queues[0], _DONE, stop)
+
+        threads = [threading.Thread(target=feed, daemon=True)]
+        threads += [threading.Thread(target=self._work, daemon=True,
+                                     args=(stage, queues[position], queues[position + 1],
+                                           stop, errors))
+                    for position, stage in enumerate(self.stages)]
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                result = queues[-1].get()
+                if result is _DONE:
+                    break
+                yield result
+            if errors:
+                raise errors[0]
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    def _work(self, stage: Stage, inbox: queue.Queue, outbox: queue.Queue,
+              stop: threading.Event, errors: List[BaseException]):
+        """Apply one stage to every message arriving in inbox"""
+        try:
+            self._apply(stage, inbox, outbox, stop)
+        except BaseException as error:
+            # e.g. the store failing; end the run and re-raise it in the consumer
+            errors.append(error)
+            self._put(outbox, _DONE, stop)
+
+    def _apply(self, stage: Stage, inbox: queue.Queue, outbox: queue.Queue,
+               stop: threading.Event):
+        counts = self.counts[stage.name]
+        fingerprint = self.fingerprints[stage.name]
+
+        while not stop.is_set():
+            try:
+                result = inbox.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if result is _DONE:
+                self._put(outbox, _DONE, stop)
+                return
+
+            message_id = result.email.message_id
+            address = self.store.address(message_id, fingerprint)
+            found, output = self.store.get(address)
+            if found:
+                counts.reused += 1
+            else:
+                try:
+                    with self.instrumentation.span(f'stage.{stage.name}'):
+                        output = stage.func(result.email, result.outputs)
+                except Exception as error:
+                    print(f'Error in stage {stage.name} for email {message_id}: {error}')
+                    counts.failed += 1
+                    continue
+                self.store.put(address, stage.name, fingerprint, message_id, output)
+                counts.computed += 1
+                result.computed.append(stage.name)
+
+            if output is DROP:
+                counts.dropped += 1
+                continue
+            result.outputs[stage.name] = output
+            if not self._put(outbox, result, stop):
+                return
+
+    @staticmethod
+    def _put(destination: queue.Queue, item: Any, stop: threading.Event) -> bool:
+        """Block until destination has room; False if the run was stopped"""
+        while not stop.is_set():
+            try:
+                destination.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def prune(self) -> int:
+        """Delete stored outputs made by older versions of these stages"""
+        return self.store.prune(self.fingerprints)
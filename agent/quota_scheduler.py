@@ -0,0 +1,229 @@
+"""
+Quota Scheduler - Keeps Gmail API calls under the per-user quota.
+
+Every call is charged its quota units against a token bucket, runs under an
+adaptive concurrency limit that backs off multiplicatively when Gmail
+throttles and recovers additively on success (AIMD), and is retried with
+jittered exponential backoff on 429 and 5xx responses.
+"""
+
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, ContextManager, Optional, TypeVar
+
+from googleapiclient.errors import HttpError
+
+
+# Quota units charged per call type
+# https://developers.google.com/gmail/api/reference/quota
+QUOTA_UNITS = {
+    'messages.list': 5,
+    'messages.get': 5,
+    'messages.attachments.get': 5,
+    'history.list': 2,
+    'getProfile': 1,
+}
+
+# Gmail's per-user limit: 15,000 quota units per minute
+USER_UNITS_PER_SECOND = 250
+USER_UNITS_PER_MINUTE = 15000
+
+# Default token bucket: a one-second burst, refilled slowly enough that the
+# burst plus a full minute of refill stays within the per-minute quota
+DEFAULT_BURST = USER_UNITS_PER_SECOND
+DEFAULT_UNITS_PER_SECOND = (USER_UNITS_PER_MINUTE - DEFAULT_BURST) / 60
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+T = TypeVar('T')
+
+
+def is_retryable(error: HttpError) -> bool:
+    """Whether an HttpError is throttling or a transient server failure"""
+    status = getattr(error.resp, 'status', None)
+    if status in RETRYABLE_STATUSES:
+        return True
+    # Gmail reports rate limits as 403 rateLimitExceeded/userRateLimitExceeded
+    return status == 403 and b'ratelimitexceeded' in error.content.lower()
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at a constant rate"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        """
+        Args:
+            rate: Tokens added per second
+            capacity: Maximum burst size (defaults to one second of tokens)
+        """
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1) -> float:
+        """Take tokens, blocking until they are available; returns seconds waited"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity,
+                                   self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                # Requests larger than the bucket wait for a full bucket and
+                # leave it in debt, delaying whoever comes next
+                needed = min(tokens, self.capacity)
+                # Tolerate rounding in the refill, which a fractional rate can leave short
+                if self._tokens >= needed - 1e-9:
+                    self._tokens -= tokens
+                    return waited
+                delay = (needed - self._tokens) / self.rate
+            self._sleep(delay)
+            waited += delay
+
+
+class AdaptiveLimiter:
+    """Concurrency limit adjusted additive-increase/multiplicative-decrease"""
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: Optional[int] = None):
+        self.minimum = minimum
+        self.maximum = maximum or initial
+        self._limit = float(initial)
+        self._in_flight = 0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def acquire(self):
+        with self._condition:
+            while self._in_flight >= int(self._limit):
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify()
+
+    def on_success(self):
+        """Grow by roughly one slot per limit's worth of successes"""
+        with self._condition:
+            self._limit = min(self.maximum, self._limit + 1 / self._limit)
+            self._condition.notify()
+
+    def on_throttle(self):
+        """Halve the limit"""
+        with self._condition:
+            self._limit = max(self.minimum, self._limit / 2)
+
+
+@dataclass
+class SchedulerStats:
+    """Counters accumulated by a QuotaScheduler"""
+    calls: int = 0
+    units: int = 0
+    retries: int = 0
+    throttled: int = 0
+    failures: int = 0
+    waited: float = 0.0
+
+
+class QuotaScheduler:
+    """Runs Gmail API calls under quota, concurrency and retry policy"""
+
+    def __init__(self, units_per_second: Optional[float] = DEFAULT_UNITS_PER_SECOND,
+                 burst: Optional[float] = DEFAULT_BURST,
+                 max_concurrency: int = 32,
+                 max_retries: int = 5,
+                 base_delay: float = 0.5,
+                 max_delay: float = 32.0,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep,
+                 rng: Callable[[], float] = random.random,
+                 gate: Optional[Callable[[], ContextManager]] = None):
+        """
+        Args:
+            units_per_second: Quota units allowed per second (None disables rate limiting)
+            burst: Token bucket capacity. Any 60 s window admits at most
+                burst + 60 * units_per_second units, which the defaults keep
+                at Gmail's per-minute quota.
+            max_concurrency: Upper bound for the adaptive concurrency limit
+            max_retries: Retries of a throttled or failed call before giving up
+            base_delay: First backoff delay in seconds, doubled per attempt
+            max_delay: Cap on a single backoff delay
+            gate: Factory for a context manager held around every call,
+                e.g. a slot in a concurrency cap shared with other schedulers
+        """
+        self.bucket = TokenBucket(units_per_second, burst, clock, sleep) \
+            if units_per_second else None
+        self.limiter = AdaptiveLimiter(max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = SchedulerStats()
+        self.gate = gate
+        self._sleep = sleep
+        self._rng = rng
+        self._lock = threading.Lock()
+
+    def execute(self, call: Callable[[], T], call_type: str, count: int = 1) -> T:
+        """
+        Run call, charging count calls of call_type against the quota.
+
+        Retryable errors are retried with backoff; other errors, and
+        retryable ones once retries run out, are raised.
+        """
+        units = QUOTA_UNITS.get(call_type, 5) * count
+        attempt = 0
+
+        while True:
+            self.limiter.acquire()
+            try:
+                if self.bucket:
+                    waited = self.bucket.acquire(units)
+                    with self._lock:
+                        self.stats.waited += waited
+                with self._lock:
+                    self.stats.calls += 1
+                    self.stats.units += units
+                if self.gate:
+                    with self.gate():
+                        result = call()
+                else:
+                    result = call()
+            except HttpError as error:
+                if not is_retryable(error) or attempt >= self.max_retries:
+                    with self._lock:
+                        self.stats.failures += 1
+                    raise
+                self.throttled()
+            else:
+                self.limiter.on_success()
+                return result
+            finally:
+                self.limiter.release()
+
+            self.backoff(attempt)
+            attempt += 1
+
+    def throttled(self):
+        """Record a throttling response and shrink concurrency"""
+        self.limiter.on_throttle()
+        with self._lock:
+            self.stats.throttled += 1
+
+    def backoff(self, attempt: int):
+        """Sleep a full-jitter exponential delay before retry number attempt + 1"""
+        with self._lock:
+            self.stats.retries += 1
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+        self._sleep(self._rng() * delay)
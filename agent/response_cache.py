@@ -0,0 +1,228 @@
+"""
+Response Cache - In-process TTL/LRU cache of rendered HTTP responses.
+
+Entries are rendered bodies with a strong ETag, so a hit costs a dictionary
+lookup and clients holding the same version get a 304 without a body. Each
+entry remembers how it was computed, which lets a BackgroundRefresher
+re-render the entries people are actually requesting before they expire:
+
+    cache = ResponseCache(max_entries=256, ttl=60)
+    refresher = BackgroundRefresher(cache, interval=20).start()
+    response = cache.get('/api/digest', lambda: render_digest())
+
+Concurrent misses on one key share a single computation instead of each
+running it.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, Optional
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    """A rendered response body and its ETag"""
+    body: bytes
+    etag: str
+
+
+@dataclass
+class CacheStats:
+    """Counts since the cache was created"""
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    refreshes: int = 0
+
+
+class _Entry:
+    __slots__ = ('response', 'compute', 'expires', 'last_used')
+
+    def __init__(self, response: CachedResponse, compute: Callable[[], bytes],
+                 expires: float, last_used: float):
+        self.response = response
+        self.compute = compute
+        self.expires = expires
+        self.last_used = last_used
+
+
+def make_etag(body: bytes) -> str:
+    """Strong validator for a body"""
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    """Thread-safe LRU of rendered responses that expire ttl seconds after rendering"""
+
+    def __init__(self, max_entries: int = 256, ttl: Optional[float] = 60.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            max_entries: Entries kept; the least recently used go first
+            ttl: Seconds a rendered body is served for (None never expires)
+            clock: Monotonic time source, replaceable in tests
+        """
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[Hashable, _Entry]' = OrderedDict()
+        self._pending: Dict[Hashable, Future] = {}
+
+    def get(self, key: Hashable, compute: Callable[[], bytes]) -> CachedResponse:
+        """
+        The cached response for key, rendering it with compute when missing
+        or expired. Exceptions from compute reach every caller waiting on it
+        and nothing is cached.
+        """
+        with self._lock:
+            now = self._clock()
+            entry = self._entries.get(key)
+            if entry is not None and (entry.expires is None or entry.expires > now):
+                self._entries.move_to_end(key)
+                entry.last_used = now
+                self.stats.hits += 1
+                return entry.response
+
+            self.stats.misses += 1
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = self._pending[key] = Future()
+                owner = True
+            else:
+                owner = False
+
+        if not owner:
+            return pending.result()
+
+        try:
+            response = self._store(key, compute)
+        except BaseException as error:
+            with self._lock:
+                del self._pending[key]
+            pending.set_exception(error)
+            raise
+        with self._lock:
+            del self._pending[key]
+        pending.set_result(response)
+        return response
+
+    def _store(self, key: Hashable, compute: Callable[[], bytes]) -> CachedResponse:
+        """Render and insert an entry, evicting the least recently used beyond max_entries"""
+        body = compute()
+        response = CachedResponse(body, make_etag(body))
+        with self._lock:
+            now = self._clock()
+            expires = now + self.ttl if self.ttl is not None else None
+            self._entries[key] = _Entry(response, compute, expires, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+        return response
+
+    def refresh(self, max_idle: Optional[float] = None) -> int:
+        """
+        Re-render cached entries in place, keeping their recency.
+
+        Args:
+            max_idle: Only refresh entries requested within this many
+                seconds; the others are left to expire (None refreshes all)
+
+        Returns:
+            Number of entries refreshed. Entries whose compute fails keep
+            their current response.
+        """
+        with self._lock:
+            now = self._clock()
+            entries = [(key, entry.compute) for key, entry in self._entries.items()
+                       if max_idle is None or now - entry.last_used <= max_idle]
+
+        refreshed = 0
+        for key, compute in entries:
+            try:
+                body = compute()
+            except Exception as error:
+                print(f'Error refreshing cached response {key!r}: {error}')
+                continue
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if body != entry.response.body:
+                    entry.response = CachedResponse(body, make_etag(body))
+                now = self._clock()
+                entry.expires = now + self.ttl if self.ttl is not None else None
+                self.stats.refreshes += 1
+                refreshed += 1
+        return refreshed
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """Drop one entry, or every entry when key is None"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class BackgroundRefresher:
+    """Daemon thread that keeps a ResponseCache warm"""
+
+    def __init__(self, cache: ResponseCache, interval: float = 20.0,
+                 before_refresh: Optional[Callable[[], None]] = None):
+        """
+        Args:
+            cache: Cache whose entries are re-rendered
+            interval: Seconds between refreshes; keep it below the cache's
+                ttl so requested entries never expire
+            before_refresh: Called first on every cycle, e.g. to reload the
+                data responses are rendered from
+        """
+        self.cache = cache
+        self.interval = interval
+        self.before_refresh = before_refresh
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self) -> int:
+        """One refresh cycle; returns the number of entries refreshed"""
+        if self.before_refresh is not None:
+            self.before_refresh()
+        # Entries nobody requested for a full ttl are left to expire
+        return self.cache.refresh(max_idle=self.cache.ttl)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as error:
+                print(f'Error refreshing response cache: {error}')
+
+    def start(self) -> 'BackgroundRefresher':
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,256 @@
+"""
+Search Index - Local full-text search over fetched emails.
+
+Emails are tokenized into an on-disk inverted index (SQLite FTS5) as they
+are fetched, so searches run offline, without the list call plus N gets a
+Gmail `q` query costs:
+
+    index = SearchIndex()
+    for email in index.indexing(fetcher.iter_emails(max_results=500)):
+        ...
+    for hit in index.search('subject:agents "open source" -hiring'):
+        print(hit.score, hit.subject)
+
+Query syntax:
+    word                  documents containing word (any field)
+    word*                 prefix match
+    "exact phrase"        words adjacent and in order
+    subject:word          restrict to a field: subject, from (sender) or body
+    a b / a AND b         both
+    a OR b                either
+    a -b / a NOT b        a but not b
+    ( ... )               grouping
+
+A -term excludes term from the whole query: `a OR b -c` is `(a OR b) NOT c`.
+Queries must match something first, so `-c` or `NOT c` alone is rejected.
+
+Results are ranked by BM25 with per-field weights.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from agent.gmail_fetcher import Email
+from agent.mime_parser import html_to_text
+
+
+# Field weights for BM25: subject matches count most
+FIELD_WEIGHTS = {'subject': 3.0, 'sender': 1.0, 'body': 1.0}
+
+FIELD_ALIASES = {'subject': 'subject', 'from': 'sender', 'sender': 'sender', 'body': 'body'}
+
+QUERY_TOKEN = re.compile(r'[()]|-?(?:\w+:)?"[^"]*"|[^\s()]+')
+
+HTML_BODY = re.compile(r'^\s*<(?:!doctype|html|body|div|table|p)\b', re.IGNORECASE)
+
+
+@dataclass
+class SearchHit:
+    """One ranked search result"""
+    message_id: str
+    subject: str
+    sender: str
+    date: str
+    score: float
+
+
+def parse_query(query: str) -> str:
+    """
+    Translate the query syntax above into an FTS5 MATCH expression.
+
+    Every user term is quoted, so FTS5 syntax characters in user input are
+    matched literally rather than interpreted. FTS5's NOT is binary and
+    binds tighter than OR, so -terms are appended after the parenthesized
+    rest of the query.
+
+    Raises:
+        ValueError: If the query only excludes terms
+    """
+    parts = []
+    excluded = []
+    for token in QUERY_TOKEN.findall(query):
+        if token in ('(', ')'):
+            parts.append(token)
+            continue
+        if token in ('AND', 'OR', 'NOT'):
+            parts.append(token)
+            continue
+
+        negated = token.startswith('-') and len(token) > 1
+        if negated:
+            token = token[1:]
+
+        column = None
+        field, colon, rest = token.partition(':')
+        if colon and rest and field.lower() in FIELD_ALIASES:
+            column, token = FIELD_ALIASES[field.lower()], rest
+
+        prefix = token.endswith('*') and not token.startswith('"')
+        text = token.strip('"') if token.startswith('"') else token.rstrip('*')
+        if not text.strip():
+            continue
+        term = '"' + text.replace('"', '""') + '"' + ('*' if prefix else '')
+        if column:
+            term = f'{column} : {term}'
+        (excluded if negated else parts).append(term)
+
+    operands = [part for part in parts if part not in ('(', ')')]
+    if (excluded or operands) and (not operands or operands[0] == 'NOT'):
+        raise ValueError(f"Search query {query!r} only excludes terms; "
+                         "add a term to match")
+    if not excluded:
+        return ' '.join(parts)
+    return ' '.join([f"( {' '.join(parts)} )"] + [f'NOT {term}' for term in excluded])
+
+
+def searchable_body(body: str) -> str:
+    """Body text to index; html bodies are reduced to their visible text"""
+    return html_to_text(body) if HTML_BODY.match(body) else body
+
+
+class SearchIndex:
+    """On-disk inverted index of email subjects, senders and bodies"""
+
+    def __init__(self, path: str = 'data/search_index.db',
+                 weights: Optional[dict] = None):
+        """
+        Open (or create) the index.
+
+        Args:
+            path: SQLite database file
+            weights: Per-field BM25 weights (defaults to FIELD_WEIGHTS)
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        weights = {**FIELD_WEIGHTS, **(weights or {})}
+        self._weights: Tuple[float, float, float] = (
+            weights['subject'], weights['sender'], weights['body'])
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS documents ('
+            ' doc_id INTEGER PRIMARY KEY,'
+            ' message_id TEXT NOT NULL UNIQUE,'
+            ' subject TEXT NOT NULL,'
+            ' sender TEXT NOT NULL,'
+            ' date TEXT NOT NULL)'
+        )
+        # Contentless: only postings are stored, bodies live in the cache/archive
+        self._db.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS postings USING fts5('
+            " subject, sender, body, content='',"
+            " tokenize='unicode61 remove_diacritics 2')"
+        )
+
+    def add(self, email: Email) -> bool:
+        """Index one email; returns False if it is already indexed"""
+        return self.add_many([email]) == 1
+
+    def add_many(self, emails: Iterable[Email]) -> int:
+        """Index many emails in one transaction; returns how many were new"""
+        added = 0
+        with self._lock:
+            self._db.execute('BEGIN')
+            try:
+                for email in emails:
+                    cursor = self._db.execute(
+                        'INSERT OR IGNORE INTO documents (message_id, subject, sender, date) '
+                        'VALUES (?, ?, ?, ?)',
+                        (email.message_id, email.subject, email.sender, email.date)
+                    )
+                    if cursor.rowcount:
+                        self._db.execute(
+                            'INSERT INTO postings (rowid, subject, sender, body) VALUES (?, ?, ?, ?)',
+                            (cursor.lastrowid, email.subject, email.sender,
+                             searchable_body(email.body))
+                        )
+                        added += 1
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+        return added
+
+    def indexing(self, emails: Iterable[Email], batch_size: int = 200) -> Iterator[Email]:
+        """
+        Pass emails through, indexing them in batches along the way.
+
+        Args:
+            emails: Any email stream, e.g. GmailFetcher.iter_emails()
+            batch_size: Emails indexed per transaction
+        """
+        batch: List[Email] = []
+        try:
+            for email in emails:
+                batch.append(email)
+                if len(batch) >= batch_size:
+                    self.add_many(batch)
+                    batch = []
+                yield email
+        finally:
+            if batch:
+                self.add_many(batch)
+
+    def search(self, query: str, limit: int = 10) -> List[SearchHit]:
+        """
+        Run a query and return the best matches, highest score first.
+
+        Raises:
+            ValueError: If the query cannot be parsed
+        """
+        expression = parse_query(query)
+        if not expression:
+            return []
+        rows = self._match(
+            'SELECT d.message_id, d.subject, d.sender, d.date, bm25(postings, ?, ?, ?) AS rank '
+            'FROM postings JOIN documents d ON d.doc_id = postings.rowid '
+            'WHERE postings MATCH ? ORDER BY rank LIMIT ?',
+            (*self._weights, expression, limit), query
+        )
+        return [SearchHit(message_id, subject, sender, date, -rank)
+                for message_id, subject, sender, date, rank in rows]
+
+    def count(self, query: str) -> int:
+        """Number of emails matching a query"""
+        expression = parse_query(query)
+        if not expression:
+            return 0
+        return self._match('SELECT COUNT(*) FROM postings WHERE postings MATCH ?',
+                           (expression,), query)[0][0]
+
+    def _match(self, sql: str, params: tuple, query: str) -> list:
+        with self._lock:
+            try:
+                return self._db.execute(sql, params).fetchall()
+            except sqlite3.OperationalError as error:
+                raise ValueError(f"Invalid search query {query!r}: {error}") from None
+
+    def __contains__(self, message_id: str) -> bool:
+        with self._lock:
+            return self._db.execute('SELECT 1 FROM documents WHERE message_id = ?',
+                                    (message_id,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM documents').fetchone()[0]
+
+    def clear(self):
+        """Drop every indexed email"""
+        with self._lock:
+            self._db.execute('BEGIN')
+            self._db.execute("INSERT INTO postings (postings) VALUES ('delete-all')")
+            self._db.execute('DELETE FROM documents')
+            self._db.execute('COMMIT')
+
+    def close(self):
+        with self._lock:
+            self._db.close()
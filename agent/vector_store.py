@@ -0,0 +1,445 @@
+"""
+Vector Store - Local embedding storage and cosine search over newsletter chunks.
+
+Email bodies are split into overlapping word windows, embedded, and appended
+to a memory-mapped float32 matrix; a SQLite sidecar maps each matrix row back
+to its message and chunk:
+
+    store = VectorStore('data/vectors')
+    store.add_emails(fetcher.iter_emails(max_results=500))
+    for hit in store.search('open source agents', k=5):
+        print(hit.score, hit.message_id, hit.offset)
+
+Layout of the store directory:
+
+- `vectors.<generation>.f32`: row-major float32 matrix, one L2-normalized
+  row per chunk, appended in place and read through np.memmap.
+- `chunks.db`: the `chunks` table (row, message_id, chunk_offset,
+  chunk_length, deleted) and the store's dimension and generation.
+
+Vectors are written before their metadata commits, so a crash leaves at most
+unreferenced rows at the end of the matrix, which the next open truncates.
+Deletes only mark rows; compact() rewrites the matrix into a new generation
+and switches to it in the same transaction that renumbers the metadata.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Protocol, Sequence, Tuple, Union
+
+import numpy as np
+
+from agent.gmail_fetcher import Email
+from agent.search_index import searchable_body
+
+
+# Words per chunk, and words shared between consecutive chunks
+CHUNK_WORDS = 200
+CHUNK_OVERLAP = 40
+
+# Matrix rows scored per step of a search
+BLOCK_ROWS = 65536
+
+WORD = re.compile(r'\w+')
+
+
+def chunk_text(text: str, size: int = CHUNK_WORDS,
+               overlap: int = CHUNK_OVERLAP) -> List[Tuple[int, str]]:
+    """
+    Split text into overlapping windows of words.
+
+    Returns:
+        (character offset, chunk text) pairs in order
+    """
+    if not 0 <= overlap < size:
+        raise ValueError("overlap must be at least 0 and less than size")
+
+    words = [match.span() for match in WORD.finditer(text)]
+    chunks = []
+    for first in range(0, len(words), size - overlap):
+        last = min(first + size, len(words)) - 1
+        start, end = words[first][0], words[last][1]
+        chunks.append((start, text[start:end]))
+        if last == len(words) - 1:
+            break
+    return chunks
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length, leaving zero rows as they are"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class Embedder(Protocol):
+    """Anything that turns texts into a (len(texts), dimension) matrix"""
+
+    dimension: int
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        ...
+
+
+class HashingEmbedder:
+    """
+    Deterministic bag-of-words embedder using signed feature hashing.
+
+    Needs no model or network, so tests and offline runs get stable vectors;
+    texts sharing words get a positive cosine similarity.
+    """
+
+    def __init__(self, dimension: int = 256):
+        if dimension < 1:
+            raise ValueError("dimension must be at least 1")
+        self.dimension = dimension
+        self._features = {}
+
+    def _feature(self, token: str) -> Tuple[int, float]:
+        feature = self._features.get(token)
+        if feature is None:
+            digest = int.from_bytes(hashlib.blake2b(token.encode('utf-8'),
+                                                    digest_size=8).digest(), 'little')
+            feature = (digest % self.dimension, 1.0 if digest >> 63 else -1.0)
+            self._features[token] = feature
+        return feature
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            features = [self._feature(token) for token in WORD.findall(text.lower())]
+            if features:
+                columns, signs = zip(*features)
+                np.add.at(vectors[row], list(columns), signs)
+        return normalize(vectors)
+
+
+@dataclass
+class VectorHit:
+    """One chunk returned by a search"""
+    message_id: str
+    offset: int
+    length: int
+    score: float
+
+
+class VectorStore:
+    """Append-only, memory-mapped matrix of chunk embeddings with cosine search"""
+
+    def __init__(self, directory: str = 'data/vectors',
+                 embedder: Optional[Embedder] = None):
+        """
+        Open (or create) the store.
+
+        Args:
+            directory: Directory holding the matrix and its metadata
+            embedder: Embeds chunks and text queries (defaults to HashingEmbedder)
+
+        Raises:
+            ValueError: If the store was built with a different dimension
+        """
+        os.makedirs(directory, exist_ok=True)
+
+        self.directory = directory
+        self.embedder = embedder or HashingEmbedder()
+        self.dimension = self.embedder.dimension
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, 'chunks.db'),
+                                   check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS settings ('
+            ' key TEXT PRIMARY KEY,'
+            ' value INTEGER NOT NULL)'
+        )
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS chunks ('
+            ' row INTEGER PRIMARY KEY,'
+            ' message_id TEXT NOT NULL,'
+            ' chunk_offset INTEGER NOT NULL,'
+            ' chunk_length INTEGER NOT NULL,'
+            ' deleted INTEGER NOT NULL DEFAULT 0)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS chunks_message ON chunks (message_id)')
+        self._db.execute("INSERT OR IGNORE INTO settings VALUES ('dimension', ?)",
+                         (self.dimension,))
+        self._db.execute("INSERT OR IGNORE INTO settings VALUES ('generation', 0)")
+
+        stored = self._setting('dimension')
+        if stored != self.dimension:
+            self._db.close()
+            raise ValueError(f"{directory} holds {stored}-dimensional vectors, "
+                             f"the embedder produces {self.dimension}")
+
+        self._generation = self._setting('generation')
+        self._remove_stale_generations()
+        self._rows = self._db.execute(
+            'SELECT COALESCE(MAX(row) + 1, 0) FROM chunks').fetchone()[0]
+
+        self._vectors = open(self._vectors_path(self._generation), 'ab')
+        row_bytes = self.dimension * 4
+        stored_rows = self._vectors.tell() // row_bytes
+        if stored_rows < self._rows:
+            # Only possible if the matrix was damaged; forget the missing rows
+            self._db.execute('DELETE FROM chunks WHERE row >= ?', (stored_rows,))
+            self._rows = stored_rows
+        self._vectors.truncate(self._rows * row_bytes)
+        self._vectors.seek(0, os.SEEK_END)
+
+        self._deleted = np.zeros(self._rows, dtype=bool)
+        deleted = [row for (row,) in self._db.execute('SELECT row FROM chunks WHERE deleted = 1')]
+        self._deleted[deleted] = True
+        self._matrix: Optional[np.memmap] = None
+
+    def _setting(self, key: str) -> int:
+        return self._db.execute('SELECT value FROM settings WHERE key = ?', (key,)).fetchone()[0]
+
+    def _vectors_path(self, generation: int) -> str:
+        return os.path.join(self.directory, f'vectors.{generation}.f32')
+
+    def _remove_stale_generations(self):
+        current = os.path.basename(self._vectors_path(self._generation))
+        for name in os.listdir(self.directory):
+            if name.startswith('vectors.') and name.endswith('.f32') and name != current:
+                os.remove(os.path.join(self.directory, name))
+
+    def _mapped(self) -> Optional[np.memmap]:
+        """Read-only view of the matrix, remapped after appends"""
+        if self._rows == 0:
+            return None
+        if self._matrix is None or len(self._matrix) != self._rows:
+            self._matrix = np.memmap(self._vectors_path(self._generation), dtype=np.float32,
+                                     mode='r', shape=(self._rows, self.dimension))
+        return self._matrix
+
+    def add_vectors(self, keys: Sequence[Tuple[str, int, int]], vectors: np.ndarray) -> int:
+        """
+        Append precomputed embeddings.
+
+        Args:
+            keys: (message_id, chunk offset, chunk length) per row of vectors
+            vectors: (len(keys), dimension) matrix; rows are normalized on write
+
+        Returns:
+            Number of rows added; chunks already stored and live are skipped
+        """
+        vectors = normalize(vectors)
+        if vectors.shape != (len(keys), self.dimension):
+            raise ValueError(f"Expected a ({len(keys)}, {self.dimension}) matrix, "
+                             f"got {vectors.shape}")
+
+        with self._lock:
+            self._db.execute('BEGIN')
+            try:
+                message_ids = {message_id for message_id, _, _ in keys}
+                stored = set()
+                for message_id in message_ids:
+                    stored.update((message_id, offset) for (offset,) in self._db.execute(
+                        'SELECT chunk_offset FROM chunks WHERE message_id = ? AND deleted = 0',
+                        (message_id,)))
+                new = []
+                for position, (message_id, offset, _) in enumerate(keys):
+                    if (message_id, offset) not in stored:
+                        stored.add((message_id, offset))
+                        new.append(position)
+
+                self._vectors.write(vectors[new].tobytes())
+                self._vectors.flush()
+                self._db.executemany(
+                    'INSERT INTO chunks (row, message_id, chunk_offset, chunk_length) '
+                    'VALUES (?, ?, ?, ?)',
+                    ((self._rows + index, *keys[position]) for index, position in enumerate(new))
+                )
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                self._vectors.truncate(self._rows * self.dimension * 4)
+                self._vectors.seek(0, os.SEEK_END)
+                raise
+            self._db.execute('COMMIT')
+
+            self._rows += len(new)
+            self._deleted = np.concatenate([self._deleted, np.zeros(len(new), dtype=bool)])
+        return len(new)
+
+    def add_emails(self, emails: Iterable[Email], batch_size: int = 64,
+                   chunk_words: int = CHUNK_WORDS, overlap: int = CHUNK_OVERLAP) -> int:
+        """
+        Chunk, embed and store emails, embedding batch_size emails at a time.
+        Chunk offsets index into the email's searchable text (html reduced to text).
+
+        Returns:
+            Number of chunks added
+        """
+        added = 0
+        keys: List[Tuple[str, int, int]] = []
+        texts: List[str] = []
+        pending = 0
+
+        for email in emails:
+            if email.message_id in self:
+                continue
+            for offset, text in chunk_text(searchable_body(email.body), chunk_words, overlap):
+                keys.append((email.message_id, offset, len(text)))
+                texts.append(text)
+            pending += 1
+            if pending >= batch_size:
+                added += self.add_vectors(keys, self.embedder.embed(texts))
+                keys, texts, pending = [], [], 0
+
+        if keys:
+            added += self.add_vectors(keys, self.embedder.embed(texts))
+        return added
+
+    def delete(self, message_id: str) -> int:
+        """Tombstone every chunk of an email; returns how many were live"""
+        with self._lock:
+            rows = [row for (row,) in self._db.execute(
+                'SELECT row FROM chunks WHERE message_id = ? AND deleted = 0', (message_id,))]
+            self._db.execute('UPDATE chunks SET deleted = 1 WHERE message_id = ?', (message_id,))
+            self._deleted[rows] = True
+        return len(rows)
+
+    def compact(self) -> int:
+        """
+        Drop tombstoned rows from the matrix and metadata.
+
+        Returns:
+            Number of rows removed
+        """
+        with self._lock:
+            removed = int(self._deleted.sum())
+            if not removed:
+                return 0
+
+            matrix = self._mapped()
+            generation = self._generation + 1
+            with open(self._vectors_path(generation), 'wb') as compacted:
+                for start in range(0, self._rows, BLOCK_ROWS):
+                    live = ~self._deleted[start:start + BLOCK_ROWS]
+                    compacted.write(matrix[start:start + BLOCK_ROWS][live].tobytes())
+
+            self._db.execute('BEGIN')
+            self._db.execute(
+                'CREATE TABLE compacted ('
+                ' row INTEGER PRIMARY KEY,'
+                ' message_id TEXT NOT NULL,'
+                ' chunk_offset INTEGER NOT NULL,'
+                ' chunk_length INTEGER NOT NULL,'
+                ' deleted INTEGER NOT NULL DEFAULT 0)'
+            )
+            self._db.execute(
+                'INSERT INTO compacted (row, message_id, chunk_offset, chunk_length) '
+                'SELECT ROW_NUMBER() OVER (ORDER BY row) - 1, message_id, chunk_offset, '
+                'chunk_length FROM chunks WHERE deleted = 0'
+            )
+            self._db.execute('DROP TABLE chunks')
+            self._db.execute('ALTER TABLE compacted RENAME TO chunks')
+            self._db.execute('CREATE INDEX chunks_message ON chunks (message_id)')
+            self._db.execute("UPDATE settings SET value = ? WHERE key = 'generation'",
+                             (generation,))
+            self._db.execute('COMMIT')
+
+            self._matrix = None
+            self._vectors.close()
+            self._generation = generation
+            self._remove_stale_generations()
+            self._vectors = open(self._vectors_path(generation), 'ab')
+            self._rows -= removed
+            self._deleted = np.zeros(self._rows, dtype=bool)
+        return removed
+
+    def search(self, query: Union[str, np.ndarray], k: int = 10) -> List[VectorHit]:
+        """Chunks most similar to a text or vector query, best first"""
+        return self.search_batch([query] if isinstance(query, str) else np.atleast_2d(query),
+                                 k)[0]
+
+    def search_batch(self, queries: Union[Sequence[str], np.ndarray],
+                     k: int = 10) -> List[List[VectorHit]]:
+        """
+        Top-k cosine search for many queries in one pass over the matrix.
+
+        Args:
+            queries: Texts to embed, or a (queries, dimension) matrix
+            k: Hits per query
+
+        Returns:
+            One list of hits per query, best first
+        """
+        if isinstance(queries, np.ndarray):
+            vectors = normalize(np.atleast_2d(queries))
+        else:
+            vectors = self.embedder.embed(list(queries))
+        if vectors.shape[1] != self.dimension:
+            raise ValueError(f"Expected {self.dimension}-dimensional queries, "
+                             f"got {vectors.shape[1]}")
+
+        with self._lock:
+            rows, scores = self._top_k(vectors, k)
+            found = sorted({int(row) for row in rows[np.isfinite(scores)]})
+            metadata = {}
+            for start in range(0, len(found), 500):
+                part = found[start:start + 500]
+                for row, *chunk in self._db.execute(
+                        'SELECT row, message_id, chunk_offset, chunk_length FROM chunks '
+                        f"WHERE row IN ({','.join('?' * len(part))})", part):
+                    metadata[row] = chunk
+
+        return [[VectorHit(*metadata[int(row)], float(score))
+                 for row, score in zip(query_rows, query_scores) if np.isfinite(score)]
+                for query_rows, query_scores in zip(rows, scores)]
+
+    def _top_k(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Best rows and their scores per query, sorted; missing hits score -inf"""
+        count = len(queries)
+        best_rows = np.zeros((count, 0), dtype=np.int64)
+        best_scores = np.zeros((count, 0), dtype=np.float32)
+        matrix = self._mapped()
+
+        for start in range(0, self._rows if k > 0 else 0, BLOCK_ROWS):
+            scores = queries @ matrix[start:start + BLOCK_ROWS].T
+            deleted = self._deleted[start:start + BLOCK_ROWS]
+            if deleted.any():
+                scores[:, deleted] = -np.inf
+
+            # Reduce the block to its own top k before merging with the running best
+            rows = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+            if scores.shape[1] > k:
+                rows = np.argpartition(scores, -k, axis=1)[:, -k:]
+                scores = np.take_along_axis(scores, rows, axis=1)
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            best_rows = np.concatenate([best_rows, rows + start], axis=1)
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(best_scores, -k, axis=1)[:, -k:]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1, kind='stable')
+        return (np.take_along_axis(best_rows, order, axis=1),
+                np.take_along_axis(best_scores, order, axis=1))
+
+    def __contains__(self, message_id: str) -> bool:
+        with self._lock:
+            return self._db.execute(
+                'SELECT 1 FROM chunks WHERE message_id = ? AND deleted = 0 LIMIT 1',
+                (message_id,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        """Number of live chunks"""
+        return self._rows - int(self._deleted.sum())
+
+    def close(self):
+        with self._lock:
+            self._matrix = None
+            self._vectors.close()
+            self._db.close()
+
+    def __enter__(self) -> 'VectorStore':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
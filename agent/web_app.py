@@ -0,0 +1,244 @@
+"""
+Web App - Read-only HTTP service for recent newsletters, search and the digest.
+
+Serves everything from the local store a fetch leaves behind: the mailbox
+archive written by export_mailbox and its search index. Requests never
+reach Gmail. Rendered responses are held in a ResponseCache with ETags, and
+a background refresher reloads the archive when an export appends to it
+and re-renders the responses in use, so page loads are cache hits:
+
+    export_mailbox(GmailFetcher(batch_size=50), 'data/archive/mailbox.nla',
+                   max_results=5000)
+    python -m agent.web_app --archive data/archive/mailbox.nla --port 5000
+
+Endpoints (all JSON):
+
+- `GET /api/newsletters?limit=20`: the most recent newsletters
+- `GET /api/search?q=...&limit=10`: ranked search hits, same syntax as
+  SearchIndex
+- `GET /api/digest?limit=50`: the most recent newsletters grouped by
+  sender, each with a summary of its body without the sender's boilerplate
+- `GET /api/status`: archive, index and cache counts (never cached)
+
+Clients that send `If-None-Match` with a current ETag get a 304.
+"""
+
+import argparse
+import json
+import os
+import threading
+from dataclasses import asdict
+from email.utils import parsedate_to_datetime
+from typing import Callable, List, Optional, Tuple
+
+from flask import Flask, Response, jsonify, request
+
+from agent.boilerplate import BoilerplateTemplates, split_paragraphs
+from agent.gmail_fetcher import Email
+from agent.mailbox_archive import ArchiveReplay
+from agent.newsletter_classifier import NewsletterClassifier
+from agent.response_cache import BackgroundRefresher, ResponseCache
+from agent.search_index import SearchIndex, searchable_body
+
+
+# Largest limit a request may ask for; also bounds the number of cache keys
+MAX_LIMIT = 100
+
+SUMMARY_LENGTH = 280
+
+
+def _timestamp(email: Email) -> float:
+    """Seconds since the epoch of an email's Date header, 0 if it cannot be parsed"""
+    try:
+        return parsedate_to_datetime(email.date).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return 0.0
+
+
+def summarize(text: str, length: int = SUMMARY_LENGTH) -> str:
+    """First paragraph of text, cut at a word boundary to at most length characters"""
+    paragraphs = split_paragraphs(text)
+    first = ' '.join(paragraphs[0].split()) if paragraphs else ''
+    if len(first) <= length:
+        return first
+    return first[:length].rsplit(' ', 1)[0] + '…'
+
+
+class LocalStore:
+    """The archive and search index the app reads, reloadable while serving"""
+
+    def __init__(self, archive_path: str = 'data/archive/mailbox.nla',
+                 index_path: str = 'data/search_index.db',
+                 templates_path: str = 'data/boilerplate.db',
+                 classifier: Optional[NewsletterClassifier] = None):
+        """
+        Open the store, indexing archived emails the index does not hold yet.
+
+        Args:
+            archive_path: Mailbox archive written by export_mailbox
+            index_path: SearchIndex database
+            templates_path: BoilerplateTemplates database for digest summaries
+            classifier: Decides which emails are newsletters
+        """
+        self.archive_path = archive_path
+        self.classifier = classifier or NewsletterClassifier()
+        self.index = SearchIndex(index_path)
+        self.templates = BoilerplateTemplates(templates_path)
+        self._lock = threading.RLock()
+        self.archive = ArchiveReplay(archive_path)
+        # (-timestamp, position) newest first; later exports append newer mail
+        self._dated: List[Tuple[float, int]] = []
+        self._add_records(0)
+
+    def _add_records(self, start: int):
+        """Index and date-sort the archive records from position start on"""
+        new = range(start, len(self.archive))
+        self.index.add_many(self.archive[position] for position in new)
+        self._dated += [(-_timestamp(self.archive[position]), position) for position in new]
+        self._dated.sort()
+
+    def reload(self) -> bool:
+        """Pick up records appended since the archive was opened; True if there were any"""
+        if os.path.getsize(f'{self.archive_path}.idx') // 8 == len(self.archive):
+            return False
+        replay = ArchiveReplay(self.archive_path)
+        with self._lock:
+            previous, self.archive = self.archive, replay
+            previous.close()
+            start = len(previous)
+            if len(replay) == start:
+                return False
+            self._add_records(start)
+        return True
+
+    def _newsletters(self, limit: int) -> List[Email]:
+        emails = []
+        with self._lock:
+            for _, position in self._dated:
+                email = self.archive[position]
+                if self.classifier.is_newsletter(email):
+                    emails.append(email)
+                    if len(emails) >= limit:
+                        break
+        return emails
+
+    @staticmethod
+    def _describe(email: Email) -> dict:
+        return {'id': email.message_id, 'subject': email.subject,
+                'sender': email.sender, 'date': email.date}
+
+    def recent(self, limit: int = 20) -> dict:
+        """The most recent newsletters"""
+        return {'newsletters': [self._describe(email) for email in self._newsletters(limit)]}
+
+    def search(self, query: str, limit: int = 10) -> dict:
+        """
+        Ranked search hits.
+
+        Raises:
+            ValueError: If the query cannot be parsed
+        """
+        return {'query': query, 'hits': [asdict(hit) for hit in self.index.search(query, limit)]}
+
+    def digest(self, limit: int = 50) -> dict:
+        """The most recent newsletters grouped by sender, with summaries"""
+        emails = self._newsletters(limit)
+        texts = [split_paragraphs(searchable_body(email.body)) for email in emails]
+        # Learn from the whole window first, so the newest issue is cleaned too
+        for email, paragraphs in zip(emails, texts):
+            self.templates.learn(email.sender, email.message_id, paragraphs)
+
+        senders = {}
+        for email, paragraphs in zip(emails, texts):
+            kept = self.templates.strip(email.sender, paragraphs)
+            senders.setdefault(email.sender, []).append({
+                'id': email.message_id, 'subject': email.subject, 'date': email.date,
+                'summary': summarize('\n\n'.join(kept))})
+        return {'senders': [{'sender': sender, 'newsletters': items}
+                            for sender, items in senders.items()]}
+
+    def close(self):
+        with self._lock:
+            self.archive.close()
+        self.index.close()
+        self.templates.close()
+
+
+def _limit(default: int) -> int:
+    """The request's limit argument, clamped to 1..MAX_LIMIT"""
+    return max(1, min(MAX_LIMIT, request.args.get('limit', default, type=int)))
+
+
+def create_app(store: LocalStore, cache: Optional[ResponseCache] = None,
+               refresh_interval: Optional[float] = 20.0) -> Flask:
+    """
+    Build the app.
+
+    Args:
+        store: Where responses are rendered from
+        cache: Rendered responses (defaults to ResponseCache())
+        refresh_interval: Seconds between background reloads and
+            re-renders; None disables the refresher
+    """
+    app = Flask(__name__)
+    cache = cache if cache is not None else ResponseCache()
+    app.extensions['local_store'] = store
+    app.extensions['response_cache'] = cache
+    if refresh_interval is not None:
+        app.extensions['refresher'] = BackgroundRefresher(
+            cache, refresh_interval, before_refresh=store.reload).start()
+
+    def cached_json(key: tuple, render: Callable[[], dict]) -> Response:
+        try:
+            cached = cache.get(key, lambda: json.dumps(render()).encode('utf-8'))
+        except ValueError as error:
+            return jsonify(error=str(error)), 400
+        response = Response(cached.body, mimetype='application/json')
+        response.set_etag(cached.etag)
+        # Cached by clients, but always revalidated with If-None-Match
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+    @app.get('/api/newsletters')
+    def newsletters():
+        limit = _limit(20)
+        return cached_json(('newsletters', limit), lambda: store.recent(limit))
+
+    @app.get('/api/search')
+    def search():
+        query = ' '.join(request.args.get('q', '').split())
+        if not query:
+            return jsonify(error="Missing query parameter 'q'"), 400
+        limit = _limit(10)
+        return cached_json(('search', query, limit), lambda: store.search(query, limit))
+
+    @app.get('/api/digest')
+    def digest():
+        limit = _limit(50)
+        return cached_json(('digest', limit), lambda: store.digest(limit))
+
+    @app.get('/api/status')
+    def status():
+        return jsonify(emails=len(store.archive), indexed=len(store.index),
+                       cached_responses=len(cache), cache=asdict(cache.stats))
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve newsletters from the local store')
+    parser.add_argument('--archive', default='data/archive/mailbox.nla')
+    parser.add_argument('--index', default='data/search_index.db')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--ttl', type=float, default=60.0)
+    parser.add_argument('--refresh', type=float, default=20.0)
+    args = parser.parse_args()
+
+    store = LocalStore(args.archive, args.index)
+    app = create_app(store, ResponseCache(ttl=args.ttl), refresh_interval=args.refresh)
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ Fetches and displays your 5 most recent emails.
 """
 
 from agent.gmail_fetcher import GmailFetcher
+from agent.instrumentation import MetricsRecorder
 
 
 def main():
@@ -15,7 +16,9 @@ def main():
     
     try:
         print("Initializing Gmail fetcher...")
-        fetcher = GmailFetcher()
+        metrics = MetricsRecorder()
+        fetcher = GmailFetcher(instrumentation=metrics)
+        fetcher.authenticate()
         print("✓ Authentication successful!")
         print()
         
@@ -39,6 +42,10 @@ def main():
             print(f"Preview: {email.body[:100]}...")
             print("-" * 60)
         
+        print()
+        print("Fetch summary:")
+        print(metrics.report())
+        
         print()
         print("✓ Gmail connection test successful!")
         print()
@@ -0,0 +1,73 @@
+"""
+Benchmark for serving many accounts from one AccountPool.
+Every account gets its own fake mailbox with per-round-trip latency. Reports
+total throughput as accounts are added under a fixed global concurrency cap,
+and how evenly the accounts finish.
+
+Usage:
+    python -m evals.bench_accounts [--messages N] [--latency-ms MS] [--max-concurrency C]
+"""
+
+import argparse
+import time
+
+from agent.account_pool import AccountPool
+from evals.fake_gmail import FakeGmailService, synthetic_mailbox
+
+
+ACCOUNT_COUNTS = [1, 2, 4, 8, 16, 32]
+
+
+def run(accounts: int, mailbox: list, latency: float, max_concurrency: int) -> dict:
+    """Fetch every account's mailbox through one pool"""
+    pool = AccountPool(max_concurrency=max_concurrency, batch_size=10, max_workers=4)
+    finished = {}
+    start = time.perf_counter()
+
+    for index in range(accounts):
+        name = f'user{index}'
+        pool.add_account(name, service=FakeGmailService(mailbox, latency=latency, seed=index))
+
+    def fetch(fetcher):
+        emails = fetcher.fetch_recent_emails(max_results=len(mailbox))
+        finished[fetcher.token_path] = time.perf_counter() - start
+        return emails
+
+    results = pool._map(fetch)
+    elapsed = time.perf_counter() - start
+    delivered = sum(len(emails) for emails in results.values())
+    times = sorted(finished.values())
+
+    return {
+        'emails': delivered,
+        'per_second': delivered / elapsed,
+        'first_s': times[0],
+        'last_s': times[-1],
+        'peak': pool.slots.peak
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark multi-account fetching offline')
+    parser.add_argument('--messages', type=int, default=100)
+    parser.add_argument('--latency-ms', type=float, default=100.0)
+    parser.add_argument('--max-concurrency', type=int, default=32)
+    args = parser.parse_args()
+
+    mailbox = synthetic_mailbox(args.messages)
+    latency = args.latency_ms / 1000
+
+    print(f"Fetching {args.messages} messages per account ({args.latency_ms:.0f} ms per "
+          f"round trip, at most {args.max_concurrency} calls in flight)")
+    print("-" * 70)
+    print(f"{'accounts':>8}{'emails':>10}{'msgs/sec':>12}{'first done s':>15}"
+          f"{'last done s':>14}{'peak calls':>11}")
+
+    for accounts in ACCOUNT_COUNTS:
+        result = run(accounts, mailbox, latency, args.max_concurrency)
+        print(f"{accounts:>8}{result['emails']:>10}{result['per_second']:>12.1f}"
+              f"{result['first_s']:>15.2f}{result['last_s']:>14.2f}{result['peak']:>11}")
+
+
+if __name__ == "__main__":
+    main()
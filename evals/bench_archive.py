@@ -0,0 +1,70 @@
+"""
+Benchmark for replaying a mailbox archive.
+Exports a synthetic mailbox once, then compares reading it back from the
+memory-mapped archive with fetching it through GmailFetcher from the fake
+service with no network latency and no quota limit, so the fetcher's
+numbers are a best case.
+
+Usage:
+    python -m evals.bench_archive [--messages N]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from agent.gmail_fetcher import GmailFetcher
+from agent.mailbox_archive import ArchiveReplay, export_mailbox
+from agent.quota_scheduler import QuotaScheduler
+from evals.fake_gmail import FakeGmailService, synthetic_mailbox
+
+
+def unlimited_fetcher(mailbox: list) -> GmailFetcher:
+    return GmailFetcher(batch_size=50, service=FakeGmailService(mailbox),
+                        scheduler=QuotaScheduler(units_per_second=None))
+
+
+def timed(read) -> tuple:
+    start = time.perf_counter()
+    count = read()
+    return count, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark archive replay against fetching')
+    parser.add_argument('--messages', type=int, default=10000)
+    args = parser.parse_args()
+
+    mailbox = synthetic_mailbox(args.messages)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'mailbox.nla')
+        fetcher = unlimited_fetcher(mailbox)
+        exported, export_seconds = timed(lambda: export_mailbox(fetcher, path))
+        archive_mb = (os.path.getsize(path) + os.path.getsize(f'{path}.idx')) / (1024 * 1024)
+
+        def fetch_bodies():
+            fetcher = unlimited_fetcher(mailbox)
+            return sum(len(email.body) > 0 for email in fetcher.iter_emails())
+
+        with ArchiveReplay(path) as replay:
+            runs = [
+                ('fetcher, fake service', fetch_bodies),
+                ('replay, headers', lambda: sum(1 for _ in replay)),
+                ('replay, bodies', lambda: sum(len(email.body) > 0 for email in replay)),
+                ('replay, query', lambda: len(replay.fetch_recent_emails(
+                    max_results=args.messages, query='from:substack'))),
+            ]
+
+            print(f"Exported {exported} emails in {export_seconds:.2f}s "
+                  f"to a {archive_mb:.1f} MB archive")
+            print("-" * 58)
+            print(f"{'read':<26}{'emails':>10}{'seconds':>10}{'emails/sec':>12}")
+            for label, read in runs:
+                count, seconds = timed(read)
+                print(f"{label:<26}{count:>10}{seconds:>10.3f}{count / seconds:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark for near-duplicate detection.
+Builds a synthetic stream of newsletter bodies in which a share of messages
+repost an earlier story with a few words changed and a different footer,
+runs it through NearDuplicateIndex.filter, and reports the dedup rate
+against the planted duplicates, how much downstream volume it saves, and
+per-message check latency as the index grows.
+
+Usage:
+    python -m evals.bench_dedup [--messages N] [--duplicate-share F]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from agent.gmail_fetcher import Email
+from agent.near_duplicates import NearDuplicateIndex
+
+
+def synthetic_stream(count: int, duplicate_share: float, words: int, seed: int = 0):
+    """(email, original message_id or None) pairs"""
+    rng = random.Random(seed)
+    originals = []
+
+    for index in range(count):
+        message_id = f'{index:016x}'
+        if originals and rng.random() < duplicate_share:
+            source_id, text = rng.choice(originals)
+            body = text.split()
+            for _ in range(rng.randint(1, 6)):
+                body[rng.randrange(len(body))] = f'edit{rng.randrange(10000)}'
+            body = ' '.join(body) + f' Shared by sender {rng.randrange(300)}. Unsubscribe.'
+            yield Email(message_id, 'Repost', f'author{index % 300}@substack.com', 'd',
+                        body), source_id
+        else:
+            text = ' '.join(f'w{rng.randrange(20000)}' for _ in range(words))
+            originals.append((message_id, text))
+            yield Email(message_id, 'Issue', f'author{index % 300}@substack.com', 'd',
+                        text), None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark near-duplicate detection')
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--duplicate-share', type=float, default=0.3)
+    parser.add_argument('--words', type=int, default=400)
+    args = parser.parse_args()
+
+    stream = list(synthetic_stream(args.messages, args.duplicate_share, args.words))
+    planted = sum(source is not None for _, source in stream)
+    window = max(args.messages // 5, 1)
+
+    with tempfile.TemporaryDirectory() as directory:
+        index = NearDuplicateIndex(os.path.join(directory, 'dedup.db'))
+        caught = false_positives = 0
+        latencies = []
+
+        start = time.perf_counter()
+        for email, source in stream:
+            check_start = time.perf_counter()
+            match = index.check(email)
+            latencies.append((time.perf_counter() - check_start) * 1e6)
+            if match.is_duplicate and source is not None:
+                caught += 1
+            elif match.is_duplicate:
+                false_positives += 1
+        elapsed = time.perf_counter() - start
+        report = index.report()
+        index.close()
+
+    print(f"Checked {report.messages} emails ({planted} planted reposts) in {elapsed:.1f}s")
+    print(f"Dedup rate {report.dedup_rate:.1%}: downstream volume "
+          f"{report.messages} -> {report.messages - report.duplicates} emails")
+    print(f"Recall {caught / planted if planted else 1:.1%}, false positives {false_positives}")
+    print("-" * 46)
+    print(f"{'index size':<22}{'p50 us':>12}{'p99 us':>12}")
+    for first in range(0, len(latencies), window):
+        part = sorted(latencies[first:first + window])
+        print(f"{f'{first}-{first + len(part)}':<22}{part[len(part) // 2]:>12.0f}"
+              f"{part[min(int(len(part) * 0.99), len(part) - 1)]:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
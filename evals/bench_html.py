@@ -0,0 +1,163 @@
+"""
+Benchmark for newsletter HTML cleaning.
+Converts a synthetic corpus of table-layout newsletters (styles, hidden
+preheaders, tracking pixels, per-sender headers and footers) to text with
+html_to_text, then strips per-sender boilerplate, and reports throughput and
+how much of the html survives each step. The line-per-block extractor
+html_to_text replaced is kept as the baseline.
+
+Usage:
+    python -m evals.bench_html [--messages N] [--senders N]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from html.parser import HTMLParser
+from typing import List
+
+from agent.boilerplate import BoilerplateTemplates
+from agent.gmail_fetcher import Email
+from agent.mime_parser import html_to_text, iter_html_paragraphs
+from evals.fake_gmail import _text
+
+
+PREHEADER = 'Preview: the week in AI'
+
+STYLE = ('<style type="text/css">body{margin:0;padding:0}table{border-collapse:collapse}'
+         + ''.join(f'.c{index}{{color:#{index:06x};font-family:Helvetica,Arial}}'
+                   for index in range(60)) + '</style>')
+
+
+def sender_template(rng: random.Random, sender: int) -> tuple:
+    """The header and footer html one sender puts around every issue"""
+    header = (
+        f'<div style="display:none;font-size:1px;max-height:0;overflow:hidden;mso-hide:all">'
+        f'{PREHEADER}{"&zwnj;&nbsp;" * 80}</div>'
+        f'<table width="100%"><tr><td align="right"><a href="https://n{sender}.example/web">'
+        f'View in browser</a></td></tr><tr><td><img src="https://n{sender}.example/logo.png" '
+        f'alt="" width="200"></td></tr></table>'
+    )
+    footer = (
+        f'<table width="100%"><tr><td><a href="https://n{sender}.example/share">Share</a> | '
+        f'<a href="https://n{sender}.example/refer">Refer a friend</a></td></tr>'
+        f'<tr><td class="c1">You are receiving this because you subscribed to Newsletter '
+        f'{sender}. <a href="https://n{sender}.example/unsubscribe">Unsubscribe</a> or '
+        f'<a href="https://n{sender}.example/prefs">manage preferences</a>.</td></tr>'
+        f'<tr><td class="c2">© 2025 Newsletter {sender} Inc, {rng.randint(1, 999)} Market St, '
+        f'San Francisco CA</td></tr></table>'
+        f'<img src="https://t.example/open/{sender}.gif" width="1" height="1" alt="">'
+    )
+    return header, footer
+
+
+def newsletter_html(rng: random.Random, header: str, footer: str) -> str:
+    stories = ''.join(
+        f'<tr><td class="c{rng.randrange(60)}" style="padding:12px 24px">'
+        f'<h2><a href="https://example.com/{rng.randrange(10**6)}">{_text(rng, 6)}</a></h2>'
+        f'<p>{_text(rng, rng.randint(40, 120))}</p></td></tr>'
+        for _ in range(rng.randint(4, 10)))
+    return (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>Issue</title>{STYLE}'
+            f'</head><body>{header}<table width="600" align="center">{stories}</table>'
+            f'{footer}</body></html>')
+
+
+class LegacyExtractor(HTMLParser):
+    """The line-per-block extractor html_to_text replaced, kept as the benchmark baseline"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lines: List[str] = []
+        self._line: List[str] = []
+        self._skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ('script', 'style', 'head', 'title', 'noscript', 'template'):
+            self._skipping += 1
+        elif tag in ('p', 'div', 'br', 'tr', 'li', 'table', 'h1', 'h2', 'h3'):
+            self.break_line()
+
+    def handle_endtag(self, tag):
+        if tag in ('script', 'style', 'head', 'title', 'noscript', 'template'):
+            self._skipping = max(0, self._skipping - 1)
+        elif tag in ('p', 'div', 'br', 'tr', 'li', 'table', 'h1', 'h2', 'h3'):
+            self.break_line()
+
+    def handle_data(self, data):
+        if not self._skipping:
+            self._line.append(data)
+
+    def break_line(self):
+        line = ' '.join(''.join(self._line).split())
+        if line:
+            self.lines.append(line)
+        self._line = []
+
+
+def legacy_html_to_text(html: str) -> str:
+    extractor = LegacyExtractor()
+    extractor.feed(html)
+    extractor.close()
+    extractor.break_line()
+    return '\n'.join(extractor.lines)
+
+
+def chunked_html_to_text(html: str, chunk_size: int = 16384) -> str:
+    chunks = (html[start:start + chunk_size] for start in range(0, len(html), chunk_size))
+    return '\n\n'.join(iter_html_paragraphs(chunks))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark newsletter HTML cleaning')
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--senders', type=int, default=40)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    templates = [sender_template(rng, sender) for sender in range(args.senders)]
+    corpus = []
+    for index in range(args.messages):
+        sender = rng.randrange(args.senders)
+        corpus.append((f'Newsletter {sender} <news@n{sender}.example>', f'm{index}',
+                       newsletter_html(rng, *templates[sender])))
+    html_bytes = sum(len(html.encode('utf-8')) for _, _, html in corpus)
+
+    print(f"{args.messages} newsletters from {args.senders} senders, "
+          f"{html_bytes / 1e6:.1f} MB of html")
+    print("-" * 75)
+    print(f"{'step':<32}{'MB/s':>8}{'msgs/s':>10}{'output MB':>11}{'kept':>7}{'preheader':>11}")
+
+    def row(label, elapsed, texts):
+        size = sum(len(text.encode('utf-8')) for text in texts)
+        leaked = sum(PREHEADER in text for text in texts)
+        print(f"{label:<32}{html_bytes / 1e6 / elapsed:>8.1f}{len(texts) / elapsed:>10.0f}"
+              f"{size / 1e6:>11.2f}{size / html_bytes:>7.1%}{leaked:>11}")
+
+    for label, convert in [('baseline (line per block)', legacy_html_to_text),
+                           ('html_to_text', html_to_text),
+                           ('html_to_text, 16 KB chunks', chunked_html_to_text)]:
+        start = time.perf_counter()
+        texts = [convert(html) for _, _, html in corpus]
+        row(label, time.perf_counter() - start, texts)
+
+    with tempfile.TemporaryDirectory() as directory:
+        boilerplate = BoilerplateTemplates(os.path.join(directory, 'boilerplate.db'))
+        start = time.perf_counter()
+        emails = [Email(message_id, 'Issue', sender, 'd', html_to_text(html))
+                  for sender, message_id, html in corpus]
+        cleaned = [email.body for email in boilerplate.filter(emails)]
+        row('+ boilerplate templates', time.perf_counter() - start, cleaned)
+
+        report = boilerplate.report()
+        unsubscribe = sum('Unsubscribe' in body for body in cleaned)
+        print(f"\nStripped {report.stripped_paragraphs} paragraphs from "
+              f"{report.stripped_messages}/{report.messages} emails; "
+              f"{unsubscribe} still mention Unsubscribe "
+              f"(senders' first {boilerplate.min_issues - 1} issues are only learned from)")
+        boilerplate.close()
+
+
+if __name__ == "__main__":
+    main()
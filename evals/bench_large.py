@@ -0,0 +1,71 @@
+"""
+Memory benchmark for large, attachment-backed newsletters.
+Fetches a mailbox of multi-megabyte html newsletters, whose html Gmail serves
+through attachments().get, and keeps every Email. Reports the traced memory
+still held once all are fetched, and the peak during the fetch, with bodies
+held in memory and with bodies spooled to disk.
+
+Usage:
+    python -m evals.bench_large [--messages N] [--size-mb MB]
+"""
+
+import argparse
+import tempfile
+import time
+import tracemalloc
+from typing import Optional
+
+from agent.gmail_fetcher import GmailFetcher
+from evals.fake_gmail import FakeGmailService, large_newsletter
+
+
+def run(mailbox: list, spool_threshold: Optional[int]) -> dict:
+    """Fetch and hold the whole mailbox under one body policy"""
+    service = FakeGmailService(mailbox)
+
+    with tempfile.TemporaryDirectory() as spool_dir:
+        fetcher = GmailFetcher(service=service, batch_size=10, spool_dir=spool_dir,
+                               spool_threshold=spool_threshold)
+        tracemalloc.start()
+        start = time.perf_counter()
+        emails = fetcher.fetch_recent_emails(max_results=len(mailbox))
+        elapsed = time.perf_counter() - start
+        held, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        characters = sum(len(email.body) for email in emails)
+
+    return {
+        'emails': len(emails),
+        'seconds': elapsed,
+        'body_mb': characters / (1024 * 1024),
+        'held_mb': held / (1024 * 1024),
+        'peak_mb': peak / (1024 * 1024)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark memory use on large newsletters')
+    parser.add_argument('--messages', type=int, default=20)
+    parser.add_argument('--size-mb', type=float, default=4.0)
+    args = parser.parse_args()
+
+    size = int(args.size_mb * 1024 * 1024)
+    mailbox = [large_newsletter(f'large{index}', size, seed=index)
+               for index in range(args.messages)]
+    policies = [
+        ('in memory', None),
+        ('spooled', 1024 * 1024),
+    ]
+
+    print(f"Fetching and holding {args.messages} attachment-backed newsletters "
+          f"of {args.size_mb:.1f} MB")
+    print("-" * 72)
+    print(f"{'bodies':<20}{'emails':>8}{'seconds':>10}{'body MB':>10}{'held MB':>12}{'peak MB':>12}")
+    for label, spool_threshold in policies:
+        result = run(mailbox, spool_threshold)
+        print(f"{label:<20}{result['emails']:>8}{result['seconds']:>10.2f}"
+              f"{result['body_mb']:>10.1f}{result['held_mb']:>12.1f}{result['peak_mb']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Memory benchmark for the Email representation.
+Builds a synthetic mailbox in a fresh subprocess per variant and reports peak
+RSS, comparing the compact Email with the original plain dataclass.
+
+Usage:
+    python -m evals.bench_memory [message_count]
+"""
+
+import random
+import resource
+import subprocess
+import sys
+from dataclasses import dataclass
+
+
+@dataclass
+class DataclassEmail:
+    """The original Email: a plain dataclass of eagerly decoded strings"""
+    message_id: str
+    subject: str
+    sender: str
+    date: str
+    body: str
+
+
+VOCABULARY = ('the market model launch growth founder team product users data '
+              'weekly roundup analysis research pricing strategy design agents '
+              'retrieval evaluation latency funding hiring roadmap').split()
+
+
+def build_mailbox(variant: str, message_count: int) -> list:
+    """Build message_count emails the way the fetcher would"""
+    from agent.gmail_fetcher import Email
+
+    email_class = Email if variant == 'compact' else DataclassEmail
+    rng = random.Random(0)
+    senders = [f'newsletter{i}@substack.com' for i in range(200)]
+    emails = []
+
+    for i in range(message_count):
+        # Fresh string objects, as produced by decoding each API response
+        sender = ''.join(list(rng.choice(senders)))
+        body = ' '.join(rng.choices(VOCABULARY, k=1200))
+        emails.append(email_class(
+            message_id=f'{i:016x}',
+            subject=f'Issue #{i}: ' + ' '.join(rng.choices(VOCABULARY, k=6)),
+            sender=sender,
+            date=f'Mon, {i % 28 + 1} Jan 2025 12:00:00 +0000',
+            body=body
+        ))
+    return emails
+
+
+def measure(variant: str, message_count: int) -> float:
+    """Peak RSS in MB of a subprocess holding the mailbox"""
+    output = subprocess.check_output(
+        [sys.executable, '-m', 'evals.bench_memory', '--child', variant, str(message_count)]
+    )
+    return float(output)
+
+
+def child(variant: str, message_count: int):
+    if variant != 'baseline':
+        emails = build_mailbox(variant, message_count)
+    # ru_maxrss is reported in KB on Linux
+    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+
+
+def main():
+    if sys.argv[1:2] == ['--child']:
+        child(sys.argv[2], int(sys.argv[3]))
+        return
+
+    message_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    baseline = measure('baseline', 0)
+
+    print(f"Peak RSS holding {message_count} emails (~8 KB bodies), "
+          f"interpreter baseline {baseline:.0f} MB")
+    print("-" * 60)
+    print(f"{'representation':<20}{'peak RSS (MB)':>20}{'per email (B)':>20}")
+    for variant in ['dataclass', 'compact']:
+        peak = measure(variant, message_count)
+        per_email = (peak - baseline) * 1024 * 1024 / message_count
+        print(f"{variant:<20}{peak:>20.1f}{per_email:>20.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Micro-benchmark for MIME body extraction.
+Compares extract_body with the original recursive extractor over a corpus of
+synthetic, deeply nested newsletter payloads.
+
+Usage:
+    python -m evals.bench_mime [message_count]
+"""
+
+import base64
+import random
+import sys
+import time
+
+from agent.mime_parser import extract_body
+
+
+def encode(text: str) -> str:
+    return base64.urlsafe_b64encode(text.encode('utf-8')).decode('ascii')
+
+
+def synthetic_payload(rng: random.Random, html_kb: int = 200) -> dict:
+    """A newsletter with a large html alternative and nested attachments"""
+    html = encode('<table><tr><td>' + 'Lorem ipsum dolor sit amet. ' * (html_kb * 36)
+                  + '</td></tr></table>')
+    alternative = {'mimeType': 'multipart/alternative', 'parts': [
+        {'mimeType': 'text/plain', 'body': {'data': encode('Plain text edition. ' * 200)}},
+        {'mimeType': 'text/html', 'body': {'data': html}},
+    ]}
+    if rng.random() < 0.5:
+        alternative['parts'].reverse()
+
+    payload = alternative
+    for _ in range(rng.randint(1, 4)):
+        payload = {'mimeType': 'multipart/related', 'parts': [
+            payload,
+            {'mimeType': 'image/png', 'body': {'attachmentId': 'att', 'size': 1024}},
+        ]}
+    return {'mimeType': 'multipart/mixed', 'parts': [payload]}
+
+
+def legacy_extract_body(payload: dict) -> str:
+    """The original recursive extractor, kept as the benchmark baseline"""
+    def extract_parts(part: dict):
+        plain_text = ''
+        html_text = ''
+        mime_type = part.get('mimeType', '')
+
+        if 'parts' in part:
+            for subpart in part['parts']:
+                sub_plain, sub_html = extract_parts(subpart)
+                plain_text = plain_text or sub_plain
+                html_text = html_text or sub_html
+        elif mime_type == 'text/plain' and 'data' in part.get('body', {}):
+            plain_text = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8', errors='ignore')
+        elif mime_type == 'text/html' and 'data' in part.get('body', {}):
+            html_text = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8', errors='ignore')
+
+        return plain_text, html_text
+
+    plain, html = extract_parts(payload)
+    return plain or html or ''
+
+
+def time_extractor(extractor, corpus) -> float:
+    start = time.perf_counter()
+    for payload in corpus:
+        extractor(payload)
+    return time.perf_counter() - start
+
+
+def main():
+    message_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rng = random.Random(0)
+    corpus = [synthetic_payload(rng) for _ in range(message_count)]
+
+    for payload in corpus:
+        assert extract_body(payload) == legacy_extract_body(payload)
+
+    legacy = time_extractor(legacy_extract_body, corpus)
+    current = time_extractor(extract_body, corpus)
+
+    print(f"Extracting bodies from {message_count} synthetic newsletters (~200 KB html each)")
+    print("-" * 60)
+    print(f"{'extractor':<20}{'seconds':>15}{'msgs/sec':>15}")
+    print(f"{'recursive (legacy)':<20}{legacy:>15.4f}{message_count / legacy:>15.1f}")
+    print(f"{'single pass':<20}{current:>15.4f}{message_count / current:>15.1f}")
+    print(f"Speedup: {legacy / current:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark for the memoized digest pipeline.
+Runs a filter → extract → embed → synthesize pipeline over a synthetic
+mailbox as three weekly runs: a cold first week, a second week that adds new
+mail, and a rerun of the second week after the embed stage's config changed.
+Synthesis stands in for an LLM call with a fixed per-message delay.
+
+Usage:
+    python -m evals.bench_pipeline [--messages N] [--new N] [--synthesis-ms MS]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from agent.gmail_fetcher import GmailFetcher
+from agent.newsletter_classifier import NewsletterClassifier
+from agent.pipeline import DROP, OutputStore, Pipeline, Stage
+from agent.quota_scheduler import QuotaScheduler
+from agent.search_index import searchable_body
+from agent.vector_store import HashingEmbedder, chunk_text
+from evals.fake_gmail import FakeGmailService, synthetic_mailbox
+
+
+def digest_stages(dimension: int, synthesis_seconds: float) -> list:
+    classifier = NewsletterClassifier()
+    embedder = HashingEmbedder(dimension=dimension)
+
+    def keep_newsletters(email, outputs):
+        return classifier.is_newsletter(email) or DROP
+
+    def extract(email, outputs):
+        return searchable_body(email.body)
+
+    def embed(email, outputs):
+        chunks = [text for _, text in chunk_text(outputs['extract'])] or ['']
+        return embedder.embed(chunks).mean(axis=0).astype(np.float32)
+
+    def synthesize(email, outputs):
+        time.sleep(synthesis_seconds)
+        return f"{email.subject}: {outputs['extract'][:80]}"
+
+    return [
+        Stage('filter', keep_newsletters),
+        Stage('extract', extract),
+        Stage('embed', embed, config={'dimension': dimension}),
+        Stage('synthesize', synthesize),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark incremental pipeline reruns')
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--new', type=int, default=200)
+    parser.add_argument('--synthesis-ms', type=float, default=2.0)
+    args = parser.parse_args()
+
+    fetcher = GmailFetcher(batch_size=50, scheduler=QuotaScheduler(units_per_second=None),
+                           service=FakeGmailService(synthetic_mailbox(args.messages + args.new)))
+    emails = fetcher.fetch_recent_emails(max_results=args.messages + args.new)
+    synthesis = args.synthesis_ms / 1000
+
+    runs = [
+        ('week 1 (cold)', emails[args.new:], 256),
+        (f'week 2 (+{args.new} new)', emails, 256),
+        ('week 2, embed changed', emails, 128),
+    ]
+
+    print(f"Pipeline filter → extract → embed → synthesize ({args.synthesis_ms:.0f} ms "
+          f"per synthesis)")
+    print("-" * 75)
+    print(f"{'run':<24}{'emails':>8}{'digest':>8}{'seconds':>10}{'computed per stage':>25}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = OutputStore(os.path.join(directory, 'pipeline.db'))
+        for label, inputs, dimension in runs:
+            pipeline = Pipeline(digest_stages(dimension, synthesis), store)
+            start = time.perf_counter()
+            digest = sum(1 for _ in pipeline.run(inputs))
+            elapsed = time.perf_counter() - start
+            computed = '/'.join(str(counts.computed) for counts in pipeline.counts.values())
+            print(f"{label:<24}{len(inputs):>8}{digest:>8}{elapsed:>10.2f}{computed:>25}")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark for quota-aware scheduling.
+Drives a worker pool against a fake Gmail service that enforces a per-second
+quota and answers 429 rateLimitExceeded beyond it. Compares dropping
+throttled messages, reactive retries, and a token bucket held just under the
+ceiling.
+
+Usage:
+    python -m evals.bench_quota [--messages N] [--quota UNITS_PER_SEC] [--workers N]
+"""
+
+import argparse
+import contextlib
+import io
+import time
+
+from agent.gmail_fetcher import GmailFetcher
+from agent.quota_scheduler import QuotaScheduler
+from evals.fake_gmail import FakeGmailService, make_message
+
+
+def strategies(quota: float) -> list:
+    return [
+        ('no retries', lambda: QuotaScheduler(units_per_second=None, max_retries=0)),
+        ('retry + AIMD', lambda: QuotaScheduler(units_per_second=None, base_delay=0.05,
+                                                max_retries=8)),
+        ('bucket @95% + AIMD', lambda: QuotaScheduler(units_per_second=quota * 0.95,
+                                                      burst=quota * 0.95, base_delay=0.05,
+                                                      max_retries=8)),
+    ]
+
+
+def run(message_count: int, quota: float, workers: int, scheduler: QuotaScheduler) -> dict:
+    service = FakeGmailService([make_message(f'msg{i}') for i in range(message_count)],
+                               latency=0.005, quota_per_second=quota)
+    fetcher = GmailFetcher(max_workers=workers, scheduler=scheduler, service=service)
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        emails = fetcher.fetch_recent_emails(max_results=message_count)
+    elapsed = time.perf_counter() - start
+
+    # Successful gets and the list call, against the quota available over the
+    # run (the fake starts with one second's worth banked)
+    served_units = 5 * (len(emails) + 1)
+    return {
+        'emails': len(emails),
+        'seconds': elapsed,
+        'per_second': len(emails) / elapsed,
+        'quota_used': served_units / (quota * (elapsed + 1)),
+        'throttled': service.throttled,
+        'retries': scheduler.stats.retries
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark quota-aware scheduling offline')
+    parser.add_argument('--messages', type=int, default=1500)
+    parser.add_argument('--quota', type=float, default=2500.0)
+    parser.add_argument('--workers', type=int, default=16)
+    args = parser.parse_args()
+
+    print(f"Fetching {args.messages} messages on {args.workers} workers against a "
+          f"{args.quota:.0f} units/sec quota ({args.quota / 5:.0f} gets/sec)")
+    print("-" * 88)
+    print(f"{'strategy':<22}{'emails':>8}{'seconds':>10}{'msgs/sec':>11}"
+          f"{'% of quota':>13}{'429s':>10}{'retries':>10}")
+
+    for label, make_scheduler in strategies(args.quota):
+        result = run(args.messages, args.quota, args.workers, make_scheduler())
+        print(f"{label:<22}{result['emails']:>8}{result['seconds']:>10.2f}"
+              f"{result['per_second']:>11.1f}{result['quota_used']:>13.0%}"
+              f"{result['throttled']:>10}{result['retries']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark for the local search index.
+Indexes a synthetic corpus of newsletter-sized emails drawn from a Zipfian
+vocabulary, then reports indexing throughput, index size and per-query
+latency for each kind of query.
+
+Usage:
+    python -m evals.bench_search [--emails N] [--words-per-email W]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from agent.gmail_fetcher import Email
+from agent.search_index import SearchIndex
+
+
+QUERIES = [
+    ('common term', 'w1'),
+    ('rare term', 'w4000'),
+    ('two terms', 'w3 w40'),
+    ('OR', 'w500 OR w700'),
+    ('NOT', 'w2 -w10'),
+    ('phrase', '"w1 w2"'),
+    ('field', 'subject:w30'),
+    ('prefix', 'w12*'),
+]
+
+
+def synthetic_corpus(count: int, words: int, seed: int = 0):
+    """Emails whose words follow a Zipf distribution over a 5,000 word vocabulary"""
+    rng = random.Random(seed)
+    vocabulary = [f'w{rank}' for rank in range(1, 5001)]
+    weights = [1 / rank for rank in range(1, 5001)]
+    senders = [f'author{index}@substack.com' for index in range(300)]
+
+    for index in range(count):
+        yield Email(
+            message_id=f'{index:016x}',
+            subject=' '.join(rng.choices(vocabulary, weights, k=8)),
+            sender=rng.choice(senders),
+            date=f'Mon, {index % 28 + 1} Jan 2025 12:00:00 +0000',
+            body=' '.join(rng.choices(vocabulary, weights, k=words))
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the local search index')
+    parser.add_argument('--emails', type=int, default=100000)
+    parser.add_argument('--words-per-email', type=int, default=300)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'search.db')
+        index = SearchIndex(path)
+
+        start = time.perf_counter()
+        for _ in index.indexing(synthetic_corpus(args.emails, args.words_per_email),
+                                batch_size=1000):
+            pass
+        elapsed = time.perf_counter() - start
+        size_mb = sum(os.path.getsize(os.path.join(directory, name))
+                      for name in os.listdir(directory)) / (1024 * 1024)
+
+        print(f"Indexed {len(index)} emails ({args.words_per_email} words each) in "
+              f"{elapsed:.1f}s ({len(index) / elapsed:.0f} emails/sec), index {size_mb:.0f} MB")
+        print("-" * 66)
+        print(f"{'query':<14}{'expression':<16}{'matches':>10}{'top 10 p50 ms':>14}{'p99 ms':>12}")
+
+        for label, query in QUERIES:
+            latencies = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                index.search(query, limit=10)
+                latencies.append((time.perf_counter() - start) * 1000)
+            latencies.sort()
+            p99 = latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)]
+            print(f"{label:<14}{query:<16}{index.count(query):>10}"
+                  f"{latencies[len(latencies) // 2]:>14.2f}{p99:>12.2f}")
+
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Startup benchmark for GmailFetcher.
+Measures, in a fresh interpreter per run, the cost of importing the fetcher,
+constructing it, and its first API use (token load and service build) with a
+valid cached token. Network time is excluded: the first call only builds
+the request. The legacy path imports the full google client stack up front
+and calls build('gmail', 'v1'), as the fetcher used to.
+
+Usage:
+    python -m evals.bench_startup [runs]
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+CHILD = r'''
+import json, sys, time
+start = time.perf_counter()
+mode, token_path = sys.argv[1], sys.argv[2]
+
+if mode == 'legacy':
+    from google.oauth2.credentials import Credentials
+    from google.auth.transport.requests import Request
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    from googleapiclient.discovery import build
+    import agent.gmail_fetcher
+    imported = time.perf_counter()
+    creds = Credentials.from_authorized_user_file(token_path)
+    service = build('gmail', 'v1', credentials=creds)
+    constructed = time.perf_counter()
+else:
+    from agent.gmail_fetcher import GmailFetcher
+    imported = time.perf_counter()
+    fetcher = GmailFetcher(token_path=token_path)
+    constructed = time.perf_counter()
+    service = fetcher.service
+
+service.users().messages().list(userId='me', maxResults=10)
+first_call = time.perf_counter()
+print(json.dumps({'import': imported - start, 'construct': constructed - imported,
+                  'first_call': first_call - constructed, 'total': first_call - start}))
+'''
+
+
+def write_token(directory: str) -> str:
+    from google.oauth2.credentials import Credentials
+    import datetime
+
+    creds = Credentials(token='access', refresh_token='refresh', client_id='client',
+                        client_secret='secret', token_uri='https://oauth2.googleapis.com/token',
+                        expiry=datetime.datetime(2099, 1, 1))
+    path = os.path.join(directory, 'token.json')
+    with open(path, 'w') as token:
+        token.write(creds.to_json())
+    return path
+
+
+def measure(mode: str, token_path: str, runs: int) -> dict:
+    samples = [json.loads(subprocess.check_output([sys.executable, '-c', CHILD, mode, token_path]))
+               for _ in range(runs)]
+    return {stage: statistics.median(sample[stage] for sample in samples) * 1000
+            for stage in samples[0]}
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    with tempfile.TemporaryDirectory() as directory:
+        token_path = write_token(directory)
+        print(f"Median startup over {runs} fresh interpreters (ms)")
+        print("-" * 70)
+        print(f"{'path':<12}{'import':>12}{'construct':>12}{'first call':>14}{'total':>12}")
+        for mode in ['legacy', 'lazy']:
+            result = measure(mode, token_path, runs)
+            print(f"{mode:<12}{result['import']:>12.1f}{result['construct']:>12.1f}"
+                  f"{result['first_call']:>14.1f}{result['total']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
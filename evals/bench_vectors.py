@@ -0,0 +1,85 @@
+"""
+Benchmark for the local vector store.
+Fills a store with random unit vectors, standing in for chunk embeddings,
+then reports append throughput, brute-force top-k query latency for single
+and batched queries, and the cost of tombstoning and compacting a tenth of
+the store.
+
+Usage:
+    python -m evals.bench_vectors [--vectors N] [--dimension D]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from agent.vector_store import HashingEmbedder, VectorStore
+
+
+def percentile(latencies: list, fraction: float) -> float:
+    latencies = sorted(latencies)
+    return latencies[min(int(len(latencies) * fraction), len(latencies) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the local vector store')
+    parser.add_argument('--vectors', type=int, default=1000000)
+    parser.add_argument('--dimension', type=int, default=256)
+    parser.add_argument('--chunks-per-email', type=int, default=4)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    batch = 50000
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = VectorStore(directory, HashingEmbedder(dimension=args.dimension))
+
+        start = time.perf_counter()
+        for first in range(0, args.vectors, batch):
+            rows = range(first, min(first + batch, args.vectors))
+            keys = [(f'{row // args.chunks_per_email:012x}', row % args.chunks_per_email * 1000,
+                     1000) for row in rows]
+            store.add_vectors(keys, rng.standard_normal((len(keys), args.dimension),
+                                                        dtype=np.float32))
+        elapsed = time.perf_counter() - start
+        matrix_mb = args.vectors * args.dimension * 4 / (1024 * 1024)
+
+        print(f"Appended {len(store)} vectors of dimension {args.dimension} in {elapsed:.1f}s "
+              f"({len(store) / elapsed:.0f} vectors/sec), matrix {matrix_mb:.0f} MB")
+        print("-" * 65)
+        print(f"{'queries per call':<18}{'p50 ms':>10}{'p99 ms':>10}"
+              f"{'ms per query':>14}{'queries/sec':>13}")
+
+        for count in (1, 16, 64):
+            latencies = []
+            for _ in range(args.repeat):
+                queries = rng.standard_normal((count, args.dimension), dtype=np.float32)
+                start = time.perf_counter()
+                store.search_batch(queries, k=args.k)
+                latencies.append((time.perf_counter() - start) * 1000)
+            p50 = percentile(latencies, 0.5)
+            print(f"{count:<18}{p50:>10.1f}{percentile(latencies, 0.99):>10.1f}"
+                  f"{p50 / count:>14.2f}{count * 1000 / p50:>13.0f}")
+
+        emails = args.vectors // args.chunks_per_email
+        start = time.perf_counter()
+        for email in range(0, emails, 10):
+            store.delete(f'{email:012x}')
+        deleting = time.perf_counter() - start
+        start = time.perf_counter()
+        removed = store.compact()
+        compacting = time.perf_counter() - start
+        print("-" * 65)
+        print(f"Deleted {emails // 10 + (emails % 10 > 0)} emails in {deleting:.1f}s, "
+              f"compacted away {removed} vectors in {compacting:.1f}s")
+        print(f"Store files: {sorted(os.listdir(directory))}")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
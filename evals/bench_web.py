@@ -0,0 +1,123 @@
+"""
+Benchmark for the cached HTTP service.
+Serves a synthetic archive over a real threaded HTTP server and has several
+concurrent clients request recent newsletters, the digest and searches,
+without a response cache, with a warm cache, and with a warm cache and
+If-None-Match revalidation.
+
+Usage:
+    python -m evals.bench_web [--messages N] [--clients N] [--requests N]
+"""
+
+import argparse
+import http.client
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+from agent.gmail_fetcher import GmailFetcher
+from agent.mailbox_archive import export_mailbox
+from agent.quota_scheduler import QuotaScheduler
+from agent.response_cache import ResponseCache
+from agent.web_app import LocalStore, create_app
+from evals.fake_gmail import FakeGmailService, synthetic_mailbox
+
+
+URLS = [
+    '/api/newsletters?limit=20',
+    '/api/digest?limit=50',
+    '/api/search?q=retrieval',
+    '/api/search?q=agents+pricing',
+    '/api/search?q=subject:launch',
+]
+
+
+def run_clients(port: int, clients: int, requests: int, conditional: bool) -> tuple:
+    """(latencies in seconds, wall seconds, status counts) for concurrent clients"""
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def client(offset: int):
+        etags = {}
+        mine = []
+        for number in range(requests):
+            url = URLS[(offset + number) % len(URLS)]
+            headers = {'If-None-Match': etags[url]} if conditional and url in etags else {}
+            start = time.perf_counter()
+            connection = http.client.HTTPConnection('127.0.0.1', port)
+            connection.request('GET', url, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            connection.close()
+            mine.append(time.perf_counter() - start)
+            if response.getheader('ETag'):
+                etags[url] = response.getheader('ETag')
+            with lock:
+                statuses[response.status] = statuses.get(response.status, 0) + 1
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=client, args=(offset,)) for offset in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, time.perf_counter() - start, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the cached HTTP service')
+    parser.add_argument('--messages', type=int, default=5000)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=50)
+    args = parser.parse_args()
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as directory:
+        archive = os.path.join(directory, 'mailbox.nla')
+        fetcher = GmailFetcher(batch_size=50, scheduler=QuotaScheduler(units_per_second=None),
+                               service=FakeGmailService(synthetic_mailbox(args.messages)))
+        export_mailbox(fetcher, archive, max_results=args.messages)
+
+        start = time.perf_counter()
+        store = LocalStore(archive, os.path.join(directory, 'index.db'),
+                           os.path.join(directory, 'boilerplate.db'))
+        print(f"{args.messages} archived emails, store opened and indexed in "
+              f"{time.perf_counter() - start:.1f} s; {args.clients} clients x "
+              f"{args.requests} requests")
+        print("-" * 75)
+        print(f"{'configuration':<28}{'req/s':>8}{'p50 ms':>9}{'p99 ms':>9}{'statuses':>21}")
+
+        for label, ttl, conditional in [('no cache', 0, False),
+                                        ('warm cache', 60, False),
+                                        ('warm cache + ETags', 60, True)]:
+            cache = ResponseCache(ttl=ttl)
+            server = make_server('127.0.0.1', 0, create_app(store, cache, refresh_interval=None),
+                                 threaded=True)
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            if ttl:
+                run_clients(server.port, 1, len(URLS), conditional=False)
+
+            latencies, elapsed, statuses = run_clients(server.port, args.clients, args.requests,
+                                                       conditional)
+            server.shutdown()
+            thread.join()
+
+            latencies.sort()
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            counts = ' '.join(f'{status}:{count}' for status, count in sorted(statuses.items()))
+            print(f"{label:<28}{len(latencies) / elapsed:>8.0f}"
+                  f"{statistics.median(latencies) * 1000:>9.1f}{p99 * 1000:>9.1f}{counts:>21}")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
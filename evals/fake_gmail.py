@@ -0,0 +1,539 @@
+"""
+Fake Gmail API service for tests and benchmarks.
+Mimics the parts of the googleapiclient `service` object used by GmailFetcher
+and counts HTTP round trips so fetch strategies can be compared offline.
+Serves hand-built or synthetic mailboxes, with pagination, history,
+injected latency and injected errors.
+"""
+
+import base64
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+from email.header import Header
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import formataddr, parseaddr
+from types import SimpleNamespace
+from typing import Callable, Dict, Iterator, List, Optional
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from agent.mime_parser import part_charset
+
+
+def make_message(message_id: str, subject: str = 'Test Subject',
+                 sender: str = 'sender@example.com',
+                 date: str = 'Mon, 1 Jan 2025 12:00:00 +0000',
+                 body: str = 'Test body') -> dict:
+    """Build a `format='full'` messages.get response with a text/plain body"""
+    return {
+        'id': message_id,
+        'payload': {
+            'headers': [
+                {'name': 'Subject', 'value': subject},
+                {'name': 'From', 'value': sender},
+                {'name': 'Date', 'value': date}
+            ],
+            'mimeType': 'text/plain',
+            'body': {
+                'data': base64.urlsafe_b64encode(body.encode('utf-8')).decode('ascii')
+            }
+        }
+    }
+
+
+PLATFORM_SENDERS = [
+    ('Lenny', 'lenny@substack.com'),
+    ('The Pragmatic Engineer', 'pragmaticengineer@substack.com'),
+    ('TLDR AI', 'dan@tldrnewsletter.com'),
+    ('Ben\'s Bites', 'bensbites@mail.beehiiv.com'),
+    ('Maven', 'hello@maven.com'),
+    ('Morning Brew', 'crew@morningbrew.com'),
+]
+
+PERSONAL_SENDERS = [
+    ('Alex', 'alex@gmail.com'),
+    ('Sam', 'sam@example.com'),
+    ('Billing', 'billing@bank.example'),
+]
+
+WORDS = ('ai agents retrieval models launch pricing growth founders startup product '
+         'research benchmark latency evaluation funding market design hiring roadmap '
+         'strategy users data platform open source weekly analysis').split()
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return ' '.join(rng.choices(WORDS, k=words))
+
+
+def _part(mime_type: str, text: str, charset: str = 'utf-8') -> dict:
+    return {
+        'mimeType': mime_type,
+        'headers': [{'name': 'Content-Type', 'value': f'{mime_type}; charset="{charset}"'}],
+        'body': {
+            'size': len(text),
+            'data': base64.urlsafe_b64encode(text.encode(charset)).decode('ascii')
+        }
+    }
+
+
+def synthetic_message(message_id: str, rng: random.Random, newsletter: bool = True) -> dict:
+    """
+    Build a realistic `format='full'` message.
+
+    Newsletters are nested multipart/mixed > multipart/related >
+    multipart/alternative trees with a large html part, an inline image and
+    List-* headers; a share of them are html-only. Personal mail is a short
+    text/plain message.
+    """
+    name, address = rng.choice(PLATFORM_SENDERS if newsletter else PERSONAL_SENDERS)
+    headers = [
+        {'name': 'Subject', 'value': (f'Issue #{rng.randint(1, 400)}: ' if newsletter else '')
+                                     + _text(rng, 6).capitalize()},
+        {'name': 'From', 'value': f'{name} <{address}>'},
+        {'name': 'Date', 'value': f'Mon, {rng.randint(1, 28)} Jan 2025 '
+                                  f'{rng.randint(0, 23):02d}:00:00 +0000'},
+    ]
+
+    if not newsletter:
+        payload = _part('text/plain', _text(rng, rng.randint(20, 200)))
+        payload['headers'] = headers + payload['headers']
+        return {'id': message_id, 'payload': payload}
+
+    headers += [
+        {'name': 'List-Unsubscribe', 'value': f'<mailto:unsubscribe@{address.split("@")[1]}>'},
+        {'name': 'List-Id', 'value': f'<{address.split("@")[0]}.list>'},
+    ]
+    paragraphs = [_text(rng, rng.randint(40, 120)) for _ in range(rng.randint(10, 60))]
+    html = ('<html><head><style>td{padding:0}</style></head><body><table>'
+            + ''.join(f'<tr><td><p>{paragraph}</p></td></tr>' for paragraph in paragraphs)
+            + '<tr><td><a href="https://example.com/unsubscribe">Unsubscribe</a></td></tr>'
+            + '</table></body></html>')
+
+    alternatives = [_part('text/html', html)]
+    if rng.random() < 0.7:
+        alternatives.insert(0, _part('text/plain', '\n\n'.join(paragraphs)))
+
+    payload = {
+        'mimeType': 'multipart/mixed',
+        'headers': headers,
+        'parts': [{
+            'mimeType': 'multipart/related',
+            'parts': [
+                {'mimeType': 'multipart/alternative', 'parts': alternatives},
+                {'mimeType': 'image/png', 'filename': 'logo.png',
+                 'body': {'attachmentId': f'{message_id}-logo', 'size': 4096}},
+            ]
+        }]
+    }
+    return {'id': message_id, 'payload': payload}
+
+
+def large_newsletter(message_id: str, size: int, seed: int = 0) -> dict:
+    """
+    Build an html-only newsletter of about size bytes whose html part Gmail
+    serves behind `body.attachmentId`, as it does for large parts.
+    """
+    rng = random.Random(seed)
+    paragraphs = []
+    length = 0
+    while length < size:
+        paragraphs.append(f'<p>{_text(rng, 80)}</p>')
+        length += len(paragraphs[-1])
+    html = f'<html><body>{"".join(paragraphs)}</body></html>'
+
+    part = _part('text/html', html)
+    part['body']['attachmentId'] = f'{message_id}-html'
+    return {'id': message_id, 'payload': {
+        'mimeType': 'multipart/alternative',
+        'headers': [
+            {'name': 'Subject', 'value': f'Deep dive #{seed}'},
+            {'name': 'From', 'value': 'Long Reads <longreads@substack.com>'},
+            {'name': 'Date', 'value': 'Mon, 6 Jan 2025 12:00:00 +0000'},
+        ],
+        'parts': [part]
+    }}
+
+
+def _leaf_parts(payload: dict) -> Iterator[dict]:
+    stack = [payload]
+    while stack:
+        part = stack.pop()
+        stack.extend(part.get('parts', []))
+        if 'parts' not in part:
+            yield part
+
+
+def synthetic_mailbox(count: int, newsletter_ratio: float = 0.8, seed: int = 0) -> List[dict]:
+    """Generate count messages, newest first, reproducibly from seed"""
+    rng = random.Random(seed)
+    return [synthetic_message(f'{index:016x}', rng, rng.random() < newsletter_ratio)
+            for index in range(count)]
+
+
+def raw_message(message: dict) -> str:
+    """
+    Render a `format='full'` message as the base64url RFC 2822 `raw` field
+    Gmail returns for `format='raw'`. Attachment-backed parts are filled with
+    placeholder bytes of their declared size.
+    """
+    root = _mime_node(message['payload'])
+    for header in message['payload'].get('headers', []):
+        if header['name'].lower() not in ('content-type', 'mime-version'):
+            root[header['name']] = _encode_header(header['name'], header['value'])
+    raw = root.as_bytes()
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def _encode_header(name: str, value: str) -> str:
+    """RFC 2047-encode a non-ascii header value, keeping addresses readable"""
+    if value.isascii():
+        return value
+    if name.lower() in ('from', 'to', 'cc', 'reply-to'):
+        return formataddr(parseaddr(value), 'utf-8')
+    return Header(value, 'utf-8').encode()
+
+
+def _mime_node(part: dict):
+    maintype, _, subtype = part.get('mimeType', 'text/plain').partition('/')
+    body = part.get('body', {})
+
+    if 'parts' in part:
+        return MIMEMultipart(subtype, _subparts=[_mime_node(child) for child in part['parts']])
+
+    if maintype == 'text':
+        data = body.get('data', '')
+        charset = part_charset(part) or 'utf-8'
+        text = base64.urlsafe_b64decode(data + '=' * (-len(data) % 4)).decode(charset)
+        return MIMEText(text, subtype, charset)
+
+    node = MIMEBase(maintype, subtype)
+    node.set_payload(base64.encodebytes(b'\0' * body.get('size', 0)).decode('ascii'))
+    node['Content-Transfer-Encoding'] = 'base64'
+    if part.get('filename'):
+        node.add_header('Content-Disposition', 'inline', filename=part['filename'])
+    return node
+
+
+def http_error(status: int, reason: str = 'Error') -> HttpError:
+    """Build an HttpError carrying the given HTTP status"""
+    resp = httplib2.Response({'status': status})
+    resp.reason = reason
+    return HttpError(resp=resp, content=reason.encode('utf-8'))
+
+
+def rate_limit_error() -> HttpError:
+    """Build the 429 Gmail returns when the per-user quota is exceeded"""
+    resp = httplib2.Response({'status': 429})
+    resp.reason = 'Too Many Requests'
+    content = json.dumps({'error': {
+        'code': 429,
+        'message': 'User-rate limit exceeded.',
+        'errors': [{'reason': 'rateLimitExceeded'}]
+    }})
+    return HttpError(resp=resp, content=content.encode('utf-8'))
+
+
+class FakeRequest:
+    """A single API call; executing it costs one round trip"""
+
+    def __init__(self, service: 'FakeGmailService', handler: Callable[[], dict]):
+        self._service = service
+        self._handler = handler
+
+    def execute(self, http=None, num_retries: int = 0) -> dict:
+        with self._service.round_trip():
+            return self._handler()
+
+
+class FakeBatchRequest:
+    """A Gmail batch request; executing it costs one round trip in total"""
+
+    def __init__(self, service: 'FakeGmailService', callback: Optional[Callable] = None):
+        self._service = service
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request: FakeRequest, callback: Optional[Callable] = None,
+            request_id: Optional[str] = None):
+        request_id = request_id or str(len(self._requests))
+        self._requests.append((request_id, request, callback or self._callback))
+
+    def execute(self, http=None):
+        with self._service.round_trip():
+            with self._service.lock:
+                self._service.batch_sizes.append(len(self._requests))
+            outcomes = []
+            for request_id, request, callback in self._requests:
+                try:
+                    outcomes.append((request_id, callback, request._handler(), None))
+                except HttpError as error:
+                    outcomes.append((request_id, callback, None, error))
+
+        for request_id, callback, response, error in outcomes:
+            callback(request_id, response, error)
+
+
+class FakeAttachmentsResource:
+    """users().messages().attachments() resource"""
+
+    def __init__(self, service: 'FakeGmailService'):
+        self._service = service
+
+    def get(self, userId: str, messageId: str, id: str) -> FakeRequest:
+        def handler():
+            self._service.charge(5)
+            with self._service.lock:
+                self._service.attachment_gets.append(id)
+            if messageId not in self._service.messages:
+                raise http_error(404, 'Not Found')
+            data = self._service.attachments.get(id, '')
+            with self._service.lock:
+                self._service.bytes_served += len(data)
+            return {'size': len(data) * 3 // 4, 'data': data}
+        return FakeRequest(self._service, handler)
+
+
+class FakeMessagesResource:
+    """users().messages() resource"""
+
+    def __init__(self, service: 'FakeGmailService'):
+        self._service = service
+
+    def attachments(self) -> FakeAttachmentsResource:
+        return FakeAttachmentsResource(self._service)
+
+    def list(self, userId: str, maxResults: int = 100, q: Optional[str] = None,
+             pageToken: Optional[str] = None) -> FakeRequest:
+        def handler():
+            self._service.charge(5)
+            ids = self._service.message_ids
+            start = int(pageToken or 0)
+            end = start + maxResults
+            response = {'messages': [{'id': message_id} for message_id in ids[start:end]],
+                        'resultSizeEstimate': len(ids)}
+            if end < len(ids):
+                response['nextPageToken'] = str(end)
+            return response
+        return FakeRequest(self._service, handler)
+
+    def get(self, userId: str, id: str, format: str = 'full',
+            metadataHeaders: Optional[List[str]] = None) -> FakeRequest:
+        def handler():
+            self._service.charge(5)
+            with self._service.lock:
+                self._service.gets.append(id)
+                self._service.formats.append(format)
+            if id in self._service.failing_ids or id not in self._service.messages:
+                raise http_error(404, 'Not Found')
+            if self._service.should_fail():
+                raise http_error(self._service.error_status, 'Backend Error')
+
+            message = self._service.served(id)
+            if format == 'raw':
+                message = {'id': id, 'raw': self._service.raw(id)}
+            elif format == 'metadata':
+                wanted = {name.lower() for name in metadataHeaders or []}
+                headers = [header for header in message['payload'].get('headers', [])
+                           if not wanted or header['name'].lower() in wanted]
+                message = {'id': id, 'payload': {'headers': headers}}
+
+            with self._service.lock:
+                self._service.bytes_served += len(json.dumps(message))
+            return message
+        return FakeRequest(self._service, handler)
+
+
+class FakeHistoryResource:
+    """users().history() resource"""
+
+    def __init__(self, service: 'FakeGmailService'):
+        self._service = service
+
+    def list(self, userId: str, startHistoryId: str, historyTypes=None,
+             labelId: Optional[str] = None, pageToken: Optional[str] = None,
+             maxResults: int = 100) -> FakeRequest:
+        def handler():
+            start = int(startHistoryId)
+            if start < self._service.oldest_history_id:
+                raise http_error(404, 'Requested entity was not found.')
+            records = [{'id': str(history_id),
+                        'messagesAdded': [{'message': {'id': message_id}}]}
+                       for history_id, message_id in self._service.history
+                       if history_id > start]
+            offset = int(pageToken or 0)
+            response = {'history': records[offset:offset + maxResults],
+                        'historyId': str(self._service.history_id)}
+            if offset + maxResults < len(records):
+                response['nextPageToken'] = str(offset + maxResults)
+            return response
+        return FakeRequest(self._service, handler)
+
+
+class FakeUsersResource:
+    """users() resource"""
+
+    def __init__(self, service: 'FakeGmailService'):
+        self._service = service
+
+    def messages(self) -> FakeMessagesResource:
+        return FakeMessagesResource(self._service)
+
+    def history(self) -> FakeHistoryResource:
+        return FakeHistoryResource(self._service)
+
+    def getProfile(self, userId: str) -> FakeRequest:
+        return FakeRequest(self._service, lambda: {
+            'emailAddress': 'me@example.com',
+            'messagesTotal': len(self._service.message_ids),
+            'historyId': str(self._service.history_id)
+        })
+
+
+class FakeGmailService:
+    """
+    In-memory stand-in for `build('gmail', 'v1', ...)`.
+
+    Args:
+        messages: `format='full'` message resources, newest first
+        failing_ids: Message IDs whose gets always fail, as if deleted
+        latency: Seconds each round trip sleeps, to simulate the network
+        jitter: Extra random latency, up to this many seconds
+        error_rate: Fraction of message gets that fail at random
+        error_status: HTTP status of injected (transient) failures
+        seed: Seed for the jitter and error injection
+        quota_per_second: Quota units served per second before answering
+            429 rateLimitExceeded (None for no quota)
+        raw: Pre-rendered `format='raw'` messages by ID (see raw_message);
+            others are rendered on first request
+    """
+
+    def __init__(self, messages: List[dict], failing_ids: Optional[List[str]] = None,
+                 latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 503, seed: int = 0,
+                 quota_per_second: Optional[float] = None,
+                 raw: Optional[Dict[str, str]] = None):
+        self.messages: Dict[str, dict] = {message['id']: message for message in messages}
+        self.message_ids: List[str] = [message['id'] for message in messages]
+        self.failing_ids = set(failing_ids or [])
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._rng = random.Random(seed)
+        self.quota_per_second = quota_per_second
+        self.throttled = 0
+        self._quota = quota_per_second or 0.0
+        self._quota_updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.round_trips = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.batch_sizes: List[int] = []
+        self.gets: List[str] = []
+        self.formats: List[str] = []
+        self.bytes_served = 0
+        self.history_id = 1000
+        self.oldest_history_id = 1
+        self.history: List[tuple] = []
+        self._raw: Dict[str, str] = dict(raw or {})
+        self.attachments: Dict[str, str] = {}
+        self.attachment_gets: List[str] = []
+        self._served: Dict[str, dict] = {}
+        for message in messages:
+            self._index_attachments(message)
+        # Real services expose their AuthorizedHttp here; GmailFetcher copies
+        # the credentials to give each worker thread its own transport.
+        self._http = SimpleNamespace(credentials=object())
+
+    @contextmanager
+    def round_trip(self):
+        """Account for one HTTP round trip, sleeping for the injected latency"""
+        with self.lock:
+            self.round_trips += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            delay = self.latency
+            if self.jitter:
+                with self.lock:
+                    delay += self._rng.uniform(0, self.jitter)
+            if delay:
+                time.sleep(delay)
+            yield
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def charge(self, units: int):
+        """Spend quota units, answering 429 once a second's worth is used up"""
+        if self.quota_per_second is None:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self._quota = min(self.quota_per_second,
+                              self._quota + (now - self._quota_updated) * self.quota_per_second)
+            self._quota_updated = now
+            if self._quota < units:
+                self.throttled += 1
+                raise rate_limit_error()
+            self._quota -= units
+
+    def _index_attachments(self, message: dict):
+        """
+        Serve the inline data of parts that carry an attachmentId through
+        attachments().get instead, as Gmail does for large parts.
+        """
+        backed = [part for part in _leaf_parts(message['payload'])
+                  if part.get('body', {}).get('attachmentId') and part['body'].get('data')]
+        if not backed:
+            return
+        for part in backed:
+            self.attachments[part['body']['attachmentId']] = part['body']['data']
+        served = json.loads(json.dumps(message))
+        for part in _leaf_parts(served['payload']):
+            if part.get('body', {}).get('attachmentId'):
+                part['body'].pop('data', None)
+        self._served[message['id']] = served
+
+    def served(self, message_id: str) -> dict:
+        """The `format='full'` resource for a message, without attachment data"""
+        return self._served.get(message_id) or self.messages[message_id]
+
+    def raw(self, message_id: str) -> str:
+        """The message's `format='raw'` rendering, built once"""
+        if message_id not in self._raw:
+            self._raw[message_id] = raw_message(self.messages[message_id])
+        return self._raw[message_id]
+
+    def should_fail(self) -> bool:
+        """Draw whether an injected error hits the current request"""
+        if not self.error_rate:
+            return False
+        with self.lock:
+            return self._rng.random() < self.error_rate
+
+    def deliver(self, messages: List[dict]):
+        """Add new messages to the top of the mailbox, recording history"""
+        for message in messages:
+            self.history_id += 1
+            self.history.append((self.history_id, message['id']))
+            self.messages[message['id']] = message
+            self.message_ids.insert(0, message['id'])
+            self._index_attachments(message)
+
+    def expire_history(self):
+        """Drop all history so older checkpoints return 404"""
+        self.oldest_history_id = self.history_id + 1
+        self.history = []
+
+    def users(self) -> FakeUsersResource:
+        return FakeUsersResource(self)
+
+    def new_batch_http_request(self, callback: Optional[Callable] = None) -> FakeBatchRequest:
+        return FakeBatchRequest(self, callback)
@@ -0,0 +1,175 @@
+"""
+Test suite for serving many accounts from one AccountPool.
+"""
+
+import sys
+import os
+import datetime
+import json
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+
+from agent.account_pool import AccountPool, FairSlots
+from agent.quota_scheduler import QuotaScheduler
+from evals.fake_gmail import FakeGmailService, make_message
+
+
+class FakeCredentials:
+    """Credentials whose refresh just extends the expiry"""
+    
+    def __init__(self, expires_in: float):
+        self.token = 'access'
+        self.refresh_token = 'refresh'
+        self.expiry = datetime.datetime.utcnow() + datetime.timedelta(seconds=expires_in)
+        self.refreshes = 0
+    
+    def refresh(self, request):
+        self.refreshes += 1
+        self.token = f'access-{self.refreshes}'
+        self.expiry = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+    
+    def to_json(self) -> str:
+        return json.dumps({'token': self.token})
+
+
+def mailbox_service(name: str, count: int, **kwargs) -> FakeGmailService:
+    return FakeGmailService(
+        [make_message(f'{name}-{i}', subject=f'{name} issue {i}') for i in range(count)],
+        **kwargs
+    )
+
+
+class TestFairSlots:
+    """Test the shared, round-robin concurrency cap"""
+    
+    def test_slots_rotate_across_accounts(self):
+        """Test that a freed slot goes to the next account, not the first waiter"""
+        slots = FairSlots(1)
+        slots.acquire('holder')
+        granted = []
+        
+        def wait(account):
+            with slots.slot(account):
+                granted.append(account)
+        
+        threads = []
+        for account in ['a', 'a', 'a', 'b']:
+            thread = threading.Thread(target=wait, args=(account,))
+            thread.start()
+            threads.append(thread)
+            while sum(len(queue) for queue in slots._waiters.values()) < len(threads):
+                time.sleep(0.001)
+        
+        slots.release()
+        for thread in threads:
+            thread.join()
+        
+        assert granted == ['a', 'b', 'a', 'a']
+        assert slots.peak == 1
+    
+    def test_limit_must_be_positive(self):
+        """Test that a zero limit is rejected"""
+        with pytest.raises(ValueError):
+            FairSlots(0)
+
+
+class TestAccountPool:
+    """Test fan-out fetching and token refresh across accounts"""
+    
+    def test_fetches_every_account(self):
+        """Test that each account's emails come from its own mailbox"""
+        pool = AccountPool(batch_size=10)
+        pool.add_account('alice', service=mailbox_service('alice', 12))
+        pool.add_account('bob', service=mailbox_service('bob', 3))
+        
+        results = pool.fetch_recent_emails(max_results=20)
+        
+        assert [email.message_id for email in results['alice']] == [f'alice-{i}' for i in range(12)]
+        assert [email.message_id for email in results['bob']] == ['bob-0', 'bob-1', 'bob-2']
+    
+    def test_concurrency_cap_is_shared(self):
+        """Test that accounts overlap but never exceed the pool's cap in total"""
+        pool = AccountPool(max_concurrency=3, max_workers=4)
+        services = [mailbox_service(f'user{i}', 10, latency=0.005) for i in range(4)]
+        for i, service in enumerate(services):
+            pool.add_account(f'user{i}', service=service)
+        
+        results = pool.fetch_recent_emails(max_results=10)
+        
+        assert all(len(emails) == 10 for emails in results.values())
+        assert 1 < pool.slots.peak <= 3
+        assert sum(service.max_in_flight for service in services) > 3
+    
+    def test_failing_account_does_not_affect_others(self, tmp_path):
+        """Test that an account that cannot authenticate gets an empty result"""
+        pool = AccountPool(credentials_path=str(tmp_path / 'missing.json'),
+                           accounts_dir=str(tmp_path))
+        pool.add_account('broken')
+        pool.add_account('ok', service=mailbox_service('ok', 2))
+        
+        results = pool.fetch_recent_emails(max_results=5)
+        
+        assert results['broken'] == []
+        assert len(results['ok']) == 2
+    
+    def test_accounts_keep_separate_state(self, tmp_path):
+        """Test per-account token paths and sync checkpoints"""
+        pool = AccountPool(accounts_dir=str(tmp_path))
+        pool.add_account('alice', service=mailbox_service('alice', 2))
+        
+        pool.sync_emails()
+        
+        assert pool['alice'].token_path == str(tmp_path / 'alice' / 'token.json')
+        assert (tmp_path / 'alice' / 'sync_state.json').exists()
+        with pytest.raises(ValueError):
+            pool.add_account('alice')
+    
+    def test_each_account_gets_its_own_scheduler(self):
+        """Test that accounts never share a quota bucket, and only pool-built schedulers are gated"""
+        pool = AccountPool(scheduler_factory=lambda: QuotaScheduler(units_per_second=None))
+        own = QuotaScheduler(units_per_second=None)
+        for name in ('alice', 'bob'):
+            pool.add_account(name, service=mailbox_service(name, 0))
+        pool.add_account('carol', service=mailbox_service('carol', 0), scheduler=own)
+        
+        alice, bob = pool['alice'].scheduler, pool['bob'].scheduler
+        assert alice is not bob
+        assert alice.bucket is None
+        assert (alice.gate.args, bob.gate.args) == (('alice',), ('bob',))
+        assert pool['carol'].scheduler is own and own.gate is None
+        with pytest.raises(ValueError):
+            AccountPool(scheduler=own)
+    
+    def test_expiring_tokens_are_refreshed(self, tmp_path):
+        """Test that only tokens inside the refresh margin are refreshed and saved"""
+        pool = AccountPool(accounts_dir=str(tmp_path), refresh_margin=300)
+        expiring, fresh = FakeCredentials(60), FakeCredentials(3600)
+        for name, creds in [('expiring', expiring), ('fresh', fresh)]:
+            service = mailbox_service(name, 0)
+            service._http.credentials = creds
+            pool.add_account(name, service=service)
+        
+        assert pool.refresh_tokens() == ['expiring']
+        
+        assert (expiring.refreshes, fresh.refreshes) == (1, 0)
+        saved = json.loads((tmp_path / 'expiring' / 'token.json').read_text())
+        assert saved == {'token': 'access-1'}
+        assert not (tmp_path / 'fresh' / 'token.json').exists()
+    
+    def test_background_refresher(self, tmp_path):
+        """Test that a started pool refreshes tokens on its own"""
+        creds = FakeCredentials(0)
+        service = mailbox_service('alice', 0)
+        service._http.credentials = creds
+        
+        with AccountPool(accounts_dir=str(tmp_path), refresh_interval=0.01) as pool:
+            pool.add_account('alice', service=service)
+            deadline = time.monotonic() + 2
+            while not creds.refreshes and time.monotonic() < deadline:
+                time.sleep(0.01)
+        
+        assert creds.refreshes == 1
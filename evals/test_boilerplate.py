@@ -0,0 +1,107 @@
+"""
+Test suite for per-sender boilerplate templates.
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+
+from agent.boilerplate import BoilerplateTemplates, split_paragraphs
+from agent.gmail_fetcher import Email
+from agent.mime_parser import html_to_text
+
+
+FOOTER = ('<p>You are receiving this because you subscribed. '
+          '<a href="https://x.example/u">Unsubscribe</a></p>'
+          '<p>© {year} Example Media, 1 Main St</p>')
+
+
+TOPICS = ['chips', 'rockets', 'batteries', 'compilers', 'genomes', 'satellites', 'robots',
+          'vaccines', 'fusion', 'databases']
+
+
+def issue(number, sender='Example <news@example.com>', year=2025):
+    topic = TOPICS[number]
+    html = (f'<p><a href="https://x.example/web">View in browser</a></p>'
+            f'<h1>All about {topic}</h1><p>This week: why {topic} matter.</p>'
+            + FOOTER.format(year=year))
+    return Email(f'm{number}', f'Issue {number}', sender, 'd', html_to_text(html))
+
+
+@pytest.fixture
+def templates(tmp_path):
+    templates = BoilerplateTemplates(str(tmp_path / 'boilerplate.db'))
+    yield templates
+    templates.close()
+
+
+class TestBoilerplateTemplates:
+    """Test learning and stripping of repeated paragraphs"""
+    
+    def test_strips_after_min_issues(self, templates):
+        """Test that header and footer go once a sender has sent enough issues"""
+        cleaned = list(templates.filter(issue(number) for number in range(1, 6)))
+        
+        assert 'Unsubscribe' in cleaned[1].body
+        assert cleaned[2].body == 'All about compilers\n\nThis week: why compilers matter.'
+        assert cleaned[4].body == 'All about satellites\n\nThis week: why satellites matter.'
+        assert templates.report().stripped_messages == 3
+        assert templates.report().stripped_paragraphs == 9
+    
+    def test_cleaned_emails_keep_headers(self, templates):
+        """Test that stripped copies keep the List-* headers classification relies on"""
+        headers = {'List-Id': '<weekly.example.com>'}
+        emails = [issue(number) for number in range(1, 5)]
+        for email in emails:
+            email.headers = headers
+        
+        cleaned = list(templates.filter(emails))
+        
+        assert cleaned[-1].body != emails[-1].body
+        assert all(email.headers == headers for email in cleaned)
+    
+    def test_digits_are_masked(self, templates):
+        """Test that a footer whose year changes still matches"""
+        for number in range(1, 4):
+            templates.clean(issue(number, year=2024))
+        
+        assert 'Example Media' not in templates.clean(issue(4, year=2025)).body
+    
+    def test_templates_are_per_sender(self, templates):
+        """Test that one sender's boilerplate is not stripped from another's mail"""
+        for number in range(1, 5):
+            templates.clean(issue(number))
+        
+        other = issue(9, sender='Other <other@example.org>')
+        assert templates.clean(other) is other
+        assert len(templates) == 2
+    
+    def test_relearning_a_message_is_a_no_op(self, templates, tmp_path):
+        """Test that refetched messages are counted once, across reopening"""
+        for _ in range(3):
+            templates.clean(issue(1))
+        assert templates.strip('news@example.com', ['View in browser', 'x']) == \
+            ['View in browser', 'x']
+        templates.close()
+        
+        reopened = BoilerplateTemplates(str(tmp_path / 'boilerplate.db'))
+        reopened.clean(issue(2))
+        cleaned = reopened.clean(issue(3))
+        reopened.close()
+        assert cleaned.body.startswith('All about compilers\n\nThis week')
+    
+    def test_never_strips_everything(self, templates):
+        """Test that a message made only of boilerplate is kept whole"""
+        for number in range(1, 4):
+            templates.clean(issue(number))
+        
+        paragraphs = split_paragraphs(issue(1).body)
+        only_footer = paragraphs[:1] + paragraphs[-2:]
+        assert templates.strip('news@example.com', only_footer) == only_footer
+    
+    def test_split_paragraphs(self):
+        """Test splitting plain text at blank lines"""
+        assert split_paragraphs('a\nb\n\n  \n\nc\n\n') == ['a\nb', 'c']
@@ -7,10 +7,19 @@ import pytest
 from unittest.mock import Mock, patch, MagicMock
 import sys
 import os
+import datetime
+import json
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-from agent.gmail_fetcher import GmailFetcher, Email
+from agent.gmail_fetcher import GmailFetcher, Email, SpooledEmail
+from agent.quota_scheduler import QuotaScheduler
+from evals.fake_gmail import (FakeGmailService, http_error, large_newsletter, make_message,
+                              synthetic_mailbox)
+
+
+def unlimited_scheduler():
+    return QuotaScheduler(units_per_second=None, sleep=lambda seconds: None)
 
 
 class TestGmailFetcher:
@@ -111,9 +120,24 @@ class TestGmailFetcher:
         
         with pytest.raises(Exception) as exc_info:
             fetcher = GmailFetcher()
+            fetcher.authenticate()
         
         assert "Connection failed" in str(exc_info.value)
     
+    @patch('agent.gmail_fetcher.GmailFetcher._authenticate')
+    def test_authenticates_on_first_use(self, mock_auth):
+        """Test that construction is cheap and auth runs once, on first API use"""
+        mock_service = Mock()
+        mock_service.users().messages().list().execute.return_value = {'messages': []}
+        mock_auth.return_value = mock_service
+        
+        fetcher = GmailFetcher()
+        assert mock_auth.call_count == 0
+        
+        fetcher.fetch_recent_emails(max_results=5)
+        fetcher.fetch_recent_emails(max_results=5)
+        assert mock_auth.call_count == 1
+    
     @patch('agent.gmail_fetcher.GmailFetcher._authenticate')
     def test_fetch_with_query_filter(self, mock_auth):
         """Test fetching emails with a query filter (e.g., newsletters only)"""
@@ -311,3 +335,537 @@ class TestGmailFetcher:
         emails = fetcher.fetch_recent_emails(max_results=5)
         
         assert emails == []
+
+
+class TestBatchFetch:
+    """Test batched message fetching against a fake Gmail service"""
+    
+    def _mailbox(self, count):
+        return [make_message(f'msg{i}', subject=f'Issue {i}') for i in range(count)]
+    
+    def test_batch_fetch_preserves_order(self):
+        """Test that batched fetching returns emails in list order"""
+        service = FakeGmailService(self._mailbox(7))
+        fetcher = GmailFetcher(batch_size=3, service=service)
+        
+        emails = fetcher.fetch_recent_emails(max_results=7)
+        
+        assert [email.message_id for email in emails] == [f'msg{i}' for i in range(7)]
+        assert emails[3].subject == 'Issue 3'
+        assert emails[3].body == 'Test body'
+    
+    def test_batch_fetch_reduces_round_trips(self):
+        """Test that message gets are grouped into batch requests"""
+        service = FakeGmailService(self._mailbox(250))
+        fetcher = GmailFetcher(batch_size=100, service=service, scheduler=unlimited_scheduler())
+        
+        emails = fetcher.fetch_recent_emails(max_results=250)
+        
+        assert len(emails) == 250
+        assert service.batch_sizes == [100, 100, 50]
+        assert service.round_trips == 1 + 3
+    
+    def test_batch_fetch_isolates_failures(self):
+        """Test that one failed message does not drop the rest of its batch"""
+        service = FakeGmailService(self._mailbox(5), failing_ids=['msg2'])
+        fetcher = GmailFetcher(batch_size=5, service=service)
+        
+        emails = fetcher.fetch_recent_emails(max_results=5)
+        
+        assert [email.message_id for email in emails] == ['msg0', 'msg1', 'msg3', 'msg4']
+    
+    def test_batch_size_is_validated(self):
+        """Test that batch sizes beyond the Gmail limit are rejected"""
+        with pytest.raises(ValueError):
+            GmailFetcher(batch_size=101, service=FakeGmailService([]))
+
+
+class TestIterEmails:
+    """Test the paginated iter_emails generator"""
+    
+    def _service(self, count):
+        return FakeGmailService(
+            [make_message(f'msg{i}', subject=f'Issue {i}') for i in range(count)]
+        )
+    
+    def test_follows_next_page_token(self):
+        """Test that iteration walks every page of a large mailbox"""
+        service = self._service(23)
+        fetcher = GmailFetcher(service=service)
+        
+        emails = list(fetcher.iter_emails(page_size=5))
+        
+        assert [email.message_id for email in emails] == [f'msg{i}' for i in range(23)]
+    
+    def test_stops_at_max_results(self):
+        """Test that max_results spans pages and stops listing early"""
+        service = self._service(50)
+        fetcher = GmailFetcher(service=service)
+        
+        emails = list(fetcher.iter_emails(max_results=12, page_size=5))
+        
+        assert len(emails) == 12
+        assert service.gets == [f'msg{i}' for i in range(12)]
+    
+    def test_is_lazy(self):
+        """Test that messages are only fetched as the caller consumes them"""
+        service = self._service(20)
+        fetcher = GmailFetcher(service=service)
+        
+        emails = fetcher.iter_emails(page_size=10)
+        first = next(emails)
+        emails.close()
+        
+        assert first.message_id == 'msg0'
+        assert service.gets == ['msg0']
+    
+    def test_batched_iteration(self):
+        """Test that batch mode fetches each page in batches"""
+        service = self._service(12)
+        fetcher = GmailFetcher(batch_size=4, service=service)
+        
+        emails = list(fetcher.iter_emails(page_size=6))
+        
+        assert len(emails) == 12
+        assert service.batch_sizes == [4, 2, 4, 2]
+    
+    def test_fetch_recent_emails_spans_pages(self):
+        """Test that fetch_recent_emails can return more than one page"""
+        service = self._service(600)
+        fetcher = GmailFetcher(batch_size=100, service=service, scheduler=unlimited_scheduler())
+        
+        emails = fetcher.fetch_recent_emails(max_results=600)
+        
+        assert len(emails) == 600
+        assert emails[-1].message_id == 'msg599'
+    
+    def test_fetch_zero_emails(self):
+        """Test that max_results=0 returns nothing without listing"""
+        service = self._service(5)
+        fetcher = GmailFetcher(service=service)
+        
+        assert fetcher.fetch_recent_emails(max_results=0) == []
+        assert service.round_trips == 0
+
+
+class TestConcurrentFetch:
+    """Test fetching messages on a bounded worker pool"""
+    
+    def _service(self, count, **kwargs):
+        return FakeGmailService(
+            [make_message(f'msg{i}', subject=f'Issue {i}') for i in range(count)],
+            **kwargs
+        )
+    
+    def test_concurrent_fetch_preserves_order(self):
+        """Test that concurrent results come back in list order"""
+        service = self._service(30, latency=0.002)
+        fetcher = GmailFetcher(max_workers=8, service=service)
+        
+        emails = fetcher.fetch_recent_emails(max_results=30)
+        
+        assert [email.message_id for email in emails] == [f'msg{i}' for i in range(30)]
+    
+    def test_concurrency_is_bounded(self):
+        """Test that requests overlap but never exceed max_workers"""
+        service = self._service(40, latency=0.005)
+        fetcher = GmailFetcher(max_workers=4, service=service)
+        
+        fetcher.fetch_recent_emails(max_results=40)
+        
+        assert 1 < service.max_in_flight <= 4
+    
+    def test_concurrent_fetch_skips_failed_messages(self):
+        """Test that a failed get is dropped just like in the serial path"""
+        service = self._service(6, failing_ids=['msg1', 'msg4'])
+        fetcher = GmailFetcher(max_workers=3, service=service)
+        
+        emails = fetcher.fetch_recent_emails(max_results=6)
+        
+        assert [email.message_id for email in emails] == ['msg0', 'msg2', 'msg3', 'msg5']
+    
+    def test_workers_get_their_own_transport(self):
+        """Test that each worker executes over a private HTTP transport"""
+        service = self._service(0)
+        fetcher = GmailFetcher(max_workers=2, service=service)
+        request = Mock()
+        
+        fetcher._init_worker()
+        fetcher._execute(request)
+        
+        http = request.execute.call_args.kwargs['http']
+        assert http.credentials is service._http.credentials
+    
+    def test_concurrent_batches(self):
+        """Test that batch mode and worker pool can be combined"""
+        service = self._service(20)
+        fetcher = GmailFetcher(batch_size=5, max_workers=2, service=service)
+        
+        emails = fetcher.fetch_recent_emails(max_results=20)
+        
+        assert len(emails) == 20
+        assert sorted(service.batch_sizes) == [5, 5, 5, 5]
+
+
+class TestIncrementalSync:
+    """Test History API based incremental sync"""
+    
+    def _fetcher(self, tmp_path, count=5):
+        service = FakeGmailService([make_message(f'msg{i}') for i in range(count)])
+        fetcher = GmailFetcher(service=service,
+                               sync_state_path=str(tmp_path / 'sync_state.json'))
+        return fetcher, service
+    
+    def test_first_sync_is_full_and_checkpoints(self, tmp_path):
+        """Test that the first sync fetches the mailbox and stores a historyId"""
+        fetcher, service = self._fetcher(tmp_path)
+        
+        emails = fetcher.sync_emails()
+        
+        assert [email.message_id for email in emails] == [f'msg{i}' for i in range(5)]
+        assert fetcher._load_history_id() == str(service.history_id)
+    
+    def test_later_syncs_fetch_only_new_mail(self, tmp_path):
+        """Test that an incremental sync only downloads messages added since"""
+        fetcher, service = self._fetcher(tmp_path, count=50)
+        fetcher.sync_emails()
+        service.deliver([make_message('new1'), make_message('new2')])
+        service.gets.clear()
+        
+        emails = fetcher.sync_emails()
+        
+        assert [email.message_id for email in emails] == ['new2', 'new1']
+        assert service.gets == ['new2', 'new1']
+        assert fetcher.sync_emails() == []
+    
+    def test_expired_checkpoint_falls_back_to_full_sync(self, tmp_path):
+        """Test that a 404 from history.list triggers a full sync"""
+        fetcher, service = self._fetcher(tmp_path, count=3)
+        fetcher.sync_emails()
+        service.deliver([make_message('new1')])
+        service.expire_history()
+        
+        emails = fetcher.sync_emails()
+        
+        assert [email.message_id for email in emails] == ['new1', 'msg0', 'msg1', 'msg2']
+        assert fetcher._load_history_id() == str(service.history_id)
+    
+    def test_failed_sync_keeps_checkpoint(self, tmp_path):
+        """Test that the checkpoint only advances after a successful sync"""
+        fetcher, service = self._fetcher(tmp_path)
+        fetcher.sync_emails()
+        checkpoint = fetcher._load_history_id()
+        service.deliver([make_message('new1')])
+        
+        with patch.object(fetcher, '_list_history', side_effect=http_error(500)):
+            assert fetcher.sync_emails() == []
+        
+        assert fetcher._load_history_id() == checkpoint
+    
+    @pytest.mark.parametrize('batch_size', [None, 2])
+    def test_failed_messages_are_retried_by_the_next_sync(self, tmp_path, batch_size):
+        """Test that messages lost to transient errors are fetched by the next sync"""
+        service = FakeGmailService([make_message(f'msg{i}') for i in range(3)])
+        fetcher = GmailFetcher(service=service, batch_size=batch_size,
+                               scheduler=unlimited_scheduler(),
+                               sync_state_path=str(tmp_path / 'sync_state.json'))
+        fetcher.sync_emails()
+        service.deliver([make_message('new1'), make_message('new2')])
+        
+        service.error_rate = 1.0
+        assert fetcher.sync_emails() == []
+        service.error_rate = 0.0
+        emails = fetcher.sync_emails()
+        
+        assert sorted(email.message_id for email in emails) == ['new1', 'new2']
+        assert fetcher._load_sync_state()['failed_ids'] == []
+        assert fetcher.sync_emails() == []
+    
+    def test_deleted_messages_are_not_retried(self, tmp_path):
+        """Test that messages Gmail answers 404 for are not checkpointed for retry"""
+        fetcher, service = self._fetcher(tmp_path)
+        fetcher.sync_emails()
+        service.deliver([make_message('new1'), make_message('gone')])
+        service.failing_ids.add('gone')
+        
+        assert [email.message_id for email in fetcher.sync_emails()] == ['new1']
+        assert fetcher._load_sync_state()['failed_ids'] == []
+    
+    def test_default_checkpoint_lives_next_to_token(self):
+        """Test that the checkpoint defaults to the token's directory"""
+        fetcher = GmailFetcher(token_path='data/token.json', service=FakeGmailService([]))
+        
+        assert fetcher.sync_state_path == os.path.join('data', 'sync_state.json')
+
+
+class TestLazyBodies:
+    """Test metadata-first fetching with lazily loaded bodies"""
+    
+    def _service(self, count=3):
+        return FakeGmailService([
+            make_message(f'msg{i}', subject=f'Issue {i}', body='x' * 5000)
+            for i in range(count)
+        ])
+    
+    def test_fetches_metadata_only(self):
+        """Test that listing emails requests format='metadata'"""
+        service = self._service()
+        fetcher = GmailFetcher(lazy_bodies=True, service=service)
+        
+        emails = fetcher.fetch_recent_emails(max_results=3)
+        
+        assert service.formats == ['metadata'] * 3
+        assert [email.subject for email in emails] == ['Issue 0', 'Issue 1', 'Issue 2']
+        assert emails[0].headers['From'] == 'sender@example.com'
+        assert not emails[0].body_loaded
+        assert service.bytes_served < 3 * 5000
+    
+    def test_body_is_loaded_once_on_access(self):
+        """Test that the full payload is fetched on first body access only"""
+        service = self._service(1)
+        fetcher = GmailFetcher(lazy_bodies=True, service=service)
+        email = fetcher.fetch_recent_emails(max_results=1)[0]
+        
+        assert email.body == 'x' * 5000
+        assert email.body == 'x' * 5000
+        assert service.formats == ['metadata', 'full']
+        assert isinstance(email, Email)
+    
+    def test_lazy_batches(self):
+        """Test that batch mode also fetches metadata only"""
+        service = self._service(4)
+        fetcher = GmailFetcher(lazy_bodies=True, batch_size=4, service=service)
+        
+        emails = fetcher.fetch_recent_emails(max_results=4)
+        
+        assert len(emails) == 4
+        assert service.batch_sizes == [4]
+        assert set(service.formats) == {'metadata'}
+    
+    def test_failed_body_load_is_retried(self):
+        """Test that a failed body fetch is reported and retried on next access"""
+        service = self._service(1)
+        fetcher = GmailFetcher(lazy_bodies=True, service=service)
+        email = fetcher.fetch_recent_emails(max_results=1)[0]
+        
+        service.failing_ids.add('msg0')
+        assert email.body == '(No Content)'
+        
+        service.failing_ids.clear()
+        assert email.body == 'x' * 5000
+    
+    def test_repr_does_not_load_body(self):
+        """Test that printing a lazy email does not hit the network"""
+        service = self._service(1)
+        fetcher = GmailFetcher(lazy_bodies=True, service=service)
+        email = fetcher.fetch_recent_emails(max_results=1)[0]
+        
+        assert '<not loaded>' in repr(email)
+        assert service.formats == ['metadata']
+
+
+class TestCompactEmail:
+    """Test the memory-lean Email representation"""
+    
+    def test_large_bodies_are_compressed(self):
+        """Test that big bodies are stored compressed and decode on access"""
+        body = 'Weekly roundup of everything new. ' * 500
+        email = Email('id1', 'Subject', 'news@example.com', '2025-01-01', body)
+        
+        assert email.body == body
+        assert email.body_size < len(body) // 10
+    
+    def test_unicode_bodies_round_trip(self):
+        """Test that non-ascii text survives the byte representation"""
+        for body in ['Café ☕', 'ü' * 2000]:
+            email = Email('id1', 'Subject', 'news@example.com', '2025-01-01', body)
+            assert email.body == body
+    
+    def test_senders_are_interned(self):
+        """Test that equal sender strings share a single object"""
+        first = Email('id1', 'A', ''.join(['news@', 'example.com']), 'd', 'b')
+        second = Email('id2', 'B', ''.join(['news@', 'example', '.com']), 'd', 'b')
+        
+        assert first.sender is second.sender
+    
+    def test_emails_have_no_instance_dict(self):
+        """Test that Email uses slots rather than a per-instance dict"""
+        email = Email('id1', 'Subject', 'news@example.com', '2025-01-01', 'Body')
+        
+        assert not hasattr(email, '__dict__')
+    
+    def test_equality_and_repr(self):
+        """Test value equality and a readable repr"""
+        first = Email('id1', 'Subject', 'news@example.com', '2025-01-01', 'Body')
+        second = Email('id1', 'Subject', 'news@example.com', '2025-01-01', 'Body')
+        
+        assert first == second
+        assert first != Email('id1', 'Subject', 'news@example.com', '2025-01-01', 'Other')
+        assert repr(first) == ("Email(message_id='id1', subject='Subject', "
+                               "sender='news@example.com', date='2025-01-01', body='Body')")
+
+
+class TestSyntheticMailbox:
+    """Test the synthetic mailbox used by the offline benchmarks"""
+    
+    def test_synthetic_newsletters_parse(self):
+        """Test that generated nested newsletters yield readable bodies"""
+        mailbox = synthetic_mailbox(20, newsletter_ratio=1.0)
+        fetcher = GmailFetcher(batch_size=10, service=FakeGmailService(mailbox))
+        
+        emails = fetcher.fetch_recent_emails(max_results=20)
+        
+        assert len(emails) == 20
+        assert all(email.body != '(No Content)' for email in emails)
+        assert all(email.subject.startswith('Issue #') for email in emails)
+    
+    def test_mailbox_is_reproducible(self):
+        """Test that the same seed generates the same mailbox"""
+        assert synthetic_mailbox(5, seed=3) == synthetic_mailbox(5, seed=3)
+        assert synthetic_mailbox(5, seed=3) != synthetic_mailbox(5, seed=4)
+    
+    def test_injected_errors_drop_messages(self):
+        """Test that random failures are injected at roughly the requested rate"""
+        service = FakeGmailService(synthetic_mailbox(200), error_rate=0.25,
+                                   error_status=400, seed=1)
+        fetcher = GmailFetcher(batch_size=50, service=service, scheduler=unlimited_scheduler())
+        
+        emails = fetcher.fetch_recent_emails(max_results=200)
+        
+        assert 100 < len(emails) < 190
+
+
+class TestAuthentication:
+    """Test token handling and offline service construction"""
+    
+    def _write_token(self, path, expiry):
+        from google.oauth2.credentials import Credentials
+        
+        creds = Credentials(token='access', refresh_token='refresh', client_id='client',
+                            client_secret='secret', token_uri='https://oauth2.googleapis.com/token',
+                            scopes=['https://www.googleapis.com/auth/gmail.readonly'],
+                            expiry=expiry)
+        path.write_text(creds.to_json())
+        os.utime(path, (0, 0))
+    
+    def test_valid_token_is_not_rewritten(self, tmp_path):
+        """Test that an unchanged token leaves token.json untouched"""
+        token_path = tmp_path / 'token.json'
+        self._write_token(token_path, datetime.datetime(2099, 1, 1))
+        fetcher = GmailFetcher(token_path=str(token_path))
+        
+        service = fetcher.authenticate()
+        
+        assert os.stat(token_path).st_mtime == 0
+        request = service.users().messages().list(userId='me', maxResults=5)
+        assert request.uri.startswith('https://gmail.googleapis.com/gmail/v1/users/me/messages')
+    
+    def test_refreshed_token_is_saved(self, tmp_path):
+        """Test that a refreshed token is written back"""
+        token_path = tmp_path / 'token.json'
+        self._write_token(token_path, datetime.datetime(2000, 1, 1))
+        
+        def refresh(creds, request):
+            creds.token = 'refreshed'
+            creds.expiry = datetime.datetime(2099, 1, 1)
+        
+        with patch('google.oauth2.credentials.Credentials.refresh', refresh):
+            GmailFetcher(token_path=str(token_path)).authenticate()
+        
+        assert os.stat(token_path).st_mtime != 0
+        assert json.loads(token_path.read_text())['token'] == 'refreshed'
+
+
+class TestRawMime:
+    """Test `format='raw'` fetching with process-pool parsing"""
+    
+    def _service(self, count):
+        return FakeGmailService([
+            make_message(f'msg{i}', subject=f'Café issue {i}', body=f'Body {i} ☕')
+            for i in range(count)
+        ])
+    
+    def test_raw_mode_matches_full_mode(self):
+        """Test that parsed raw messages equal their full-format Emails"""
+        service = self._service(12)
+        fetcher = GmailFetcher(raw_mime=True, parse_workers=2, batch_size=5, service=service)
+        
+        try:
+            emails = fetcher.fetch_recent_emails(max_results=12)
+        finally:
+            fetcher.close()
+        
+        expected = GmailFetcher(service=self._service(12)).fetch_recent_emails(max_results=12)
+        assert emails == expected
+        assert set(service.formats) == {'raw'}
+    
+    def test_inline_parsing_without_workers(self):
+        """Test that parse_workers=0 parses on the fetching thread"""
+        fetcher = GmailFetcher(raw_mime=True, parse_workers=0, service=self._service(3))
+        
+        emails = fetcher.fetch_recent_emails(max_results=3)
+        
+        assert [email.body for email in emails] == ['Body 0 ☕', 'Body 1 ☕', 'Body 2 ☕']
+        assert fetcher._parse_pool is None
+    
+    def test_parse_failures_skip_the_message(self, capsys):
+        """Test that a message the parser rejects is reported and dropped"""
+        service = self._service(3)
+        service._raw['msg1'] = None
+        fetcher = GmailFetcher(raw_mime=True, parse_workers=1, service=service)
+        
+        try:
+            emails = fetcher.fetch_recent_emails(max_results=3)
+        finally:
+            fetcher.close()
+        
+        assert [email.message_id for email in emails] == ['msg0', 'msg2']
+        assert 'Error parsing email msg1' in capsys.readouterr().out
+
+
+class TestLargeMessages:
+    """Test attachment-backed parts, size caps and spooling"""
+    
+    def test_attachment_backed_body_is_downloaded(self):
+        """Test that an html part served as an attachment is fetched on demand"""
+        message = large_newsletter('big', 20000)
+        service = FakeGmailService([message, make_message('small')])
+        fetcher = GmailFetcher(batch_size=10, service=service, spool_threshold=None)
+        
+        emails = fetcher.fetch_recent_emails(max_results=2)
+        
+        assert not emails[0].body.startswith('<')
+        assert len(emails[0].body) > 15000
+        assert service.attachment_gets == ['big-html']
+    
+    def test_oversized_attachment_is_skipped(self, capsys):
+        """Test that parts over the size cap are never downloaded"""
+        service = FakeGmailService([large_newsletter('big', 20000)])
+        fetcher = GmailFetcher(max_message_bytes=10000, service=service)
+        
+        emails = fetcher.fetch_recent_emails(max_results=1)
+        
+        assert emails[0].body == '(No Content)'
+        assert service.attachment_gets == []
+        assert 'larger than 10000 bytes' in capsys.readouterr().out
+    
+    def test_inline_bodies_are_truncated_to_cap(self):
+        """Test that inline bodies are cut at the cap on a character boundary"""
+        service = FakeGmailService([make_message('msg0', body='é' * 100)])
+        fetcher = GmailFetcher(max_message_bytes=51, service=service)
+        
+        emails = fetcher.fetch_recent_emails(max_results=1)
+        
+        assert emails[0].body == 'é' * 25
+    
+    def test_large_bodies_are_spooled(self, tmp_path):
+        """Test that bodies over the threshold live on disk, not in memory"""
+        service = FakeGmailService([large_newsletter('big', 20000), make_message('small')])
+        fetcher = GmailFetcher(spool_dir=str(tmp_path), spool_threshold=10000, service=service)
+        
+        big, small = fetcher.fetch_recent_emails(max_results=2)
+        
+        assert isinstance(big, SpooledEmail) and big.body_size == 0
+        assert big.body.count('\n\n') > 20 and '<p>' not in big.body
+        assert os.path.exists(tmp_path / 'big.body')
+        assert type(small) is Email and small.body == 'Test body'
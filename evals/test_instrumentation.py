@@ -0,0 +1,125 @@
+"""
+Test suite for fetch-path instrumentation.
+"""
+
+import sys
+import os
+import json
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from agent import instrumentation as instrumentation_module
+from agent.gmail_fetcher import GmailFetcher
+from agent.instrumentation import Instrumentation, MetricsRecorder
+from agent.message_cache import MessageCache
+from agent.quota_scheduler import QuotaScheduler
+from evals.fake_gmail import FakeGmailService, synthetic_mailbox
+
+
+def unlimited_scheduler():
+    return QuotaScheduler(units_per_second=None, sleep=lambda seconds: None)
+
+
+class TestMetricsRecorder:
+    """Test spans, counters and the summary"""
+    
+    def test_nested_spans_record_self_time(self, monkeypatch):
+        """Test that an outer span excludes the time of spans inside it"""
+        ticks = iter([0.0, 1.0, 4.0, 10.0])
+        monkeypatch.setattr(instrumentation_module.time, 'perf_counter', lambda: next(ticks))
+        metrics = MetricsRecorder()
+        
+        with metrics.span('parse'):
+            with metrics.span('decode'):
+                pass
+        
+        assert metrics.stages['decode'].seconds == 3.0
+        assert metrics.stages['parse'].seconds == 7.0
+        assert metrics.stages['parse'].calls == 1
+    
+    def test_default_discards_everything(self):
+        """Test that the default instrumentation records nothing"""
+        instrumentation = Instrumentation()
+        with instrumentation.span('get') as span:
+            instrumentation.add('bytes', 10)
+        assert span is None and not instrumentation.enabled
+    
+    def test_summary_and_report(self):
+        """Test the plain-data summary and the printable report"""
+        metrics = MetricsRecorder()
+        metrics.record('get', 0.02)
+        metrics.record('get', 0.04)
+        metrics.add('cache_hits', 3)
+        metrics.add('cache_misses')
+        
+        summary = json.loads(json.dumps(metrics.summary()))
+        assert summary['stages']['get'] == {'calls': 2, 'seconds': 0.06, 'max_seconds': 0.04}
+        assert summary['cache_hit_ratio'] == 0.75
+        assert 'cache hits 3/4 (75%)' in metrics.report()
+        
+        metrics.reset()
+        assert metrics.summary() == {'stages': {}, 'counters': {}, 'cache_hit_ratio': None}
+
+
+class TestFetcherInstrumentation:
+    """Test what GmailFetcher reports"""
+    
+    def test_full_fetch_reports_stages_and_counters(self):
+        """Test list/get/decode/parse spans, bytes, quota units and emails"""
+        metrics = MetricsRecorder()
+        fetcher = GmailFetcher(batch_size=10, instrumentation=metrics,
+                               service=FakeGmailService(synthetic_mailbox(25)))
+        
+        fetcher.fetch_recent_emails(max_results=25)
+        
+        assert metrics.stages['list'].calls == 1
+        assert metrics.stages['get'].calls == 3
+        assert metrics.stages['parse'].calls == 25
+        assert metrics.stages['decode'].calls >= 25
+        assert metrics.counters['emails'] == 25
+        assert metrics.counters['quota_units'] == 5 + 25 * 5
+        assert metrics.counters['bytes'] > 0
+        assert 'retries' not in metrics.counters
+    
+    def test_cache_hits_are_counted(self, tmp_path):
+        """Test the cache hit ratio of a partly warm cache"""
+        mailbox = synthetic_mailbox(20)
+        cache = MessageCache(str(tmp_path / 'cache.db'))
+        GmailFetcher(batch_size=10, cache=cache,
+                     service=FakeGmailService(mailbox)).fetch_recent_emails(max_results=5)
+        
+        metrics = MetricsRecorder()
+        GmailFetcher(batch_size=10, cache=cache, instrumentation=metrics,
+                     service=FakeGmailService(mailbox)).fetch_recent_emails(max_results=20)
+        
+        assert metrics.cache_hit_ratio == 0.25
+        assert metrics.counters['quota_units'] == 5 + 15 * 5
+    
+    def test_retries_are_counted(self):
+        """Test that retried attempts are counted and charged quota"""
+        scheduler = unlimited_scheduler()
+        metrics = MetricsRecorder()
+        service = FakeGmailService(synthetic_mailbox(30), error_rate=0.3, seed=2)
+        fetcher = GmailFetcher(scheduler=scheduler, instrumentation=metrics, service=service)
+        
+        emails = fetcher.fetch_recent_emails(max_results=30)
+        
+        assert len(emails) == 30
+        assert metrics.counters['retries'] == scheduler.stats.retries > 0
+        assert metrics.counters['quota_units'] == scheduler.stats.units
+        assert metrics.stages['get'].calls == 30 + scheduler.stats.retries
+    
+    def test_raw_mode_reports_parse_wait(self):
+        """Test that waiting on parse processes and raw bytes are reported"""
+        metrics = MetricsRecorder()
+        fetcher = GmailFetcher(batch_size=10, raw_mime=True, parse_workers=1,
+                               instrumentation=metrics,
+                               service=FakeGmailService(synthetic_mailbox(10)))
+        try:
+            fetcher.fetch_recent_emails(max_results=10)
+        finally:
+            fetcher.close()
+        
+        assert metrics.stages['parse_wait'].calls == 10
+        assert metrics.counters['bytes'] > 0
+        assert 'decode' not in metrics.stages
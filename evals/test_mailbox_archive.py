@@ -0,0 +1,173 @@
+"""
+Test suite for the append-only mailbox archive and its replay source.
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+
+from agent.gmail_fetcher import Email, GmailFetcher
+from agent.mailbox_archive import ArchiveReplay, ArchiveWriter, export_mailbox
+from agent.newsletter_classifier import NewsletterClassifier
+from evals.fake_gmail import FakeGmailService, make_message, synthetic_mailbox
+
+
+def sample_emails():
+    return [
+        Email('a', 'Short', 'alice@example.com', 'Mon, 1 Jan 2025', 'tiny body'),
+        Email('b', 'Café ☕', 'Bob <bob@substack.com>', 'Tue, 2 Jan 2025', 'word ' * 500),
+        Email('c', 'Weekly issue', 'news@beehiiv.com', 'Wed, 3 Jan 2025', 'naïve résumé'),
+    ]
+
+
+class TestArchive:
+    """Test writing, replaying and recovering archives"""
+    
+    def test_round_trip(self, tmp_path):
+        """Test that replayed emails equal the archived ones, compressed or not"""
+        path = str(tmp_path / 'mailbox.nla')
+        with ArchiveWriter(path) as writer:
+            assert writer.extend(sample_emails()) == 3
+        
+        with ArchiveReplay(path) as replay:
+            emails = list(replay)
+        
+        assert emails == sample_emails()
+        assert emails[1].stored_body[1] is True
+    
+    def test_appends_skip_archived_messages(self, tmp_path):
+        """Test that reopening appends only unseen message IDs"""
+        path = str(tmp_path / 'mailbox.nla')
+        with ArchiveWriter(path) as writer:
+            writer.extend(sample_emails()[:2])
+        
+        with ArchiveWriter(path) as writer:
+            assert writer.extend(sample_emails()) == 1
+        
+        with ArchiveReplay(path) as replay:
+            assert replay.message_ids() == ['a', 'b', 'c']
+            assert replay.get('c').body == 'naïve résumé'
+            assert replay.get('missing') is None
+    
+    def test_export_and_replay_match_the_fetcher(self, tmp_path):
+        """Test that replay serves what the fetcher fetched, offline"""
+        path = str(tmp_path / 'mailbox.nla')
+        mailbox = synthetic_mailbox(30)
+        fetched = GmailFetcher(service=FakeGmailService(mailbox)).fetch_recent_emails(max_results=30)
+        
+        assert export_mailbox(GmailFetcher(service=FakeGmailService(mailbox)), path) == 30
+        
+        with ArchiveReplay(path) as replay:
+            assert replay.fetch_recent_emails(max_results=30) == fetched
+            assert replay.fetch_recent_emails(max_results=5) == fetched[:5]
+    
+    def test_query_subset(self, tmp_path):
+        """Test from:, subject: and bare-word filtering"""
+        path = str(tmp_path / 'mailbox.nla')
+        with ArchiveWriter(path) as writer:
+            writer.extend(sample_emails())
+        
+        with ArchiveReplay(path) as replay:
+            assert [e.message_id for e in replay.iter_emails(query='from:substack')] == ['b']
+            assert [e.message_id for e in replay.iter_emails(query='subject:"weekly issue"')] == ['c']
+            assert [e.message_id for e in replay.iter_emails(query='résumé from:beehiiv')] == ['c']
+    
+    def test_lazy_emails_are_archived_with_bodies(self, tmp_path):
+        """Test that exporting a metadata-first fetch stores full bodies"""
+        path = str(tmp_path / 'mailbox.nla')
+        service = FakeGmailService([make_message('msg0', body='lazy body')])
+        
+        export_mailbox(GmailFetcher(lazy_bodies=True, service=service), path)
+        
+        with ArchiveReplay(path) as replay:
+            assert replay.get('msg0').body == 'lazy body'
+    
+    @pytest.mark.parametrize('lazy', [False, True])
+    def test_list_headers_are_archived(self, tmp_path, lazy):
+        """Test that replayed emails keep the List-* headers newsletter classification uses"""
+        path = str(tmp_path / 'mailbox.nla')
+        message = make_message('msg0', sender='Weekly <news@custom-domain.org>')
+        message['payload']['headers'] += [
+            {'name': 'List-Unsubscribe', 'value': '<mailto:unsubscribe@custom-domain.org>'},
+            {'name': 'List-Id', 'value': '<weekly.custom-domain.org>'},
+        ]
+        service = FakeGmailService([message, make_message('msg1')])
+        
+        export_mailbox(GmailFetcher(lazy_bodies=lazy, service=service), path)
+        
+        with ArchiveReplay(path) as replay:
+            newsletter, personal = replay.get('msg0'), replay.get('msg1')
+        assert newsletter.headers == {'List-Unsubscribe': '<mailto:unsubscribe@custom-domain.org>',
+                                      'List-Id': '<weekly.custom-domain.org>'}
+        assert NewsletterClassifier().is_newsletter(newsletter)
+        assert newsletter.body == 'Test body'
+        assert personal.headers is None
+    
+    def test_interrupted_append_is_recovered(self, tmp_path):
+        """Test that a torn tail is ignored by replay and truncated by the next writer"""
+        path = str(tmp_path / 'mailbox.nla')
+        with ArchiveWriter(path) as writer:
+            writer.extend(sample_emails()[:2])
+        size = os.path.getsize(path)
+        with open(path, 'ab') as data:
+            data.write(b'\x40\x00\x00\x00partial')
+        with open(f'{path}.idx', 'ab') as index:
+            index.write(size.to_bytes(8, 'little'))
+        
+        with ArchiveReplay(path) as replay:
+            assert len(replay) == 2
+        with ArchiveWriter(path) as writer:
+            writer.append(sample_emails()[2])
+        
+        with ArchiveReplay(path) as replay:
+            assert list(replay) == sample_emails()
+    
+    def test_unindexed_records_are_reindexed(self, tmp_path):
+        """Test that a lost or short index is rebuilt from the data instead of truncating it"""
+        path = str(tmp_path / 'mailbox.nla')
+        with ArchiveWriter(path) as writer:
+            writer.extend(sample_emails()[:2])
+        os.remove(f'{path}.idx')
+        
+        with ArchiveWriter(path) as writer:
+            assert not writer.append(sample_emails()[0])
+            assert writer.append(sample_emails()[2])
+        with ArchiveReplay(path) as replay:
+            assert list(replay) == sample_emails()
+        
+        with open(f'{path}.idx', 'r+b') as index:
+            index.truncate(8)
+        with open(path, 'ab') as data:
+            data.write(b'\x40\x00\x00\x00partial')
+        
+        with ArchiveWriter(path) as writer:
+            assert writer.message_ids == {email.message_id for email in sample_emails()}
+        with ArchiveReplay(path) as replay:
+            assert list(replay) == sample_emails()
+            assert replay.end_offset == os.path.getsize(path)
+    
+    def test_corruption_is_detected(self, tmp_path):
+        """Test that a flipped byte fails the record checksum"""
+        path = str(tmp_path / 'mailbox.nla')
+        with ArchiveWriter(path) as writer:
+            writer.extend(sample_emails()[:1])
+        with open(path, 'r+b') as data:
+            data.seek(-1, os.SEEK_END)
+            data.write(b'X')
+        
+        with ArchiveReplay(path) as replay:
+            with pytest.raises(ValueError):
+                replay[0]
+    
+    def test_rejects_other_files(self, tmp_path):
+        """Test that a file without the archive header is refused"""
+        path = tmp_path / 'notes.txt'
+        path.write_text('hello')
+        
+        with pytest.raises(ValueError):
+            ArchiveReplay(str(path))
+        with pytest.raises(ValueError):
+            ArchiveWriter(str(path))
@@ -0,0 +1,196 @@
+"""
+Test suite for the persistent message cache.
+"""
+
+import sys
+import os
+import sqlite3
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+
+from agent.gmail_fetcher import Email, GmailFetcher, LazyEmail
+from agent.message_cache import MessageCache
+from agent.newsletter_classifier import NewsletterClassifier
+from evals.fake_gmail import FakeGmailService, make_message
+
+
+def make_email(message_id: str) -> Email:
+    return Email(message_id=message_id, subject=f'Subject {message_id}',
+                 sender='sender@example.com', date='2025-01-01', body=f'Body {message_id}')
+
+
+class TestMessageCache:
+    """Test storage, eviction and invalidation"""
+    
+    def test_round_trips_emails(self, tmp_path):
+        """Test that a stored email comes back unchanged"""
+        cache = MessageCache(str(tmp_path / 'cache.db'))
+        cache.put(make_email('a'))
+        
+        assert cache.get('a') == make_email('a')
+        assert cache.get('missing') is None
+    
+    def test_persists_across_instances(self, tmp_path):
+        """Test that the cache survives reopening"""
+        path = str(tmp_path / 'cache.db')
+        cache = MessageCache(path)
+        cache.put(make_email('a'))
+        cache.close()
+        
+        reopened = MessageCache(path)
+        
+        assert len(reopened) == 1
+        assert reopened.get('a').body == 'Body a'
+    
+    def test_evicts_least_recently_used(self, tmp_path):
+        """Test that the oldest untouched entry is evicted at the size cap"""
+        cache = MessageCache(str(tmp_path / 'cache.db'), max_entries=2)
+        cache.put(make_email('a'))
+        cache.put(make_email('b'))
+        cache.get('a')
+        cache.put(make_email('c'))
+        
+        assert len(cache) == 2
+        assert 'a' in cache
+        assert 'b' not in cache
+        assert 'c' in cache
+    
+    def test_invalidate_and_clear(self, tmp_path):
+        """Test explicit invalidation of one entry and of the whole cache"""
+        cache = MessageCache(str(tmp_path / 'cache.db'))
+        for message_id in 'abc':
+            cache.put(make_email(message_id))
+        
+        assert cache.invalidate('b') is True
+        assert cache.invalidate('b') is False
+        assert len(cache) == 2
+        
+        cache.clear()
+        assert len(cache) == 0
+        assert cache.get('a') is None
+    
+    def test_variants_are_separate(self, tmp_path):
+        """Test that an entry is only returned for the variant it was stored under"""
+        cache = MessageCache(str(tmp_path / 'cache.db'))
+        cache.put(make_email('a'), 'v2/full/None')
+        
+        assert cache.get('a', 'v2/full/None') == make_email('a')
+        assert cache.get('a', 'v2/full/10') is None
+        assert cache.get('a') is None
+        assert 'a' in cache and cache.invalidate('a') is True
+    
+    def test_drops_caches_without_variants(self, tmp_path):
+        """Test that a cache written before variants existed starts empty"""
+        path = str(tmp_path / 'cache.db')
+        db = sqlite3.connect(path)
+        db.execute('CREATE TABLE emails (message_id TEXT PRIMARY KEY, subject TEXT, '
+                   'sender TEXT, date TEXT, body TEXT, last_used INTEGER)')
+        db.execute("INSERT INTO emails VALUES ('a', 's', 'f', 'd', 'truncated', 1)")
+        db.commit()
+        db.close()
+        
+        cache = MessageCache(path)
+        
+        assert len(cache) == 0 and cache.get('a') is None
+        cache.put(make_email('a'))
+        assert cache.get('a') == make_email('a')
+    
+    def test_rejects_empty_cap(self, tmp_path):
+        """Test that a cache must hold at least one entry"""
+        with pytest.raises(ValueError):
+            MessageCache(str(tmp_path / 'cache.db'), max_entries=0)
+
+
+class TestFetcherWithCache:
+    """Test that GmailFetcher consults the cache before the network"""
+    
+    def _service(self):
+        return FakeGmailService([make_message(f'msg{i}') for i in range(4)])
+    
+    @pytest.mark.parametrize('options', [{}, {'batch_size': 2}, {'max_workers': 2}])
+    def test_cache_hits_skip_the_network(self, tmp_path, options):
+        """Test that a re-run only pays for the list call"""
+        cache = MessageCache(str(tmp_path / 'cache.db'))
+        service = self._service()
+        fetcher = GmailFetcher(cache=cache, service=service, **options)
+        
+        first = fetcher.fetch_recent_emails(max_results=4)
+        service.gets.clear()
+        service.round_trips = 0
+        second = fetcher.fetch_recent_emails(max_results=4)
+        
+        assert second == first
+        assert service.gets == []
+        assert service.round_trips == 1
+    
+    def test_partial_hits_fetch_only_misses(self, tmp_path):
+        """Test that only uncached messages are batched"""
+        cache = MessageCache(str(tmp_path / 'cache.db'))
+        service = self._service()
+        fetcher = GmailFetcher(batch_size=10, cache=cache, service=service)
+        cache.put(make_email('msg1'), fetcher._cache_variant)
+        
+        emails = fetcher.fetch_recent_emails(max_results=4)
+        
+        assert [email.message_id for email in emails] == ['msg0', 'msg1', 'msg2', 'msg3']
+        assert emails[1].subject == 'Subject msg1'
+        assert service.batch_sizes == [3]
+    
+    def test_entries_of_other_settings_are_not_reused(self, tmp_path):
+        """Test that a body cached under a size cap is refetched without one"""
+        cache = MessageCache(str(tmp_path / 'cache.db'))
+        service = FakeGmailService([make_message('msg0', body='x' * 50)])
+        GmailFetcher(cache=cache, service=service,
+                     max_message_bytes=10).fetch_recent_emails(max_results=1)
+        
+        emails = GmailFetcher(cache=cache, service=service,
+                              max_message_bytes=None).fetch_recent_emails(max_results=1)
+        
+        assert emails[0].body == 'x' * 50
+        assert len(service.gets) == 2
+    
+    def _list_message(self, message_id):
+        message = make_message(message_id, sender='Weekly <news@custom-domain.org>')
+        message['payload']['headers'] += [
+            {'name': 'List-Unsubscribe', 'value': '<mailto:unsubscribe@custom-domain.org>'},
+            {'name': 'List-Id', 'value': '<weekly.custom-domain.org>'},
+        ]
+        return message
+    
+    @pytest.mark.parametrize('first_lazy', [True, False])
+    def test_lazy_cache_hits_keep_metadata_headers(self, tmp_path, first_lazy):
+        """Test that warm lazy fetches classify like cold ones"""
+        cache = MessageCache(str(tmp_path / 'cache.db'))
+        service = FakeGmailService([self._list_message('msg0')])
+        classifier = NewsletterClassifier()
+        
+        first = GmailFetcher(cache=cache, service=service, lazy_bodies=first_lazy)
+        cold = first.fetch_recent_emails(max_results=1)[0]
+        assert cold.body == 'Test body'
+        service.gets.clear()
+        
+        warm = GmailFetcher(cache=cache, service=service,
+                            lazy_bodies=True).fetch_recent_emails(max_results=1)[0]
+        
+        assert isinstance(warm, LazyEmail)
+        assert warm.headers['List-Id'] == '<weekly.custom-domain.org>'
+        assert classifier.is_newsletter(warm) is True
+        assert warm.body == 'Test body'
+        assert service.gets == []
+    
+    def test_entries_without_headers_are_refetched_in_lazy_mode(self, tmp_path):
+        """Test that a headerless entry costs a metadata call but not the body"""
+        cache = MessageCache(str(tmp_path / 'cache.db'))
+        service = FakeGmailService([self._list_message('msg0')])
+        fetcher = GmailFetcher(cache=cache, service=service, lazy_bodies=True)
+        cache.put(Email('msg0', 'Test Subject', 'news@custom-domain.org', 'd', 'Cached body'),
+                  fetcher._cache_variant)
+        
+        email = fetcher.fetch_recent_emails(max_results=1)[0]
+        
+        assert NewsletterClassifier().is_newsletter(email) is True
+        assert email.body == 'Cached body'
+        assert len(service.gets) == 1
+        assert cache.lookup('msg0', fetcher._cache_variant)[1]['List-Id']
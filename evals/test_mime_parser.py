@@ -0,0 +1,260 @@
+"""
+Test suite for MIME body extraction.
+"""
+
+import base64
+import sys
+import os
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from agent import mime_parser
+from agent.mime_parser import (HtmlCleaner, decode_part_data, extract_body, html_to_text,
+                               iter_html_paragraphs, parse_raw_message, part_charset)
+from evals.fake_gmail import make_message, raw_message
+
+
+def encode(text: str, charset: str = 'utf-8') -> str:
+    return base64.urlsafe_b64encode(text.encode(charset)).decode('ascii')
+
+
+def text_part(mime_type: str, text: str, charset: str = None) -> dict:
+    part = {'mimeType': mime_type, 'body': {'data': encode(text, charset or 'utf-8')}}
+    if charset:
+        part['headers'] = [{'name': 'Content-Type',
+                            'value': f'{mime_type}; charset="{charset}"'}]
+    return part
+
+
+class TestExtractBody:
+    """Test body selection across MIME trees"""
+    
+    def test_prefers_first_plain_part(self):
+        """Test that the first text/plain part in document order wins"""
+        payload = {'mimeType': 'multipart/mixed', 'parts': [
+            {'mimeType': 'multipart/alternative', 'parts': [
+                text_part('text/html', '<p>html</p>'),
+                text_part('text/plain', 'first'),
+            ]},
+            text_part('text/plain', 'second'),
+        ]}
+        
+        assert extract_body(payload) == 'first'
+    
+    def test_falls_back_to_first_html_part(self):
+        """Test that html is converted to text when no plain text exists"""
+        payload = {'mimeType': 'multipart/related', 'parts': [
+            {'mimeType': 'image/png', 'body': {'data': encode('png')}},
+            text_part('text/html', '<p>one</p>'),
+            text_part('text/html', '<p>two</p>'),
+        ]}
+        
+        assert extract_body(payload) == 'one'
+    
+    def test_skips_empty_plain_part(self):
+        """Test that an empty text/plain part does not hide later content"""
+        payload = {'mimeType': 'multipart/alternative', 'parts': [
+            {'mimeType': 'text/plain', 'body': {'size': 0}},
+            text_part('text/plain', ''),
+            text_part('text/plain', 'content'),
+        ]}
+        
+        assert extract_body(payload) == 'content'
+    
+    def test_stops_at_plain_text_without_decoding_html(self):
+        """Test that html parts are never decoded once plain text is found"""
+        payload = {'mimeType': 'multipart/alternative', 'parts': [
+            text_part('text/html', '<p>big</p>' * 1000),
+            text_part('text/plain', 'plain'),
+            text_part('text/plain', 'unused'),
+        ]}
+        
+        with patch.object(mime_parser, 'decode_part_data',
+                          wraps=mime_parser.decode_part_data) as decode:
+            assert extract_body(payload) == 'plain'
+        
+        assert decode.call_count == 1
+    
+    def test_handles_deep_nesting_without_recursion(self):
+        """Test that very deep trees do not hit the recursion limit"""
+        payload = text_part('text/plain', 'deep')
+        for _ in range(5000):
+            payload = {'mimeType': 'multipart/mixed', 'parts': [payload]}
+        
+        assert extract_body(payload) == 'deep'
+    
+    def test_no_readable_parts(self):
+        """Test that messages without text parts yield an empty body"""
+        assert extract_body({'mimeType': 'multipart/mixed', 'parts': []}) == ''
+    
+    def test_attachment_backed_parts_use_loader(self):
+        """Test that parts served as attachments are loaded only when selected"""
+        payload = {'mimeType': 'multipart/alternative', 'parts': [
+            {'mimeType': 'text/html', 'body': {'attachmentId': 'html', 'size': 9}},
+            {'mimeType': 'text/plain', 'body': {'attachmentId': 'plain', 'size': 5}},
+        ]}
+        loaded = []
+        
+        def load_data(part):
+            loaded.append(part['body']['attachmentId'])
+            return encode(f"<{part['body']['attachmentId']}>")
+        
+        assert extract_body(payload) == ''
+        assert extract_body(payload, load_data) == '<plain>'
+        assert loaded == ['plain']
+    
+    def test_skips_text_file_attachments(self):
+        """Test that text/plain attachments are never taken for the body"""
+        terms = {'mimeType': 'text/plain', 'filename': 'terms.txt',
+                 'body': {'attachmentId': 'terms', 'size': 5}}
+        inline = {'mimeType': 'text/plain', 'filename': '',
+                  'headers': [{'name': 'Content-Disposition', 'value': 'attachment'}],
+                  'body': {'data': encode('notes')}}
+        payload = {'mimeType': 'multipart/mixed', 'parts': [
+            terms, inline, text_part('text/html', '<p>newsletter</p>'),
+        ]}
+        loaded = []
+        
+        def load_data(part):
+            loaded.append(part['body']['attachmentId'])
+            return encode('terms')
+        
+        assert extract_body(payload, load_data) == 'newsletter'
+        assert loaded == []
+
+
+class TestCharsets:
+    """Test charset-aware decoding"""
+    
+    def test_decodes_declared_charset(self):
+        """Test that non-utf-8 parts are decoded with their charset"""
+        payload = text_part('text/plain', 'Café crème', charset='iso-8859-1')
+        
+        assert extract_body(payload) == 'Café crème'
+    
+    def test_reads_unquoted_charset(self):
+        """Test charset parsing without quotes and with extra parameters"""
+        part = {'headers': [{'name': 'content-type',
+                             'value': 'text/plain; charset=windows-1252; format=flowed'}]}
+        
+        assert part_charset(part) == 'windows-1252'
+    
+    def test_unknown_charset_falls_back_to_utf8(self):
+        """Test that an unknown charset does not lose the body"""
+        assert decode_part_data(encode('hello'), 'x-unknown') == 'hello'
+    
+    def test_tolerates_missing_padding(self):
+        """Test that unpadded base64url data still decodes"""
+        assert decode_part_data(encode('ab').rstrip('=')) == 'ab'
+
+
+def raw_email(payload: dict, subject: str = 'Hello') -> str:
+    message = make_message('raw', subject=subject)
+    message['payload'] = dict(payload, headers=message['payload']['headers'])
+    return raw_message(message)
+
+
+class TestParseRawMessage:
+    """Test stdlib parsing of `format='raw'` messages"""
+    
+    def test_matches_full_format_body(self):
+        """Test that raw parsing picks the same plain part as extract_body"""
+        payload = {'mimeType': 'multipart/alternative', 'parts': [
+            text_part('text/plain', ''),
+            text_part('text/plain', 'Café crème', charset='iso-8859-1'),
+            text_part('text/html', '<p>html</p>'),
+        ]}
+        
+        subject, sender, date, body = parse_raw_message(raw_email(payload))
+        
+        assert body == extract_body(payload) == 'Café crème'
+        assert (subject, sender) == ('Hello', 'sender@example.com')
+    
+    def test_decodes_encoded_word_headers(self):
+        """Test that RFC 2047 subjects come back as text"""
+        raw = raw_email(text_part('text/plain', 'body'), subject='Résumé ☕ weekly')
+        
+        assert parse_raw_message(raw)[0] == 'Résumé ☕ weekly'
+    
+    def test_html_only_is_converted_to_text(self):
+        """Test that an html-only message yields its visible text"""
+        payload = {'mimeType': 'multipart/related', 'parts': [
+            text_part('text/html', '<style>p{}</style><p>One &amp; two</p><p>three</p>'),
+            {'mimeType': 'image/png', 'filename': 'logo.png', 'body': {'size': 16}},
+        ]}
+        
+        assert parse_raw_message(raw_email(payload))[3] == 'One & two\n\nthree'
+
+
+class TestHtmlToText:
+    """Test the html fallback conversion"""
+    
+    def test_drops_scripts_and_styles(self):
+        """Test that non-visible elements contribute no text"""
+        html = '<head><title>t</title></head><script>x()</script><div>Hi <b>there</b></div>'
+        
+        assert html_to_text(html) == 'Hi there'
+    
+    def test_blocks_are_paragraphs_and_br_breaks_lines(self):
+        """Test that blocks are separated by blank lines and <br> by a newline"""
+        assert html_to_text('<p>a</p><p>b<br>c</p>') == 'a\n\nb\nc'
+    
+    def test_drops_hidden_preheader_and_pixels(self):
+        """Test that CSS-hidden elements, images and zero-width padding vanish"""
+        html = ('<body><div style="display:none;max-height:0">Preview text'
+                '&zwnj;&nbsp;&zwnj;</div><div hidden><span>also hidden</span></div>'
+                '<table><tr><td>Issue <b>#12</b></td></tr></table>'
+                '<img src="https://t.example/open.gif" width="1" height="1" alt="">'
+                '<p style="opacity: 0.9">Visible</p><p>Zero&zwnj;&#8203;width</p></body>')
+        
+        assert html_to_text(html) == 'Issue #12\n\nVisible\n\nZerowidth'
+    
+    def test_table_cells_are_separated(self):
+        """Test that adjacent cells of minified table layouts do not run together"""
+        html = '<table><tr><th>Item</th><th>Cost</th></tr><tr><td>Price</td><td>$5</td></tr></table>'
+        
+        assert html_to_text(html) == 'Item Cost\n\nPrice $5'
+    
+    def test_unclosed_head_does_not_hide_the_body(self):
+        """Test that a document leaving out the optional </head> keeps its body"""
+        html = ('<html><head><meta charset=utf-8><title>T</title>'
+                '<style>p{}</style><body><p>Hello</p></body></html>')
+        
+        assert html_to_text(html) == 'Hello'
+        assert extract_body(text_part('text/html', html)) == 'Hello'
+    
+    def test_keeps_mjml_columns(self):
+        """Test that MJML's font-size:0 column wrappers do not hide their content"""
+        html = ('<body><div style="display:none;font-size:1px;max-height:0px;opacity:0;'
+                'overflow:hidden;mso-hide:all;">Preview text</div>'
+                '<table role="presentation"><tr><td style="direction:ltr;font-size:0px;'
+                'padding:20px 0;text-align:center;"><div class="mj-column-per-100" '
+                'style="font-size:0px;text-align:left;display:inline-block;width:100%;">'
+                '<table role="presentation"><tr><td style="font-size:0px;padding:10px 25px;">'
+                '<div style="font-family:Arial;font-size:16px;line-height:1.5;color:#000;">'
+                'This week in Python</div></td></tr></table></div></td></tr></table></body>')
+        
+        assert html_to_text(html) == 'This week in Python'
+    
+    def test_unclosed_hidden_element_ends_with_its_parent(self):
+        """Test that a hidden element left open does not hide what follows its parent"""
+        html = '<div><span style="visibility: hidden">gone</div><p>kept</p>'
+        
+        assert html_to_text(html) == 'kept'
+    
+    def test_streaming_matches_whole_document(self):
+        """Test that any chunking yields the same paragraphs, as they complete"""
+        html = ('<style>.a{}</style><h1>Title</h1><p>First &amp; <a href="x">link</a></p>'
+                '<div aria-hidden="true">x</div><ul><li>one</li><li>two</li></ul>')
+        whole = html_to_text(html)
+        
+        for size in (1, 3, 7, 64):
+            chunks = [html[start:start + size] for start in range(0, len(html), size)]
+            assert '\n\n'.join(iter_html_paragraphs(chunks)) == whole
+        
+        cleaner = HtmlCleaner()
+        cleaner.feed('<p>done</p><p>open')
+        assert cleaner.take_paragraphs() == ['done']
+        cleaner.close()
+        assert cleaner.take_paragraphs() == ['open']
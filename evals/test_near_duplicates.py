@@ -0,0 +1,108 @@
+"""
+Test suite for near-duplicate detection.
+"""
+
+import sys
+import os
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+
+from agent.gmail_fetcher import Email
+from agent.near_duplicates import MinHasher, NearDuplicateIndex, similarity
+
+
+def story(seed, words=300):
+    rng = random.Random(seed)
+    return ' '.join(f'word{rng.randrange(5000)}' for _ in range(words))
+
+
+def repost(text, seed, edits=2):
+    """The same story with a few words changed and a different footer"""
+    rng = random.Random(seed)
+    words = text.split()
+    for _ in range(edits):
+        words[rng.randrange(len(words))] = f'edit{rng.randrange(1000)}'
+    return ' '.join(words) + f' Unsubscribe from sender {seed}.'
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = NearDuplicateIndex(str(tmp_path / 'dedup.db'))
+    yield index
+    index.close()
+
+
+class TestMinHasher:
+    """Test shingling and signature similarity"""
+    
+    def test_signatures_estimate_jaccard_similarity(self):
+        """Test that signatures are stable and track shingle overlap"""
+        hasher = MinHasher()
+        original = story(1)
+        
+        assert (hasher.signature(original) == MinHasher().signature(original)).all()
+        assert similarity(hasher.signature(original), hasher.signature(repost(original, 2))) > 0.8
+        assert similarity(hasher.signature(original), hasher.signature(story(2))) < 0.2
+        assert hasher.signature('') is None
+        assert hasher.shingles('Short, text') == ['short text']
+
+
+class TestNearDuplicateIndex:
+    """Test flagging, collapsing and persistence"""
+    
+    def test_reposts_are_flagged(self, index):
+        """Test that edited copies point at the first copy"""
+        original = story(1)
+        assert not index.check(Email('a', 's', 'one@example.com', 'd', original)).is_duplicate
+        
+        match = index.check(Email('b', 's', 'two@example.com', 'd', repost(original, 2)))
+        assert match.is_duplicate and match.duplicate_of == 'a' and match.similarity > 0.8
+        
+        chained = index.check(Email('c', 's', 'three@example.com', 'd',
+                                    repost(repost(original, 2), 3)))
+        assert chained.duplicate_of == 'a'
+        assert not index.check(Email('d', 's', 'one@example.com', 'd', story(2))).is_duplicate
+        assert index.duplicates_of('a') == ['b', 'c']
+    
+    def test_html_copies_match_plain_text(self, index):
+        """Test that markup does not hide a copy"""
+        original = story(4)
+        index.check(Email('plain', 's', 'x', 'd', original))
+        html = f'<html><body><p>{original}</p><style>p {{ color: red }}</style></body></html>'
+        assert index.check(Email('html', 's', 'x', 'd', html)).duplicate_of == 'plain'
+    
+    def test_filter_collapses_and_reports(self, index):
+        """Test that filter drops copies and the report counts them"""
+        stories = [story(seed) for seed in range(10)]
+        emails = [Email(f'o{seed}', 's', 'x', 'd', text) for seed, text in enumerate(stories)]
+        emails += [Email(f'r{seed}', 's', 'y', 'd', repost(text, seed))
+                   for seed, text in enumerate(stories[:4])]
+        emails.append(Email('empty', 's', 'x', 'd', ''))
+        
+        kept = [email.message_id for email in index.filter(emails)]
+        assert kept == [f'o{seed}' for seed in range(10)] + ['empty']
+        
+        report = index.report()
+        assert (report.messages, report.duplicates) == (15, 4)
+        assert report.dedup_rate == pytest.approx(4 / 15)
+    
+    def test_index_persists(self, index, tmp_path):
+        """Test that a reopened index still knows earlier messages"""
+        original = story(5)
+        index.check(Email('a', 's', 'x', 'd', original))
+        index.close()
+        
+        reopened = NearDuplicateIndex(str(tmp_path / 'dedup.db'))
+        assert 'a' in reopened and len(reopened) == 1
+        assert reopened.check(Email('b', 's', 'x', 'd', repost(original, 1))).duplicate_of == 'a'
+        assert reopened.check(Email('b', 's', 'x', 'd', 'anything')).duplicate_of == 'a'
+        assert len(reopened) == 2
+        reopened.close()
+        
+        with pytest.raises(ValueError):
+            NearDuplicateIndex(str(tmp_path / 'dedup.db'), num_perm=64, bands=8)
+        with pytest.raises(ValueError):
+            NearDuplicateIndex(str(tmp_path / 'other.db'), num_perm=100, bands=16)
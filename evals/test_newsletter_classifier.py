@@ -0,0 +1,120 @@
+"""
+Test suite for header-based newsletter classification.
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from agent.gmail_fetcher import Email, GmailFetcher, LazyEmail
+from agent.newsletter_classifier import NewsletterClassifier
+from evals.fake_gmail import FakeGmailService, make_message
+
+
+def lazy_email(sender: str, subject: str = 'Hello', headers: dict = None) -> LazyEmail:
+    def load_body():
+        raise AssertionError('classification must not load the body')
+    return LazyEmail('id', subject, sender, 'date', headers or {}, load_body)
+
+
+class TestNewsletterClassifier:
+    """Test individual rules and scoring"""
+    
+    def test_platform_domain_is_a_newsletter(self):
+        """Test that Substack/Beehiiv/Maven senders are detected, including subdomains"""
+        classifier = NewsletterClassifier()
+        
+        for sender in ['Writer <writer@substack.com>',
+                       'Daily <daily@mail.beehiiv.com>',
+                       'hello@news.maven.com']:
+            assert classifier.is_newsletter(lazy_email(sender))
+    
+    def test_list_headers_are_a_newsletter(self):
+        """Test that List-Unsubscribe / List-Id headers mark bulk mail"""
+        classifier = NewsletterClassifier()
+        email = lazy_email('Someone <someone@example.com>',
+                           headers={'list-unsubscribe': '<mailto:u@example.com>'})
+        
+        result = classifier.classify(email)
+        
+        assert result.is_newsletter
+        assert result.rules == ['list_unsubscribe']
+    
+    def test_personal_email_is_not_a_newsletter(self):
+        """Test that a plain personal message is rejected"""
+        classifier = NewsletterClassifier()
+        email = lazy_email('Friend <friend@gmail.com>', subject='Lunch tomorrow?')
+        
+        result = classifier.classify(email)
+        
+        assert not result.is_newsletter
+        assert result.score == 0
+    
+    def test_weak_signals_combine(self):
+        """Test that sender and subject patterns only count together"""
+        classifier = NewsletterClassifier()
+        
+        assert not classifier.is_newsletter(lazy_email('news@example.com'))
+        assert classifier.is_newsletter(lazy_email('news@example.com', subject='Issue #42'))
+    
+    def test_works_on_full_emails_without_headers(self):
+        """Test that emails without a headers attribute use sender/subject rules"""
+        classifier = NewsletterClassifier()
+        email = Email('id', 'Weekly roundup', 'a@substack.com', 'date', 'body')
+        
+        assert classifier.is_newsletter(email)
+    
+    def test_custom_domains(self):
+        """Test that the domain set can be replaced"""
+        classifier = NewsletterClassifier(domains=['example.org'])
+        
+        assert classifier.is_newsletter(lazy_email('x@lists.example.org'))
+        assert not classifier.is_newsletter(lazy_email('x@substack.com'))
+
+
+class TestEvaluate:
+    """Test the precision/recall report"""
+    
+    def test_reports_precision_recall_and_latency(self):
+        """Test metric computation over a labelled sample"""
+        classifier = NewsletterClassifier()
+        labelled = [
+            (lazy_email('a@substack.com'), True),
+            (lazy_email('b@beehiiv.com'), True),
+            (lazy_email('friend@gmail.com'), True),
+            (lazy_email('boss@work.com', headers={'List-Id': 'team'}), False),
+            (lazy_email('mom@gmail.com'), False),
+        ]
+        
+        report = classifier.evaluate(labelled)
+        
+        assert report.messages == 5
+        assert (report.true_positives, report.false_positives, report.false_negatives) == (2, 1, 1)
+        assert report.precision == 2 / 3
+        assert report.recall == 2 / 3
+        assert report.mean_latency_us > 0
+        assert report.p99_latency_us >= 0
+
+
+class TestMetadataFirstFiltering:
+    """Test filtering a metadata-only fetch before any body download"""
+    
+    def test_non_newsletters_are_never_fetched_in_full(self):
+        """Test that only newsletters trigger a format='full' request"""
+        service = FakeGmailService([
+            make_message('n1', sender='Writer <writer@substack.com>'),
+            make_message('p1', sender='Friend <friend@gmail.com>'),
+            make_message('n2', sender='Daily <daily@beehiiv.com>'),
+        ])
+        fetcher = GmailFetcher(lazy_bodies=True, service=service)
+        classifier = NewsletterClassifier()
+        
+        bodies = {email.message_id: email.body
+                  for email in classifier.filter(fetcher.iter_emails())}
+        
+        assert list(bodies) == ['n1', 'n2']
+        full_fetches = [message_id for message_id, format in zip(service.gets, service.formats)
+                        if format == 'full']
+        assert full_fetches == ['n1', 'n2']
+        assert service.formats.count('metadata') == 3
@@ -0,0 +1,179 @@
+"""
+Test suite for the memoized stage pipeline.
+"""
+
+import sys
+import os
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+
+from agent.gmail_fetcher import Email
+from agent.pipeline import DROP, OutputStore, Pipeline, Stage
+
+
+def mailbox(count, start=0):
+    return [Email(f'm{index}', f'Issue {index}', 'news@substack.com', 'd',
+                  f'body {index}' if index % 3 else 'personal note')
+            for index in range(start, start + count)]
+
+
+class Calls:
+    """Stage functions that count their calls"""
+    
+    def __init__(self):
+        self.counts = {}
+        self.lock = threading.Lock()
+    
+    def track(self, name):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+    
+    def keep(self, email, outputs):
+        self.track('keep')
+        return 'personal' not in email.body or DROP
+    
+    def upper(self, email, outputs):
+        self.track('upper')
+        return email.body.upper()
+    
+    def length(self, email, outputs):
+        self.track('length')
+        return len(outputs['upper'])
+    
+    def stages(self, length_version='1'):
+        return [
+            Stage('keep', self.keep),
+            Stage('upper', self.upper),
+            Stage('length', self.length, version=length_version),
+        ]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = OutputStore(str(tmp_path / 'pipeline.db'))
+    yield store
+    store.close()
+
+
+class TestPipeline:
+    """Test memoization, invalidation and streaming"""
+    
+    def test_rerun_reuses_stored_outputs(self, store):
+        """Test that a second run computes nothing and returns the same outputs"""
+        calls = Calls()
+        first = list(Pipeline(calls.stages(), store).run(mailbox(9)))
+        
+        assert [result.email.message_id for result in first] == \
+            ['m1', 'm2', 'm4', 'm5', 'm7', 'm8']
+        assert first[0].outputs == {'keep': True, 'upper': 'BODY 1', 'length': 6}
+        assert calls.counts == {'keep': 9, 'upper': 6, 'length': 6}
+        
+        pipeline = Pipeline(calls.stages(), store)
+        second = list(pipeline.run(mailbox(9)))
+        assert [result.outputs for result in second] == [result.outputs for result in first]
+        assert all(result.computed == [] for result in second)
+        assert calls.counts == {'keep': 9, 'upper': 6, 'length': 6}
+        assert pipeline.counts['keep'].reused == 9 and pipeline.counts['keep'].dropped == 3
+    
+    def test_only_new_messages_are_computed(self, store):
+        """Test that work scales with new mail"""
+        calls = Calls()
+        list(Pipeline(calls.stages(), store).run(mailbox(9)))
+        calls.counts.clear()
+        
+        pipeline = Pipeline(calls.stages(), store)
+        results = list(pipeline.run(mailbox(12)))
+        
+        assert len(results) == 8
+        assert calls.counts == {'keep': 3, 'upper': 2, 'length': 2}
+        assert pipeline.counts['upper'].computed == 2 and pipeline.counts['upper'].reused == 6
+    
+    def test_changed_stage_recomputes_downstream_only(self, store):
+        """Test invalidation by version, config and code, and depends_on"""
+        calls = Calls()
+        list(Pipeline(calls.stages(), store).run(mailbox(6)))
+        calls.counts.clear()
+        
+        list(Pipeline(calls.stages(length_version='2'), store).run(mailbox(6)))
+        assert calls.counts == {'length': 4}
+        
+        calls.counts.clear()
+        stages = calls.stages()
+        stages[1] = Stage('upper', calls.upper, config={'locale': 'tr'})
+        stages.append(Stage('subject', lambda email, outputs: email.subject, depends_on=()))
+        list(Pipeline(stages, store).run(mailbox(6)))
+        assert calls.counts == {'upper': 4, 'length': 4}
+        
+        calls.counts.clear()
+        stages[1] = Stage('upper', calls.upper)
+        pipeline = Pipeline(stages, store)
+        list(pipeline.run(mailbox(6)))
+        assert calls.counts == {}
+        assert pipeline.counts['subject'].reused == 4
+    
+    def test_failures_are_dropped_and_retried(self, store, capsys):
+        """Test that a failing message is reported, dropped and not stored"""
+        attempts = []
+        
+        def flaky(email, outputs):
+            attempts.append(email.message_id)
+            if email.message_id == 'm1' and attempts.count('m1') == 1:
+                raise RuntimeError('model timeout')
+            return email.message_id
+        
+        stages = [Stage('flaky', flaky)]
+        first = list(Pipeline(stages, store).run(mailbox(3)))
+        assert [result.outputs['flaky'] for result in first] == ['m0', 'm2']
+        assert 'Error in stage flaky for email m1: model timeout' in capsys.readouterr().out
+        
+        pipeline = Pipeline(stages, store)
+        second = list(pipeline.run(mailbox(3)))
+        assert [result.outputs['flaky'] for result in second] == ['m0', 'm1', 'm2']
+        assert attempts == ['m0', 'm1', 'm2', 'm1']
+    
+    def test_backpressure_bounds_buffered_messages(self, store):
+        """Test that a slow consumer holds back the source"""
+        produced = []
+        
+        def source():
+            for email in mailbox(1000):
+                produced.append(email.message_id)
+                yield email
+        
+        pipeline = Pipeline([Stage('id', lambda email, outputs: email.message_id)],
+                            store, queue_size=4)
+        results = pipeline.run(source())
+        next(results)
+        time.sleep(0.3)
+        
+        # Two queues of 4, one message in each of the two threads, one delivered
+        assert len(produced) <= 2 * 4 + 2 + 1
+        results.close()
+    
+    def test_source_errors_reach_the_consumer(self, store):
+        """Test that an exception while fetching is raised by run"""
+        def source():
+            yield mailbox(1)[0]
+            raise ConnectionError('network down')
+        
+        results = Pipeline([Stage('id', lambda email, outputs: 1)], store).run(source())
+        assert next(results).email.message_id == 'm0'
+        with pytest.raises(ConnectionError):
+            next(results)
+    
+    def test_invalid_pipelines_and_prune(self, store):
+        """Test validation and removing outputs of old stage versions"""
+        calls = Calls()
+        with pytest.raises(ValueError):
+            Pipeline([Stage('a', calls.upper), Stage('a', calls.upper)], store)
+        with pytest.raises(ValueError):
+            Pipeline([Stage('a', calls.length, depends_on=['b']), Stage('b', calls.upper)], store)
+        
+        list(Pipeline(calls.stages(), store).run(mailbox(3)))
+        assert len(store) == 3 + 2 + 2
+        assert Pipeline(calls.stages(length_version='2'), store).prune() == 2
+        assert len(store) == 5
@@ -0,0 +1,192 @@
+"""
+Test suite for quota-aware scheduling, backoff and retries.
+"""
+
+import sys
+import os
+import bisect
+from unittest.mock import Mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+
+from agent.gmail_fetcher import GmailFetcher
+from agent.quota_scheduler import (AdaptiveLimiter, QuotaScheduler, TokenBucket,
+                                   is_retryable)
+from evals.fake_gmail import FakeGmailService, http_error, make_message, rate_limit_error
+
+
+class FakeClock:
+    """Manually advanced clock whose sleep moves time forward"""
+    
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+    
+    def __call__(self) -> float:
+        return self.now
+    
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def no_wait_scheduler(**kwargs) -> QuotaScheduler:
+    return QuotaScheduler(units_per_second=None, sleep=lambda seconds: None, **kwargs)
+
+
+class TestTokenBucket:
+    """Test quota unit accounting"""
+    
+    def test_allows_burst_then_waits_for_refill(self):
+        """Test that the bucket blocks once its capacity is spent"""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=10, capacity=20, clock=clock, sleep=clock.sleep)
+        
+        assert bucket.acquire(20) == 0
+        assert bucket.acquire(5) == pytest.approx(0.5)
+        assert clock.now == pytest.approx(0.5)
+    
+    def test_oversized_requests_go_into_debt(self):
+        """Test that a request larger than the bucket is charged in full"""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=10, capacity=10, clock=clock, sleep=clock.sleep)
+        
+        bucket.acquire(30)
+        bucket.acquire(10)
+        
+        assert clock.now == pytest.approx(3.0)
+    
+    def test_default_scheduler_stays_within_per_minute_quota(self):
+        """Test that no 60 s window admits more than Gmail's 15,000 units"""
+        clock = FakeClock()
+        scheduler = QuotaScheduler(clock=clock, sleep=clock.sleep)
+        admitted = []
+        
+        while clock.now < 180:
+            scheduler.execute(lambda: None, 'messages.get')
+            admitted.append(clock.now)
+        
+        # Calls admitted in the 60 s window starting at each admission
+        end = 0
+        for first, start in enumerate(admitted):
+            while end < len(admitted) and admitted[end] < start + 60:
+                end += 1
+            assert (end - first) * 5 <= 15000
+        assert bisect.bisect_left(admitted, 2) * 5 <= 1000
+
+
+class TestAdaptiveLimiter:
+    """Test AIMD concurrency control"""
+    
+    def test_halves_on_throttle_and_recovers_additively(self):
+        """Test multiplicative decrease and additive increase"""
+        limiter = AdaptiveLimiter(16)
+        
+        limiter.on_throttle()
+        assert limiter.limit == 8
+        limiter.on_throttle()
+        assert limiter.limit == 4
+        
+        for _ in range(4):
+            limiter.on_success()
+        assert limiter.limit == 4
+        limiter.on_success()
+        assert limiter.limit == 5
+    
+    def test_never_drops_below_minimum_or_exceeds_maximum(self):
+        """Test the limit bounds"""
+        limiter = AdaptiveLimiter(2)
+        for _ in range(10):
+            limiter.on_throttle()
+        assert limiter.limit == 1
+        
+        for _ in range(100):
+            limiter.on_success()
+        assert limiter.limit == 2
+
+
+class TestQuotaScheduler:
+    """Test retry policy"""
+    
+    def test_classifies_retryable_errors(self):
+        """Test which errors are worth retrying"""
+        assert is_retryable(rate_limit_error())
+        assert is_retryable(http_error(503))
+        assert is_retryable(http_error(403, '{"error": {"errors": [{"reason": "userRateLimitExceeded"}]}}'))
+        assert not is_retryable(http_error(403, 'Forbidden'))
+        assert not is_retryable(http_error(404))
+    
+    def test_retries_with_jittered_exponential_backoff(self):
+        """Test that throttled calls are retried with growing delays"""
+        clock = FakeClock()
+        scheduler = QuotaScheduler(units_per_second=None, sleep=clock.sleep, rng=lambda: 1.0,
+                                   base_delay=0.5)
+        call = Mock(side_effect=[rate_limit_error(), http_error(503), {'ok': True}])
+        
+        assert scheduler.execute(call, 'messages.get') == {'ok': True}
+        assert clock.sleeps == [0.5, 1.0]
+        assert scheduler.stats.retries == 2
+        assert scheduler.stats.throttled == 2
+    
+    def test_gives_up_after_max_retries(self):
+        """Test that persistent throttling is eventually raised"""
+        scheduler = no_wait_scheduler(max_retries=2)
+        call = Mock(side_effect=rate_limit_error())
+        
+        with pytest.raises(Exception):
+            scheduler.execute(call, 'messages.get')
+        
+        assert call.call_count == 3
+        assert scheduler.stats.failures == 1
+    
+    def test_does_not_retry_permanent_errors(self):
+        """Test that client errors fail immediately"""
+        scheduler = no_wait_scheduler()
+        call = Mock(side_effect=http_error(404))
+        
+        with pytest.raises(Exception):
+            scheduler.execute(call, 'messages.get')
+        
+        assert call.call_count == 1
+    
+    def test_charges_quota_units_per_call_type(self):
+        """Test per-call-type unit accounting"""
+        scheduler = no_wait_scheduler()
+        
+        scheduler.execute(lambda: None, 'messages.list')
+        scheduler.execute(lambda: None, 'history.list')
+        scheduler.execute(lambda: None, 'messages.get', count=10)
+        
+        assert scheduler.stats.units == 5 + 2 + 50
+
+
+class TestFetcherRetries:
+    """Test that GmailFetcher no longer drops throttled messages"""
+    
+    def _service(self, count, **kwargs):
+        return FakeGmailService([make_message(f'msg{i}') for i in range(count)], **kwargs)
+    
+    @pytest.mark.parametrize('options', [{}, {'batch_size': 10}, {'max_workers': 4}])
+    def test_transient_errors_are_retried(self, options):
+        """Test that every message survives a 30% transient error rate"""
+        service = self._service(40, error_rate=0.3, seed=2)
+        fetcher = GmailFetcher(scheduler=no_wait_scheduler(max_retries=10),
+                               service=service, **options)
+        
+        emails = fetcher.fetch_recent_emails(max_results=40)
+        
+        assert [email.message_id for email in emails] == [f'msg{i}' for i in range(40)]
+        assert fetcher.scheduler.stats.retries > 0
+    
+    def test_quota_ceiling_is_respected(self):
+        """Test that a rate-limited scheduler never trips the fake quota"""
+        service = self._service(30, quota_per_second=400)
+        scheduler = QuotaScheduler(units_per_second=380, burst=380)
+        fetcher = GmailFetcher(batch_size=10, scheduler=scheduler, service=service)
+        
+        emails = fetcher.fetch_recent_emails(max_results=30)
+        
+        assert len(emails) == 30
+        assert service.throttled == 0
@@ -0,0 +1,134 @@
+"""
+Test suite for the in-process response cache and its refresher.
+"""
+
+import sys
+import os
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+
+from agent.response_cache import BackgroundRefresher, ResponseCache, make_etag
+
+
+class Clock:
+    """Manually advanced time source"""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+
+class TestResponseCache:
+    """Test expiry, eviction, single-flight misses and refreshing"""
+    
+    def test_entries_expire_after_ttl(self):
+        """Test that a body is served until ttl, then rendered again"""
+        clock = Clock()
+        cache = ResponseCache(ttl=10, clock=clock)
+        renders = []
+        
+        def render():
+            renders.append(clock.now)
+            return f'v{len(renders)}'.encode()
+        
+        first = cache.get('k', render)
+        clock.now = 9.9
+        assert cache.get('k', render) is first
+        clock.now = 10
+        second = cache.get('k', render)
+        
+        assert (first.body, second.body) == (b'v1', b'v2')
+        assert second.etag == make_etag(b'v2') != first.etag
+        assert (cache.stats.hits, cache.stats.misses) == (1, 2)
+    
+    def test_least_recently_used_is_evicted(self):
+        """Test that a hit protects an entry from eviction"""
+        cache = ResponseCache(max_entries=2)
+        cache.get('a', lambda: b'a')
+        cache.get('b', lambda: b'b')
+        cache.get('a', lambda: b'a')
+        cache.get('c', lambda: b'c')
+        
+        assert 'a' in cache and 'c' in cache and 'b' not in cache
+        assert cache.stats.evictions == 1 and len(cache) == 2
+    
+    def test_concurrent_misses_render_once(self):
+        """Test that simultaneous requests for one key share a render"""
+        cache = ResponseCache()
+        started, release = threading.Event(), threading.Event()
+        renders = []
+        
+        def render():
+            renders.append(1)
+            started.set()
+            release.wait(5)
+            return b'body'
+        
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get('k', render)))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        started.wait(5)
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join()
+        
+        assert len(renders) == 1
+        assert len(results) == 8 and all(result is results[0] for result in results)
+    
+    def test_failed_render_is_not_cached(self):
+        """Test that errors reach the caller and the next request renders again"""
+        cache = ResponseCache()
+        
+        def fail():
+            raise ValueError('bad query')
+        
+        with pytest.raises(ValueError):
+            cache.get('k', fail)
+        assert 'k' not in cache
+        assert cache.get('k', lambda: b'ok').body == b'ok'
+    
+    def test_refresh_rerenders_recently_used_entries(self):
+        """Test that refresh renews expiry, keeps unchanged ETags and skips idle entries"""
+        clock = Clock()
+        cache = ResponseCache(ttl=10, clock=clock)
+        data = {'hot': b'1', 'cold': b'1'}
+        hot = cache.get('hot', lambda: data['hot'])
+        cache.get('cold', lambda: data['cold'])
+        
+        clock.now = 8
+        cache.get('hot', lambda: data['hot'])
+        data['cold'] = b'2'
+        assert cache.refresh(max_idle=5) == 1
+        
+        clock.now = 15
+        assert cache.get('hot', lambda: b'unused') is hot
+        assert cache.get('cold', lambda: data['cold']).body == b'2'
+    
+    def test_refresher_reloads_before_refreshing(self):
+        """Test a refresher cycle, run by hand and on its thread"""
+        cache = ResponseCache(ttl=60)
+        version = {'value': 1}
+        cache.get('k', lambda: str(version['value']).encode())
+        
+        def reload():
+            version['value'] += 1
+        
+        refresher = BackgroundRefresher(cache, interval=0.01, before_refresh=reload)
+        assert refresher.run_once() == 1
+        assert cache.get('k', lambda: b'unused').body == b'2'
+        
+        refresher.start()
+        deadline = time.monotonic() + 5
+        while version['value'] < 4 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        refresher.stop()
+        assert cache.stats.refreshes >= 3
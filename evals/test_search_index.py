@@ -0,0 +1,117 @@
+"""
+Test suite for the local full-text search index.
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+
+from agent.gmail_fetcher import Email, GmailFetcher
+from agent.search_index import SearchIndex, parse_query
+from evals.fake_gmail import FakeGmailService, make_message
+
+
+def corpus():
+    return [
+        Email('m1', 'Agents weekly', 'Lenny <lenny@substack.com>', 'd1',
+              'Open source agents ship this week. We are hiring engineers.'),
+        Email('m2', 'Research digest', 'news@beehiiv.com', 'd2',
+              '<html><body><p>Source code for open models</p>'
+              '<script>trackAgents()</script></body></html>'),
+        Email('m3', 'Café roundup', 'alex@example.com', 'd3',
+              'Résumé tips and open source agents for founders.'),
+        Email('m4', 'Pricing notes', 'billing@bank.example', 'd4',
+              'Your invoice is attached.'),
+    ]
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SearchIndex(str(tmp_path / 'search.db'))
+    index.add_many(corpus())
+    yield index
+    index.close()
+
+
+def ids(hits):
+    return sorted(hit.message_id for hit in hits)
+
+
+class TestSearchIndex:
+    """Test boolean, phrase and field queries and ranking"""
+    
+    def test_boolean_queries(self, index):
+        """Test implicit AND, OR and negation"""
+        assert ids(index.search('open agents')) == ['m1', 'm3']
+        assert ids(index.search('invoice OR founders')) == ['m3', 'm4']
+        assert ids(index.search('agents -hiring')) == ['m3']
+        assert ids(index.search('(invoice OR models) NOT pricing')) == ['m2']
+    
+    def test_negation_applies_to_the_whole_query(self, index):
+        """Test that -term excludes from every alternative, not just the nearest one"""
+        assert parse_query('a OR b -c') == '( "a" OR "b" ) NOT "c"'
+        assert ids(index.search('invoice OR agents -hiring')) == ['m3', 'm4']
+        assert ids(index.search('-hiring invoice OR agents')) == ['m3', 'm4']
+        assert index.count('open OR invoice -hiring -pricing') == 2
+    
+    def test_exclusion_only_queries_are_rejected(self, index):
+        """Test that queries with nothing to match raise a clear ValueError"""
+        for query in ('-hiring', '-a -b', 'NOT x', '(NOT x)'):
+            with pytest.raises(ValueError, match='only excludes terms'):
+                index.search(query)
+    
+    def test_phrase_queries(self, index):
+        """Test that phrases require adjacent words in order"""
+        assert ids(index.search('"open source"')) == ['m1', 'm3']
+        assert ids(index.search('source open')) == ['m1', 'm2', 'm3']
+    
+    def test_field_and_prefix_queries(self, index):
+        """Test field restriction, the from: alias and prefixes"""
+        assert ids(index.search('from:substack')) == ['m1']
+        assert ids(index.search('subject:agents')) == ['m1']
+        assert ids(index.search('found*')) == ['m3']
+    
+    def test_diacritics_and_html_are_normalized(self, index):
+        """Test accent folding and that markup and scripts are not indexed"""
+        assert ids(index.search('resume cafe')) == ['m3']
+        assert ids(index.search('trackagents')) == []
+        assert ids(index.search('html')) == []
+    
+    def test_subject_matches_rank_first(self, index):
+        """Test that BM25 field weights favour subject matches"""
+        hits = index.search('agents')
+        
+        assert hits[0].message_id == 'm1'
+        assert hits[0].score > hits[1].score
+    
+    def test_invalid_and_empty_queries(self, index):
+        """Test that syntax errors raise ValueError and empty queries match nothing"""
+        with pytest.raises(ValueError):
+            index.search('agents NOT')
+        assert index.search('   ') == []
+        assert index.count('') == 0
+    
+    def test_user_input_cannot_inject_syntax(self, index):
+        """Test that FTS5 operators and unknown columns in terms are quoted"""
+        assert parse_query('NEAR(a b) col:x') == '"NEAR" ( "a" "b" ) "col:x"'
+        assert index.search('col:x ^open "a*b"') == []
+    
+    def test_incremental_indexing_while_fetching(self, tmp_path):
+        """Test that indexing passes emails through and skips known ones"""
+        path = str(tmp_path / 'search.db')
+        service = FakeGmailService([make_message(f'msg{i}', subject=f'Issue {i}')
+                                    for i in range(5)])
+        index = SearchIndex(path)
+        
+        fetched = list(index.indexing(GmailFetcher(service=service).iter_emails(), batch_size=2))
+        assert index.add_many(fetched) == 0
+        index.close()
+        
+        reopened = SearchIndex(path)
+        assert len(fetched) == len(reopened) == 5
+        assert 'msg3' in reopened
+        assert reopened.count('subject:issue') == 5
+        reopened.close()
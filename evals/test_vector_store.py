@@ -0,0 +1,145 @@
+"""
+Test suite for the local vector store.
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pytest
+
+from agent.gmail_fetcher import Email
+from agent import vector_store
+from agent.vector_store import HashingEmbedder, VectorStore, chunk_text
+
+
+def corpus():
+    return [
+        Email('m1', 'Agents weekly', 'lenny@substack.com', 'd1',
+              'Open source agents ship this week with better tool calling.'),
+        Email('m2', 'Rates', 'news@bank.example', 'd2',
+              'Mortgage rates and bond yields moved again this quarter.'),
+        Email('m3', 'Recipes', 'food@example.com', 'd3',
+              '<html><body><p>Slow roasted tomatoes with garlic and basil.</p></body></html>'),
+    ]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = VectorStore(str(tmp_path / 'vectors'), HashingEmbedder(dimension=64))
+    store.add_emails(corpus())
+    yield store
+    store.close()
+
+
+def random_vectors(count, dimension=64, seed=0):
+    return np.random.default_rng(seed).standard_normal((count, dimension)).astype(np.float32)
+
+
+class TestChunking:
+    """Test word-window chunking and the hashing embedder"""
+    
+    def test_chunks_overlap_and_keep_offsets(self):
+        """Test that chunks are overlapping word windows with character offsets"""
+        text = ' '.join(f'w{index}' for index in range(10))
+        chunks = chunk_text(text, size=4, overlap=1)
+        
+        assert [chunk for _, chunk in chunks] == [
+            'w0 w1 w2 w3', 'w3 w4 w5 w6', 'w6 w7 w8 w9']
+        for offset, chunk in chunks:
+            assert text[offset:offset + len(chunk)] == chunk
+        assert chunk_text('') == []
+        with pytest.raises(ValueError):
+            chunk_text(text, size=4, overlap=4)
+    
+    def test_hashing_embedder_is_deterministic(self):
+        """Test that embeddings are stable, normalized and reflect shared words"""
+        texts = ['open source agents', 'agents that are open source', 'mortgage rates']
+        vectors = HashingEmbedder(dimension=128).embed(texts)
+        
+        assert vectors.shape == (3, 128) and vectors.dtype == np.float32
+        assert np.array_equal(vectors, HashingEmbedder(dimension=128).embed(texts))
+        assert np.allclose(np.linalg.norm(vectors, axis=1), 1)
+        assert vectors[0] @ vectors[1] > vectors[0] @ vectors[2]
+        assert not HashingEmbedder().embed(['']).any()
+
+
+class TestVectorStore:
+    """Test appends, search, deletes and compaction"""
+    
+    def test_search_returns_the_matching_email(self, store):
+        """Test that text queries find the most similar chunk, html included"""
+        assert len(store) == 3
+        assert store.search('open source agents', k=1)[0].message_id == 'm1'
+        assert store.search('roasted garlic', k=1)[0].message_id == 'm3'
+        
+        hits = store.search('bond yields', k=10)
+        assert len(hits) == 3
+        assert hits[0].message_id == 'm2'
+        assert [hit.score for hit in hits] == sorted((hit.score for hit in hits), reverse=True)
+    
+    def test_batch_search_matches_single_queries(self, tmp_path, monkeypatch):
+        """Test that batched top-k equals per-query top-k across scan blocks"""
+        monkeypatch.setattr(vector_store, 'BLOCK_ROWS', 128)
+        store = VectorStore(str(tmp_path / 'vectors'), HashingEmbedder(dimension=64))
+        vectors = random_vectors(1000)
+        store.add_vectors([(f'm{index}', 0, 10) for index in range(1000)], vectors)
+        queries = random_vectors(5, seed=1)
+        
+        batched = store.search_batch(queries, k=7)
+        expected = np.argsort(-(queries @ (vectors / np.linalg.norm(vectors, axis=1,
+                                                                    keepdims=True)).T), axis=1)
+        for query, hits in enumerate(batched):
+            single = store.search(queries[query], k=7)
+            assert [hit.message_id for hit in hits] == [hit.message_id for hit in single]
+            assert [hit.score for hit in hits] == pytest.approx([hit.score for hit in single])
+            assert [hit.message_id for hit in hits] == [f'm{row}' for row in expected[query][:7]]
+        store.close()
+    
+    def test_duplicate_emails_are_skipped(self, store):
+        """Test that re-adding stored emails adds nothing"""
+        assert 'm1' in store
+        assert store.add_emails(corpus()) == 0
+        assert len(store) == 3
+    
+    def test_deletes_are_tombstones_until_compaction(self, store, tmp_path):
+        """Test that deleted chunks disappear from search and compaction drops them"""
+        assert store.delete('m1') == 1
+        assert 'm1' not in store and len(store) == 2
+        assert 'm1' not in [hit.message_id for hit in store.search('open source agents')]
+        
+        assert store.compact() == 1
+        assert store.compact() == 0
+        assert os.listdir(tmp_path / 'vectors').count('vectors.1.f32') == 1
+        assert 'vectors.0.f32' not in os.listdir(tmp_path / 'vectors')
+        assert store.search('roasted garlic', k=1)[0].message_id == 'm3'
+        
+        store.add_emails(corpus()[:1])
+        assert store.search('open source agents', k=1)[0].message_id == 'm1'
+    
+    def test_reopen_keeps_vectors_and_tombstones(self, store, tmp_path):
+        """Test that a reopened store serves the same results"""
+        store.delete('m2')
+        before = store.search('roasted garlic')
+        store.close()
+        
+        with VectorStore(str(tmp_path / 'vectors'), HashingEmbedder(dimension=64)) as reopened:
+            assert len(reopened) == 2
+            assert reopened.search('roasted garlic') == before
+            with pytest.raises(ValueError):
+                VectorStore(str(tmp_path / 'vectors'), HashingEmbedder(dimension=32))
+    
+    def test_unreferenced_rows_are_truncated(self, store, tmp_path):
+        """Test that vectors written without committed metadata are dropped"""
+        store.close()
+        path = tmp_path / 'vectors' / 'vectors.0.f32'
+        with open(path, 'ab') as vectors:
+            vectors.write(random_vectors(2).tobytes())
+        
+        with VectorStore(str(tmp_path / 'vectors'), HashingEmbedder(dimension=64)) as reopened:
+            assert len(reopened) == 3
+            assert os.path.getsize(path) == 3 * 64 * 4
+            reopened.add_vectors([('m4', 0, 1)], random_vectors(1))
+            assert reopened.search(random_vectors(1)[0], k=1)[0].message_id == 'm4'
@@ -0,0 +1,136 @@
+"""
+Test suite for the cached HTTP service over the local store.
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+
+from agent.gmail_fetcher import Email, GmailFetcher
+from agent.mailbox_archive import ArchiveWriter
+from agent.response_cache import BackgroundRefresher, ResponseCache
+from agent.web_app import LocalStore, create_app, summarize
+
+
+def issue(number, day):
+    body = (f'<html><body><p>View in browser</p><h1>Deep dive {number}</h1>'
+            f'<p>Retrieval story {number} about {["vectors", "agents", "chips", "evals"][number % 4]}'
+            f'</p><p>You are receiving this email because you subscribed.</p>'
+            f'<p><a href="u">Unsubscribe</a></p></body></html>')
+    return Email(f'n{number}', f'Issue #{number}', 'Long Reads <longreads@substack.com>',
+                 f'Mon, {day} Jan 2025 12:00:00 +0000', body)
+
+
+def mailbox():
+    return [
+        issue(1, 3), issue(2, 10), issue(3, 17),
+        Email('p1', 'Lunch?', 'Alice <alice@example.com>', 'Tue, 18 Jan 2025 09:00:00 +0000',
+              'Retrieval is fine, lunch at noon'),
+        Email('b1', 'Weekly AI', 'news@beehiiv.com', 'Wed, 12 Jan 2025 08:00:00 +0000',
+              'Agents everywhere this week'),
+    ]
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    def no_gmail(*args, **kwargs):
+        raise AssertionError('the app must not talk to Gmail')
+    monkeypatch.setattr(GmailFetcher, '__init__', no_gmail)
+    
+    with ArchiveWriter(str(tmp_path / 'mailbox.nla')) as writer:
+        writer.extend(mailbox())
+    store = LocalStore(str(tmp_path / 'mailbox.nla'), str(tmp_path / 'index.db'),
+                       str(tmp_path / 'boilerplate.db'))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def client(store):
+    app = create_app(store, ResponseCache(ttl=60), refresh_interval=None)
+    return app.test_client()
+
+
+class TestWebApp:
+    """Test endpoints, caching and conditional requests"""
+    
+    def test_recent_newsletters_newest_first(self, client):
+        """Test that personal mail is excluded and newsletters are ordered by date"""
+        response = client.get('/api/newsletters?limit=3')
+        
+        assert response.status_code == 200
+        assert [item['id'] for item in response.get_json()['newsletters']] == ['n3', 'b1', 'n2']
+        assert response.headers['ETag'] and 'no-cache' in response.headers['Cache-Control']
+    
+    def test_if_none_match_returns_304_from_cache(self, client):
+        """Test that a current ETag gets an empty 304 and the body is rendered once"""
+        first = client.get('/api/newsletters')
+        second = client.get('/api/newsletters', headers={'If-None-Match': first.headers['ETag']})
+        stale = client.get('/api/newsletters', headers={'If-None-Match': '"outdated"'})
+        
+        assert second.status_code == 304 and second.data == b''
+        assert stale.status_code == 200 and stale.data == first.data
+        status = client.get('/api/status').get_json()
+        assert status['cache']['misses'] == 1 and status['cache']['hits'] == 2
+        assert status['emails'] == status['indexed'] == 5
+    
+    def test_list_headers_mark_newsletters_from_any_domain(self, store, tmp_path):
+        """Test that archived List-* headers identify newsletters from custom domains"""
+        with ArchiveWriter(str(tmp_path / 'mailbox.nla')) as writer:
+            writer.append(Email('c1', 'Field notes', 'Notes <hello@custom-domain.org>',
+                                'Thu, 20 Jan 2025 08:00:00 +0000', 'Notes from the field',
+                                headers={'List-Id': '<notes.custom-domain.org>'}))
+        store.reload()
+        
+        assert [item['id'] for item in store.recent(2)['newsletters']] == ['c1', 'n3']
+    
+    def test_search(self, client):
+        """Test ranked hits, and errors for missing or invalid queries"""
+        hits = client.get('/api/search?q=retrieval').get_json()['hits']
+        
+        assert {hit['message_id'] for hit in hits} == {'n1', 'n2', 'n3', 'p1'}
+        assert client.get('/api/search?q=from:alice').get_json()['hits'][0]['message_id'] == 'p1'
+        assert client.get('/api/search').status_code == 400
+        assert client.get('/api/search?q=ai+(').status_code == 400
+    
+    def test_digest_groups_and_strips_boilerplate(self, client):
+        """Test that summaries skip paragraphs repeated across a sender's issues"""
+        senders = client.get('/api/digest').get_json()['senders']
+        
+        assert [group['sender'] for group in senders] == \
+            ['Long Reads <longreads@substack.com>', 'news@beehiiv.com']
+        newest = senders[0]['newsletters'][0]
+        assert newest['id'] == 'n3' and newest['summary'] == 'Retrieval story 3 about evals'
+        assert senders[1]['newsletters'][0]['summary'] == 'Agents everywhere this week'
+    
+    def test_refresher_picks_up_new_mail(self, store, tmp_path):
+        """Test that appended archive records reach cached responses with a new ETag"""
+        cache = ResponseCache(ttl=60)
+        client = create_app(store, cache, refresh_interval=None).test_client()
+        before = client.get('/api/newsletters')
+        
+        with ArchiveWriter(str(tmp_path / 'mailbox.nla')) as writer:
+            writer.append(issue(4, 24))
+        assert BackgroundRefresher(cache, before_refresh=store.reload).run_once() == 1
+        after = client.get('/api/newsletters', headers={'If-None-Match': before.headers['ETag']})
+        
+        assert after.status_code == 200
+        assert after.get_json()['newsletters'][0]['id'] == 'n4'
+        assert 'n4' in store.index
+        assert store.reload() is False
+    
+    def test_limits_are_clamped(self, client):
+        """Test that out-of-range limits share the cache key of the nearest valid one"""
+        client.get('/api/newsletters?limit=1000')
+        client.get('/api/newsletters?limit=100')
+        client.get('/api/newsletters?limit=0')
+        
+        assert client.get('/api/status').get_json()['cached_responses'] == 2
+    
+    def test_summarize(self):
+        """Test that summaries keep the first paragraph, cut at a word"""
+        assert summarize('one two\nthree\n\nnext') == 'one two three'
+        assert summarize('word ' * 100, length=12) == 'word word…'